@@ -1,18 +1,55 @@
 import os
+import io
+import re
+import sys
 import shutil
 import zipfile
+import tarfile
 import socket
 import json
 import hashlib
+import itertools
+import zlib
+import gzip
+import base64
 import threading
 import time
 import sqlite3
-from datetime import datetime
+import asyncio
+import array
+import bisect
+import heapq
+import unicodedata
+import errno
+import tempfile
+import ctypes
+import ctypes.util
+import select
+import struct
+import mimetypes
+from datetime import datetime, timedelta
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file, send_from_directory, Response
+from urllib.parse import quote, parse_qs
+from flask import Flask, request, jsonify, send_file, send_from_directory, Response, stream_with_context
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_options_header, parse_range_header, parse_content_range_header, parse_etags
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Field, File, Data, Epilogue
 import queue
 import uuid
+import atexit
+import collections
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 
@@ -21,8 +58,71 @@ UPLOAD_FOLDER = 'shared_files'
 TEMP_FOLDER = os.path.join(UPLOAD_FOLDER, '.temp')
 DB_FILE = 'file_server.db'
 CHUNK_SIZE = 5 * 1024 * 1024  # 5 MB chunks pour meilleure stabilité
+DB_POOL_SIZE = 16  # Connexions SQLite gardées ouvertes pour réutilisation
+WRITE_BEHIND_QUEUE_SIZE = 10000  # Écritures différées en attente (au-delà, la progression est regroupée hors file)
+WRITE_BEHIND_INTERVAL = 1.0  # Délai max (s) avant l'écriture d'un lot
+WRITE_BEHIND_BATCH = 500  # Taille de lot déclenchant une écriture immédiate
 MAX_CONCURRENT_UPLOADS = 3
 RESUME_TIMEOUT = 3600  # 1 heure pour reprendre un upload
+RECONCILE_INTERVAL = 300  # 5 minutes entre deux resynchronisations de l'index des dossiers
+RECONCILE_ATTEMPTS = 3  # Parcours sans verrou tentés avant une resynchronisation sous verrou
+WATCH_ENABLED = True  # Surveillance inotify du dossier partagé (Linux), sinon resynchronisation périodique seule
+WATCH_COALESCE = 0.5  # Regroupement (s) des événements de fichiers avant mise à jour des index
+WATCH_RECONCILE_INTERVAL = 3600  # Resynchronisation de secours quand la surveillance est active
+SEARCH_PAGE_SIZE = 100  # Résultats par page de recherche
+LISTING_PAGE_SIZE = 200  # Entrées par page de la liste des fichiers côté client
+LISTING_MAX_PAGE_SIZE = 5000  # Entrées max par page demandées par un client
+LISTING_OPTIONAL_FIELDS = ('hash', 'dir_size')  # Champs coûteux de la liste, fournis seulement sur demande
+LISTING_CACHE_ENTRIES = 256  # Pages de liste gardées en mémoire (LRU)
+LISTING_CACHE_BYTES = 64 * 1024 * 1024  # Taille max (JSON) des pages de liste en cache
+ASSET_MAX_AGE = 365 * 24 * 3600  # Cache navigateur (s) des ressources de l'interface, nommées par leur empreinte
+EVENT_HISTORY = 1000  # Événements gardés pour la reprise d'un flux SSE (Last-Event-ID)
+EVENT_FLUSH_INTERVAL = 0.5  # Regroupement (s) des événements fréquents: progression, statistiques
+EVENT_KEEPALIVE = 15  # Délai (s) entre deux commentaires de maintien d'un flux SSE inactif
+WSGI_EVENT_SUBSCRIBERS = 8  # Flux SSE simultanés en mode WSGI (un thread chacun); sans limite en mode ASGI
+SEARCH_MAX_PAGE_SIZE = 1000  # Résultats max par page demandés par un client
+SEARCH_READY_TIMEOUT = 10  # Attente max (s) de la construction initiale de l'index de recherche
+ZIP_READ_SIZE = 1024 * 1024  # Lecture par blocs de 1 MB pour les ZIP en streaming
+ZIP_COMPRESS_LEVEL = 1  # Deflate rapide: le débit réseau compte plus que quelques % de taille
+ZIP_QUEUE_BLOCKS = 4  # Blocs de ZIP produits d'avance au plus, en attente d'envoi au client
+ASSEMBLY_BUFFER_SIZE = 1024 * 1024  # Tampon borné si la copie côté noyau est indisponible
+FINALIZE_WORKERS = 2  # Assemblages de fichiers simultanés en arrière-plan
+PARALLEL_CHUNKS = 4  # Chunks envoyés en parallèle par fichier côté client
+CLIENT_INFLIGHT_BYTES = 64 * 1024 * 1024  # Octets en cours d'envoi max côté client, tous fichiers confondus
+BUNDLE_FILE_LIMIT = 1024 * 1024  # Fichiers envoyés groupés dans une archive tar jusqu'à cette taille
+BUNDLE_MAX_FILES = 500  # Fichiers max par archive groupée
+BUNDLE_MAX_BYTES = 16 * 1024 * 1024  # Taille max d'une archive groupée
+INSTANT_UPLOAD_MIN_SIZE = 8 * 1024 * 1024  # Taille à partir de laquelle le client cherche un contenu identique avant d'envoyer
+DEDUP_WORKERS = 4  # Threads de hachage de la recherche de doublons
+DEDUP_MIN_SIZE = 4096  # Fichiers plus petits ignorés: un lien n'y gagnerait presque rien
+DEDUP_HEAD_SIZE = 64 * 1024  # Octets hachés en tête de fichier avant tout hash complet
+DEDUP_READ_RATE = 64 * 1024 * 1024  # Débit de lecture max (octets/s) de la recherche de doublons
+DEDUP_BUSY_READ_RATE = 8 * 1024 * 1024  # Débit de lecture pendant des écritures d'uploads
+DEDUP_SCAN_INTERVAL = 24 * 3600  # Délai entre deux recherches automatiques de doublons
+FICLONE = 0x40049409  # ioctl Linux de clonage de fichier (reflink sur btrfs/xfs)
+PREALLOCATE_NATIVE = True  # Réserver l'espace des uploads via fallocate(2) quand le système de fichiers le gère
+UPLOAD_SLOTS = 8  # Écritures de chunks simultanées sur le disque, tous clients confondus
+UPLOAD_SLOTS_PER_CLIENT = 4  # Écritures simultanées max pour un même client
+ADMISSION_QUEUE_SIZE = 256  # Écritures en attente d'un créneau avant de refuser (429)
+ADMISSION_WAIT_TIMEOUT = 30  # Attente max (s) d'un créneau d'écriture
+MAX_WRITE_LATENCY = 0.5  # Latence moyenne (s) d'écriture d'un bloc au-delà de laquelle le disque est saturé
+MAX_TEMP_SIZE = 20 * 1024 * 1024 * 1024  # Taille de la zone temporaire au-delà de laquelle les nouveaux uploads attendent
+RETRY_AFTER = 5  # Délai (s) conseillé aux clients refusés
+TUS_VERSION = '1.0.0'
+TUS_EXTENSIONS = 'creation,checksum,termination'
+TUS_CHECKSUM_ALGORITHMS = ('md5', 'sha1', 'sha256')
+ASGI_IO_WORKERS = 32  # Threads d'E/S fichiers partagés par toutes les connexions en mode ASGI
+ASGI_BLOCK_SIZE = 256 * 1024  # Taille des blocs lus/envoyés par réponse en mode ASGI
+ASGI_MAX_FIELD_SIZE = 64 * 1024  # Taille max d'un champ texte multipart
+
+# Formats déjà compressés, stockés sans deflate dans les ZIP
+STORED_EXTENSIONS = {
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.zst',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.avif',
+    '.mp3', '.aac', '.m4a', '.ogg', '.opus', '.flac',
+    '.mp4', '.m4v', '.mkv', '.mov', '.avi', '.webm',
+    '.pdf', '.docx', '.xlsx', '.pptx', '.apk', '.jar', '.epub'
+}
 
 # Configuration Flask optimisée
 app.config['MAX_CONTENT_LENGTH'] = None
@@ -33,6 +133,238 @@ app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(TEMP_FOLDER, exist_ok=True)
 
+class PendingWrite:
+    """Écriture en attente du prochain commit groupé"""
+    __slots__ = ('sql', 'params', 'many', 'done', 'result')
+    
+    def __init__(self, sql, params, many=False):
+        self.sql = sql
+        self.params = params
+        self.many = many
+        self.done = threading.Event()
+        self.result = None
+
+class Database:
+    """Accès SQLite partagé: pool de connexions en mode WAL et commits groupés.
+    Pool plutôt qu'une connexion par thread: le serveur de développement crée un thread par requête
+    et des connexions par thread s'accumuleraient; une connexion empruntée reste à un seul thread."""
+    
+    def __init__(self, path, pool_size=DB_POOL_SIZE):
+        self.path = path
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        self.write_lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        self.pending = []
+    
+    def _connect(self):
+        # cached_statements: les requêtes répétées réutilisent leur statement préparé
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Emprunte une connexion au pool (une seule à la fois par thread)"""
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self.pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    def query(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+    
+    def query_one(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+    
+    def submit(self, sql, params=(), many=False):
+        """Met une écriture en file; l'ordre de soumission est l'ordre d'exécution.
+        Avec many=True, params est une séquence de jeux de paramètres (executemany)."""
+        write = PendingWrite(sql, params, many)
+        with self.pending_lock:
+            self.pending.append(write)
+        return write
+    
+    def wait(self, write):
+        """Attend le commit d'une écriture; le premier thread arrivé commite tout le lot en attente"""
+        with self.write_lock:
+            if not write.done.is_set():
+                with self.pending_lock:
+                    batch, self.pending = self.pending, []
+                self._commit_batch(batch)
+        if isinstance(write.result, Exception):
+            raise write.result
+        return write.result
+    
+    def write(self, sql, params=()):
+        """Écrit et attend le commit (partagé avec les écritures concurrentes); retourne rowcount"""
+        return self.wait(self.submit(sql, params))
+    
+    def _run_write(self, conn, write):
+        if write.many:
+            return conn.executemany(write.sql, write.params).rowcount
+        return conn.execute(write.sql, write.params).rowcount
+    
+    def _commit_batch(self, batch):
+        with self.connection() as conn:
+            try:
+                for write in batch:
+                    write.result = self._run_write(conn, write)
+                conn.commit()
+            except Exception:
+                # Rejouer une par une pour rattacher l'erreur à la bonne écriture
+                conn.rollback()
+                for write in batch:
+                    try:
+                        write.result = self._run_write(conn, write)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        write.result = e
+        for write in batch:
+            write.done.set()
+
+db = Database(DB_FILE)
+
+class WriteBehindLog:
+    """Écritures différées hors du chemin des requêtes: progression des uploads
+    (regroupée par upload) et historique, écrits par lots par un thread dédié"""
+    
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=WRITE_BEHIND_QUEUE_SIZE)
+        self.overflow_lock = threading.Lock()
+        self.overflow = {}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+    
+    def progress(self, upload_id, chunk_bytes, bitmap=None):
+        """Ne bloque jamais (appelé sous le verrou des uploads): file pleine, la progression est
+        regroupée par upload à côté de la file et reprise au prochain lot"""
+        bitmap = bytes(bitmap) if bitmap is not None else None
+        try:
+            self.queue.put_nowait(('progress', upload_id, chunk_bytes, bitmap))
+        except queue.Full:
+            with self.overflow_lock:
+                first = not self.overflow
+                self._merge(self.overflow, upload_id, chunk_bytes, 1, bitmap)
+            if first:
+                # Réveille le thread d'écriture; file encore pleine: il a de toute façon un lot à écrire
+                try:
+                    self.queue.put_nowait(('overflow', None))
+                except queue.Full:
+                    pass
+    
+    @staticmethod
+    def _merge(progress, upload_id, chunk_bytes, chunks, bitmap):
+        entry = progress.setdefault(upload_id, [0, 0, None])
+        entry[0] += chunk_bytes
+        entry[1] += chunks
+        if bitmap is not None:
+            # Les bitmaps ne font que croître: l'union reste juste quel que soit l'ordre de fusion
+            entry[2] = bitmap if entry[2] is None else bytes(a | b for a, b in zip(entry[2], bitmap))
+    
+    def history(self, action, filename, size, ip_address):
+        self.queue.put(('history', (action, filename, size, ip_address, datetime.now())))
+    
+    def history_many(self, entries):
+        """Plusieurs entrées (action, fichier, taille, ip) en une seule mise en file"""
+        now = datetime.now()
+        self.queue.put(('history_many', [(*entry, now) for entry in entries]))
+    
+    def flush(self):
+        """Attend que tout ce qui a été mis en file soit écrit"""
+        done = threading.Event()
+        self.queue.put(('flush', done))
+        done.wait()
+    
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(('stop', None))
+            self.thread.join(timeout=30)
+    
+    def _run(self):
+        progress = {}
+        history = []
+        waiters = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            
+            stop = False
+            if item is not None:
+                kind = item[0]
+                if kind == 'progress':
+                    _, upload_id, chunk_bytes, bitmap = item
+                    self._merge(progress, upload_id, chunk_bytes, 1, bitmap)
+                elif kind == 'overflow':
+                    pass
+                elif kind == 'history':
+                    history.append(item[1])
+                elif kind == 'history_many':
+                    history.extend(item[1])
+                elif kind == 'flush':
+                    waiters.append(item[1])
+                else:
+                    stop = True
+                if deadline is None:
+                    deadline = time.monotonic() + WRITE_BEHIND_INTERVAL
+            
+            # Écrire sur délai écoulé, lot plein, flush demandé ou arrêt
+            if item is None or waiters or stop or len(progress) + len(history) >= WRITE_BEHIND_BATCH:
+                with self.overflow_lock:
+                    overflow, self.overflow = self.overflow, {}
+                for upload_id, (chunk_bytes, chunks, bitmap) in overflow.items():
+                    self._merge(progress, upload_id, chunk_bytes, chunks, bitmap)
+                try:
+                    self._write(progress, history)
+                except Exception:
+                    pass
+                progress = {}
+                history = []
+                deadline = None
+                for done in waiters:
+                    done.set()
+                waiters = []
+            if stop:
+                return
+    
+    def _write(self, progress, history):
+        now = datetime.now()
+        writes = [db.submit('''
+            UPDATE uploads 
+            SET uploaded_size = uploaded_size + ?, uploaded_chunks = uploaded_chunks + ?, updated_at = ?,
+                chunk_bitmap = COALESCE(?, chunk_bitmap)
+            WHERE id = ?
+        ''', (chunk_bytes, chunks, now, bitmap, upload_id)) for upload_id, (chunk_bytes, chunks, bitmap) in progress.items()]
+        if history:
+            writes.append(db.submit('''
+                INSERT INTO history (action, filename, size, ip_address, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            ''', history, many=True))
+        for write in writes:
+            try:
+                db.wait(write)
+            except Exception:
+                pass
+
+write_behind = WriteBehindLog()
+
 # Base de données pour le suivi des transferts
 def init_db():
     conn = sqlite3.connect(DB_FILE)
@@ -67,6 +399,20 @@ def init_db():
         )
     ''')
     
+    # Cache des hash de fichiers, invalidé par (taille, mtime_ns, inode)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS file_hashes (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            inode INTEGER,
+            hash TEXT,
+            updated_at TIMESTAMP
+        )
+    ''')
+    # Recherche des contenus identiques pour l'upload instantané
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_file_hashes_content ON file_hashes (size, hash)')
+    
     # Table pour les favoris
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS favorites (
@@ -77,65 +423,342 @@ def init_db():
         )
     ''')
     
+    # Colonnes ajoutées après la création initiale des tables
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(uploads)')}
+    for column, definition in [('error', 'TEXT'), ('chunk_size', 'INTEGER'), ('chunk_bitmap', 'BLOB')]:
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE uploads ADD COLUMN {column} {definition}')
+    
     conn.commit()
     conn.close()
 
 init_db()
 
+def preallocate(fd, size):
+    """Donne au fichier sa taille finale. Par défaut un simple ftruncate (fichier creux); l'espace
+    n'est réservé que par un fallocate(2) natif. os.posix_fallocate n'est pas utilisé: la glibc
+    l'émule en écrivant des zéros sur toute la taille quand le système de fichiers ne le gère pas."""
+    os.ftruncate(fd, size)
+    if not PREALLOCATE_NATIVE or size <= 0:
+        return False
+    global _fallocate
+    if _fallocate is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            _fallocate = getattr(libc, 'fallocate64', None) or libc.fallocate
+            _fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+        except (OSError, AttributeError):
+            _fallocate = False
+    if not _fallocate:
+        return False
+    # Mode 0: réserve les blocs sans toucher au contenu; EOPNOTSUPP si non géré (le fichier reste creux)
+    return _fallocate(fd, 0, 0, size) == 0
+
+_fallocate = None
+
 # Gestionnaires globaux
 upload_queue = queue.Queue()
 active_uploads = {}
 active_downloads = {}
 
+class UploadDigest:
+    """MD5 d'un upload calculé pendant la réception, dans l'ordre du fichier.
+    Le chunk à la frontière est haché pendant son écriture; ceux arrivés en avance
+    sont relus (depuis le cache de pages) quand la frontière les atteint."""
+    
+    def __init__(self, upload_id):
+        self.upload_id = upload_id
+        self.md5 = hashlib.md5()
+        self.frontier = 0  # Prochain chunk à hacher
+        self.lock = threading.Lock()
+    
+    def start(self, chunk_index):
+        """Copie du MD5 courant si le chunk est à la frontière (haché pendant son écriture), sinon None"""
+        with self.lock:
+            return self.md5.copy() if chunk_index == self.frontier else None
+    
+    def advance(self, state, chunk_index=None, md5=None):
+        """Intègre un chunk haché pendant son écriture, puis les chunks suivants déjà reçus"""
+        with self.lock:
+            if md5 is not None and chunk_index == self.frontier:
+                self.md5 = md5
+                self.frontier += 1
+            bitmap = state['bitmap']
+            while self.frontier < state['total_chunks'] and bitmap[self.frontier // 8] & (1 << (self.frontier % 8)):
+                self._read_chunk(state, self.frontier)
+                self.frontier += 1
+    
+    def _read_chunk(self, state, index):
+        offset = index * state['chunk_size']
+        remaining = max(0, min(state['chunk_size'], state['total_size'] - offset))
+        fd = os.open(state['data_path'], os.O_RDONLY)
+        try:
+            while remaining > 0:
+                block = os.pread(fd, min(ASSEMBLY_BUFFER_SIZE, remaining), offset)
+                if not block:
+                    break
+                self.md5.update(block)
+                offset += len(block)
+                remaining -= len(block)
+        finally:
+            os.close(fd)
+    
+    def hexdigest(self, state):
+        """MD5 du fichier complet (None si des chunks manquent)"""
+        self.advance(state)
+        with self.lock:
+            return self.md5.hexdigest() if self.frontier >= state['total_chunks'] else None
+
+class UploadNotFound(LookupError):
+    """Identifiant d'upload mal formé ou inconnu: réponse 404, sans jamais toucher au disque"""
+
+class UploadCompleted(Exception):
+    """Chunk renvoyé pour un upload déjà terminé (réponse perdue en route): accepté sans rien réécrire"""
+    
+    def __init__(self, upload_id):
+        super().__init__(upload_id)
+        self.upload_id = upload_id
+    
+    def response(self):
+        return {'success': True, 'upload_id': self.upload_id, 'status': 'completed'}
+
 class UploadManager:
+    # Identifiants émis par le serveur (uuid4().hex): seuls autorisés dans les chemins temporaires
+    ID_RE = re.compile(r'[0-9a-f]{32}')
+    
     def __init__(self):
         self.active_uploads = {}
-        self.upload_lock = threading.Lock()
+        self.upload_lock = threading.RLock()
+    
+    def start_upload(self, upload_id, filename, total_size, total_chunks, path, relative_path="", chunk_size=0):
+        # Jamais de REPLACE: un upload terminé ne doit pas repartir à zéro
+        db.write('''
+            INSERT INTO uploads 
+            (id, filename, total_size, uploaded_size, total_chunks, uploaded_chunks, status, created_at, updated_at, path, relative_path, chunk_size, chunk_bitmap)
+            VALUES (?, ?, ?, 0, ?, 0, 'active', ?, ?, ?, ?, ?, ?)
+        ''', (upload_id, filename, total_size, total_chunks, datetime.now(), datetime.now(), path, relative_path,
+              chunk_size, bytes((total_chunks + 7) // 8)))
     
-    def start_upload(self, upload_id, filename, total_size, total_chunks, path, relative_path=""):
+    def update_chunk(self, upload_id, chunk_size, bitmap=None):
+        """Progression écrite en différé, regroupée par upload"""
+        write_behind.progress(upload_id, chunk_size, bitmap)
+    
+    def complete_upload(self, upload_id):
+        db.write('UPDATE uploads SET status = "completed" WHERE id = ?', (upload_id,))
         with self.upload_lock:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO uploads 
-                (id, filename, total_size, uploaded_size, total_chunks, uploaded_chunks, status, created_at, updated_at, path, relative_path)
-                VALUES (?, ?, ?, 0, ?, 0, 'active', ?, ?, ?, ?)
-            ''', (upload_id, filename, total_size, total_chunks, datetime.now(), datetime.now(), path, relative_path))
-            
-            conn.commit()
-            conn.close()
+            self.active_uploads.pop(upload_id, None)
+        event_bus.post('upload', {'upload_id': upload_id, 'status': 'completed'}, key=('upload', upload_id))
+    
+    def _restore(self, upload_id):
+        """Recharge depuis la base une session interrompue (redémarrage du serveur)"""
+        row = db.query_one('''
+            SELECT filename, total_size, total_chunks, chunk_size, chunk_bitmap, path, relative_path, status
+            FROM uploads WHERE id = ?
+        ''', (upload_id,))
+        
+        if not row or row[7] not in ('active', 'finalizing'):
+            return None
+        filename, total_size, total_chunks, chunk_size, bitmap, path, relative_path, _ = row
+        if not chunk_size:
+            # Session d'avant l'écriture directe (chunks en fichiers .partN): expirée, le client recommence
+            self.abort_upload(upload_id, 'expired')
+            return None
+        data_path = os.path.join(TEMP_FOLDER, f"{upload_id}.data")
+        if not os.path.exists(data_path):
+            return None
+        
+        bitmap = bytearray(bitmap or bytes((total_chunks + 7) // 8))
+        return {
+            'filename': filename,
+            'path': path,
+            'relative_path': relative_path,
+            'data_path': data_path,
+            'total_size': total_size,
+            'chunk_size': chunk_size,
+            'total_chunks': total_chunks,
+            'bitmap': bitmap,
+            'received': sum(bin(byte).count('1') for byte in bitmap),
+            'finalizing': False,
+            'digest': UploadDigest(upload_id)
+        }
+    
+    def chunk_session(self, upload_id):
+        """Session destinataire d'un chunk; UploadCompleted si l'upload est déjà terminé,
+        UploadNotFound s'il n'existe pas (ou plus)"""
+        state = self.get_session(upload_id)
+        if state is None:
+            status = self.get_upload_status(upload_id) if self.ID_RE.fullmatch(upload_id or '') else None
+            if status and status['status'] == 'completed':
+                raise UploadCompleted(upload_id)
+            raise UploadNotFound('Session non trouvée')
+        return state
     
-    def update_chunk(self, upload_id, chunk_size):
+    def get_session(self, upload_id):
+        """Session en cours (mémoire, sinon base de données) ou None"""
+        if not self.ID_RE.fullmatch(upload_id or ''):
+            return None
         with self.upload_lock:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE uploads 
-                SET uploaded_size = uploaded_size + ?, uploaded_chunks = uploaded_chunks + 1, updated_at = ?
-                WHERE id = ?
-            ''', (chunk_size, datetime.now(), upload_id))
-            
-            conn.commit()
-            conn.close()
+            state = self.active_uploads.get(upload_id)
+            if state is None:
+                state = self._restore(upload_id)
+                if state is not None:
+                    self.active_uploads[upload_id] = state
+            return state
     
-    def complete_upload(self, upload_id):
+    def open_upload(self, upload_id, filename, total_size, total_chunks, path, relative_path="", chunk_size=CHUNK_SIZE):
+        """Prépare le suivi d'un upload (bitmap des chunks reçus), quel que soit l'ordre d'arrivée,
+        et crée le fichier .data à sa taille finale. Création du fichier et insertion en base se font
+        hors du verrou global: les autres uploads continuent pendant ce temps."""
+        state = self.get_session(upload_id)
+        if state is not None:
+            return state
+        if db.query_one('SELECT 1 FROM uploads WHERE id = ?', (upload_id,)):
+            raise ValueError('Upload déjà terminé ou annulé')
+        data_path = os.path.join(TEMP_FOLDER, f"{upload_id}.data")
+        fd = os.open(data_path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            preallocate(fd, total_size)
+        finally:
+            os.close(fd)
+        dir_index.file_added(data_path)
+        self.start_upload(upload_id, filename, total_size, total_chunks, path, relative_path, chunk_size)
+        
+        state = {
+            'filename': filename,
+            'path': path,
+            'relative_path': relative_path,
+            'data_path': data_path,
+            'total_size': total_size,
+            'chunk_size': chunk_size,
+            'total_chunks': total_chunks,
+            'bitmap': bytearray((total_chunks + 7) // 8),
+            'received': 0,
+            'finalizing': False,
+            'digest': UploadDigest(upload_id)
+        }
         with self.upload_lock:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            
-            cursor.execute('UPDATE uploads SET status = "completed" WHERE id = ?', (upload_id,))
-            conn.commit()
-            conn.close()
+            self.active_uploads[upload_id] = state
+        return state
     
-    def get_upload_status(self, upload_id):
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+    def mark_chunk(self, upload_id, chunk_index, chunk_bytes):
+        """Marque un chunk reçu et persiste le bitmap; retourne (nouveau, complet)"""
+        with self.upload_lock:
+            state = self.active_uploads[upload_id]
+            byte, bit = divmod(chunk_index, 8)
+            is_new = not state['bitmap'][byte] & (1 << bit)
+            if is_new:
+                state['bitmap'][byte] |= 1 << bit
+                state['received'] += 1
+                # Mis en file sous le verrou: les instantanés du bitmap sont écrits dans l'ordre
+                self.update_chunk(upload_id, chunk_bytes, state['bitmap'])
+                event_bus.post('upload', {
+                    'upload_id': upload_id,
+                    'filename': state['filename'],
+                    'received_chunks': state['received'],
+                    'total_chunks': state['total_chunks']
+                }, key=('upload', upload_id))
+            return is_new, self.claim_finalize(upload_id)
+    
+    def tus_offset(self, upload_id):
+        """Retourne (offset, taille totale) tus: octets reçus sans trou depuis le début du fichier.
+        Après un redémarrage, l'offset repart de la fin du dernier chunk contigu du bitmap."""
+        with self.upload_lock:
+            state = self.get_session(upload_id)
+            if state is None:
+                return None
+            if 'offset' not in state:
+                index = 0
+                while index < state['total_chunks'] and state['bitmap'][index // 8] & (1 << (index % 8)):
+                    index += 1
+                state['offset'] = min(index * state['chunk_size'], state['total_size'])
+            return state['offset'], state['total_size']
+    
+    def advance_offset(self, upload_id, offset):
+        """Avance l'offset tus et marque les chunks désormais complets; retourne vrai si l'upload l'est"""
+        with self.upload_lock:
+            state = self.active_uploads[upload_id]
+            previous = state['offset']
+            state['offset'] = offset
+            chunk_size = state['chunk_size']
+            is_complete = False
+            for index in range(previous // chunk_size, state['total_chunks']):
+                start = index * chunk_size
+                end = min(start + chunk_size, state['total_size'])
+                if end > offset:
+                    break
+                _, is_complete = self.mark_chunk(upload_id, index, end - start)
+            return is_complete
+    
+    def tus_lock(self, upload_id):
+        """Un seul PATCH à la fois par upload"""
+        with self.upload_lock:
+            state = self.get_session(upload_id)
+            if state is None or state.get('tus_busy'):
+                return False
+            state['tus_busy'] = True
+            return True
+    
+    def tus_unlock(self, upload_id):
+        with self.upload_lock:
+            state = self.active_uploads.get(upload_id)
+            if state is not None:
+                state['tus_busy'] = False
+    
+    def claim_finalize(self, upload_id):
+        """Vrai une seule fois, quand tous les chunks sont reçus"""
+        with self.upload_lock:
+            state = self.active_uploads.get(upload_id)
+            if state is None or state['finalizing'] or state['received'] < state['total_chunks']:
+                return False
+            state['finalizing'] = True
+            return True
+    
+    def session_info(self, upload_id):
+        """Inventaire d'une session: plages de chunks reçus et manquants"""
+        with self.upload_lock:
+            state = self.get_session(upload_id)
+            if state is None:
+                return None
+            bitmap = bytes(state['bitmap'])
+            total_chunks = state['total_chunks']
+            return {
+                'upload_id': upload_id,
+                'status': 'finalizing' if state['finalizing'] else 'active',
+                'file_size': state['total_size'],
+                'chunk_size': state['chunk_size'],
+                'total_chunks': total_chunks,
+                'received_chunks': state['received'],
+                'received': chunk_ranges(bitmap, total_chunks, True),
+                'missing': chunk_ranges(bitmap, total_chunks, False)
+            }
+    
+    def abort_upload(self, upload_id, status='cancelled'):
+        """Abandonne un upload et supprime ses données temporaires; retourne False si l'upload est inconnu"""
+        if not self.ID_RE.fullmatch(upload_id or '') or \
+                db.query_one('SELECT 1 FROM uploads WHERE id = ?', (upload_id,)) is None:
+            return False
+        with self.upload_lock:
+            self.active_uploads.pop(upload_id, None)
+            self.set_status(upload_id, status)
         
-        cursor.execute('SELECT * FROM uploads WHERE id = ?', (upload_id,))
-        result = cursor.fetchone()
-        conn.close()
+        data_path = os.path.join(TEMP_FOLDER, f"{upload_id}.data")
+        if os.path.exists(data_path):
+            size = os.path.getsize(data_path)
+            os.remove(data_path)
+            dir_index.file_removed(data_path, size)
+        temp_dir = os.path.join(TEMP_FOLDER, upload_id)
+        if os.path.isdir(temp_dir):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            dir_index.dir_removed(temp_dir)
+        return True
+    
+    def set_status(self, upload_id, status, error=None):
+        db.write('UPDATE uploads SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+                 (status, error, datetime.now(), upload_id))
+        event_bus.post('upload', {'upload_id': upload_id, 'status': status, 'error': error}, key=('upload', upload_id))
+    
+    def get_upload_status(self, upload_id):
+        result = db.query_one('SELECT * FROM uploads WHERE id = ?', (upload_id,))
         
         if result:
             return {
@@ -146,10 +769,27 @@ class UploadManager:
                 'total_chunks': result[4],
                 'uploaded_chunks': result[5],
                 'status': result[6],
+                'error': result[11],
                 'progress': (result[3] / result[2]) * 100 if result[2] > 0 else 0
             }
         return None
 
+def chunk_ranges(bitmap, total_chunks, received=True):
+    """Plages [premier, dernier] des chunks reçus (ou manquants) d'après un bitmap"""
+    ranges = []
+    start = None
+    for index in range(total_chunks):
+        present = bool(bitmap[index >> 3] & (1 << (index & 7)))
+        if present == received:
+            if start is None:
+                start = index
+        elif start is not None:
+            ranges.append([start, index - 1])
+            start = None
+    if start is not None:
+        ranges.append([start, total_chunks - 1])
+    return ranges
+
 upload_manager = UploadManager()
 
 def get_local_ip():
@@ -162,18 +802,6 @@ def get_local_ip():
     except:
         return "localhost"
 
-def get_directory_size(path):
-    total = 0
-    try:
-        for dirpath, dirnames, filenames in os.walk(path):
-            for filename in filenames:
-                filepath = os.path.join(dirpath, filename)
-                if os.path.exists(filepath):
-                    total += os.path.getsize(filepath)
-    except:
-        pass
-    return total
-
 def format_size(bytes_size):
     if bytes_size == 0:
         return "0 B"
@@ -187,26 +815,2030 @@ def get_file_hash(filepath):
     hash_md5 = hashlib.md5()
     try:
         with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
                 hash_md5.update(chunk)
         return hash_md5.hexdigest()
     except:
         return None
 
 def add_to_history(action, filename, size, ip_address):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    write_behind.history(action, filename, size, ip_address)
+
+class FileHashCache:
+    """Cache persistant des hash MD5 avec calcul en arrière-plan"""
     
-    cursor.execute('''
-        INSERT INTO history (action, filename, size, ip_address, timestamp)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (action, filename, size, ip_address, datetime.now()))
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.queue = queue.Queue()
+        self.worker = None
     
-    conn.commit()
-    conn.close()
+    def path_key(self, file_path):
+        """Clé d'un fichier dans le cache: chemin relatif au partage, séparateurs '/'"""
+        return os.path.relpath(file_path, UPLOAD_FOLDER).replace(os.sep, '/')
+    
+    def lookup_many(self, entries, schedule=True):
+        """Retourne {chemin: hash} pour les entrées (chemin, stat) à jour, planifie les autres"""
+        hashes = {}
+        if not entries:
+            return hashes
+        
+        keys = {self.path_key(file_path): (file_path, stats) for file_path, stats in entries}
+        rows = {}
+        with db.connection() as conn:
+            key_list = list(keys)
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                cursor = conn.execute(
+                    f'SELECT path, size, mtime_ns, inode, hash FROM file_hashes WHERE path IN ({placeholders})',
+                    batch)
+                for row in cursor.fetchall():
+                    rows[row[0]] = row
+        
+        for key, (file_path, stats) in keys.items():
+            row = rows.get(key)
+            if row and row[1:4] == (stats.st_size, stats.st_mtime_ns, stats.st_ino):
+                hashes[file_path] = row[4]
+            elif schedule:
+                self.schedule(file_path)
+        return hashes
+    
+    def store(self, file_path, file_hash, stats=None):
+        """Enregistre le hash d'un fichier pour son état (taille, mtime, inode) actuel"""
+        if stats is None:
+            stats = os.stat(file_path)
+        db.write('''
+            INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, inode, hash, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (self.path_key(file_path), stats.st_size, stats.st_mtime_ns, stats.st_ino, file_hash, datetime.now()))
+    
+    def store_many(self, entries):
+        """Enregistre les hash de plusieurs fichiers (chemin, hash) en un seul commit"""
+        rows = []
+        now = datetime.now()
+        for file_path, file_hash in entries:
+            stats = os.stat(file_path)
+            rows.append((self.path_key(file_path), stats.st_size, stats.st_mtime_ns, stats.st_ino, file_hash, now))
+        if rows:
+            db.wait(db.submit('''
+                INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, inode, hash, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows, many=True))
+    
+    def count_size(self, size):
+        """Nombre de fichiers connus de cette taille (candidats à l'upload instantané)"""
+        return db.query_one('SELECT COUNT(*) FROM file_hashes WHERE size = ?', (size,))[0]
+    
+    def find(self, size, file_hash):
+        """Chemin d'un fichier partagé de cette taille et de ce hash, vérifié sur disque, ou None"""
+        temp_key = self.path_key(TEMP_FOLDER) + '/'
+        rows = db.query('SELECT path, mtime_ns, inode FROM file_hashes WHERE size = ? AND hash = ?',
+                        (size, file_hash))
+        for key, mtime_ns, inode in rows:
+            if key.startswith(temp_key):
+                continue
+            file_path = os.path.join(UPLOAD_FOLDER, key)
+            try:
+                stats = os.stat(file_path)
+            except OSError:
+                continue
+            if (stats.st_size, stats.st_mtime_ns, stats.st_ino) == (size, mtime_ns, inode):
+                return file_path
+        return None
+    
+    def forget(self, path):
+        """Supprime les entrées d'un fichier ou de toute une arborescence"""
+        key = self.path_key(path)
+        db.write("DELETE FROM file_hashes WHERE path = ? OR substr(path, 1, ?) = ?",
+                 (key, len(key) + 1, key + '/'))
+    
+    def schedule(self, file_path):
+        with self.lock:
+            if file_path in self.pending:
+                return
+            self.pending.add(file_path)
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, daemon=True)
+                self.worker.start()
+        self.queue.put(file_path)
+    
+    def _run(self):
+        while True:
+            file_path = self.queue.get()
+            try:
+                before = os.stat(file_path)
+                file_hash = get_file_hash(file_path)
+                after = os.stat(file_path)
+                # Ne pas mémoriser un hash calculé pendant que le fichier changeait
+                if file_hash and (before.st_size, before.st_mtime_ns, before.st_ino) == \
+                        (after.st_size, after.st_mtime_ns, after.st_ino):
+                    self.store(file_path, file_hash, after)
+                    # La liste du dossier passe de 'pending' au hash: nouvelle ETag
+                    dir_generations.touch(dir_index._rel(os.path.dirname(file_path)))
+            except OSError:
+                pass
+            finally:
+                with self.lock:
+                    self.pending.discard(file_path)
+
+hash_cache = FileHashCache()
+
+class IoThrottle:
+    """Limiteur de débit de lecture partagé par les threads d'un travail de fond"""
+    
+    def __init__(self, rate, busy_rate):
+        self.rate = rate
+        self.busy_rate = busy_rate
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+    
+    def consume(self, size):
+        """Réserve un créneau pour lire size octets et attend son début"""
+        # Débit réduit tant que des uploads écrivent: le travail de fond ne les ralentit pas
+        rate = self.busy_rate if upload_admission.in_use else self.rate
+        with self.lock:
+            now = time.monotonic()
+            start = max(self.next_time, now)
+            self.next_time = start + size / rate
+        if start > now:
+            time.sleep(start - now)
+
+class DuplicateFinder:
+    """Recherche en arrière-plan des fichiers au contenu identique: taille, puis hash de tête, puis hash complet"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.throttle = IoThrottle(DEDUP_READ_RATE, DEDUP_BUSY_READ_RATE)
+        self.thread = None
+        self.status = 'idle'
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {'files': 0, 'candidates': 0, 'hashed_bytes': 0}
+        self.groups = []  # (taille, hash, [(chemin, stat)])
+    
+    def start(self):
+        """Lance une recherche si aucune n'est en cours; retourne False sinon"""
+        with self.lock:
+            if self.status == 'running':
+                return False
+            self.status = 'running'
+            self.error = None
+            self.started_at = datetime.now()
+            self.progress = {'files': 0, 'candidates': 0, 'hashed_bytes': 0}
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return True
+    
+    def due(self):
+        if self.status == 'running':
+            return False
+        return self.finished_at is None or datetime.now() - self.finished_at > timedelta(seconds=DEDUP_SCAN_INTERVAL)
+    
+    def _scan(self):
+        """Fichiers réguliers du partage, hors zone temporaire et liens symboliques"""
+        entries = []
+        stack = [UPLOAD_FOLDER]
+        temp_folder = os.path.abspath(TEMP_FOLDER)
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if os.path.abspath(entry.path) != temp_folder:
+                                    stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                stats = entry.stat(follow_symlinks=False)
+                                if stats.st_size >= DEDUP_MIN_SIZE:
+                                    entries.append((entry.path, stats))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return entries
+    
+    def _hash(self, file_path, stats, limit=None):
+        """MD5 des limit premiers octets (tout le fichier par défaut), None si le fichier a changé"""
+        remaining = stats.st_size if limit is None else min(limit, stats.st_size)
+        digest = hashlib.md5()
+        try:
+            with open(file_path, 'rb') as f:
+                while remaining > 0:
+                    size = min(ASSEMBLY_BUFFER_SIZE, remaining)
+                    self.throttle.consume(size)
+                    block = f.read(size)
+                    if not block:
+                        return None
+                    digest.update(block)
+                    remaining -= len(block)
+                    with self.lock:
+                        self.progress['hashed_bytes'] += len(block)
+            after = os.stat(file_path)
+        except OSError:
+            return None
+        if not self._unchanged(stats, after):
+            return None
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _inode(stats):
+        """Identité d'un fichier: un numéro d'inode n'est unique qu'au sein d'un système de fichiers"""
+        return stats.st_dev, stats.st_ino
+    
+    @classmethod
+    def _unchanged(cls, before, after):
+        return (before.st_size, before.st_mtime_ns, cls._inode(before)) == \
+            (after.st_size, after.st_mtime_ns, cls._inode(after))
+    
+    def _split(self, groups, pool, key):
+        """Redécoupe des groupes de candidats selon key(chemin, stat) calculé dans le pool"""
+        entries = [entry for group in groups for entry in group]
+        # Un seul calcul par inode: les liens physiques d'un même fichier partagent le résultat
+        inodes = {}
+        for file_path, stats in entries:
+            inodes.setdefault(self._inode(stats), (file_path, stats))
+        values = dict(zip(inodes, pool.map(lambda entry: key(*entry), inodes.values())))
+        split = collections.defaultdict(list)
+        for file_path, stats in entries:
+            value = values[self._inode(stats)]
+            if value is not None:
+                split[(stats.st_size, value)].append((file_path, stats))
+        return split
+    
+    def _run(self):
+        try:
+            entries = self._scan()
+            with self.lock:
+                self.progress['files'] = len(entries)
+            
+            # 1. Même taille, et au moins deux inodes distincts (les liens physiques existants ne comptent pas)
+            by_size = collections.defaultdict(list)
+            for file_path, stats in entries:
+                by_size[stats.st_size].append((file_path, stats))
+            candidates = [group for group in by_size.values()
+                          if len({self._inode(stats) for _, stats in group}) > 1]
+            with self.lock:
+                self.progress['candidates'] = sum(len(group) for group in candidates)
+            
+            with ThreadPoolExecutor(max_workers=DEDUP_WORKERS, thread_name_prefix='dedup') as pool:
+                # 2. Hash de tête: écarte à peu de frais les fichiers qui diffèrent dès le début
+                by_head = self._split(candidates, pool,
+                                      lambda file_path, stats: self._hash(file_path, stats, DEDUP_HEAD_SIZE))
+                groups = {}
+                to_hash = []
+                for (size, head), group in by_head.items():
+                    if len({self._inode(stats) for _, stats in group}) < 2:
+                        continue
+                    if size <= DEDUP_HEAD_SIZE:
+                        groups[(size, head)] = group  # Fichier lu en entier: le hash de tête est le hash complet
+                    else:
+                        to_hash.append(group)
+                
+                # 3. Hash complet: cache des hash d'abord, lecture seulement pour les autres
+                known = hash_cache.lookup_many([entry for group in to_hash for entry in group], schedule=False)
+                computed = []
+                
+                def full_hash(file_path, stats):
+                    if file_path in known:
+                        return known[file_path]
+                    file_hash = self._hash(file_path, stats)
+                    if file_hash:
+                        computed.append((file_path, file_hash))
+                    return file_hash
+                
+                groups.update(self._split(to_hash, pool, full_hash))
+            
+            try:
+                hash_cache.store_many(computed)
+            except OSError:
+                pass
+            
+            result = [(size, file_hash, sorted(group))
+                      for (size, file_hash), group in groups.items()
+                      if len({self._inode(stats) for _, stats in group}) > 1]
+            result.sort(key=lambda group: -self._reclaimable(group))
+            with self.lock:
+                self.groups = result
+                self.status = 'done'
+        except Exception as e:
+            with self.lock:
+                self.status = 'error'
+                self.error = str(e)
+        finally:
+            self.finished_at = datetime.now()
+    
+    @classmethod
+    def _reclaimable(cls, group):
+        size, file_hash, entries = group
+        return size * (len({cls._inode(stats) for _, stats in entries}) - 1)
+    
+    def report(self):
+        with self.lock:
+            groups = [{
+                'size': group[0],
+                'hash': group[1],
+                'files': [hash_cache.path_key(file_path) for file_path, _ in group[2]],
+                'copies': len({self._inode(stats) for _, stats in group[2]}),
+                'reclaimable': self._reclaimable(group)
+            } for group in self.groups]
+            return {
+                'status': self.status,
+                'error': self.error,
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+                'progress': dict(self.progress),
+                'groups': groups,
+                'reclaimable': sum(group['reclaimable'] for group in groups)
+            }
+    
+    def reclaim(self, file_hash=None):
+        """Remplace les copies par des liens vers un même fichier; retourne (octets libérés, fichiers liés)"""
+        with self.lock:
+            if self.status == 'running':
+                raise ValueError('Recherche de doublons en cours')
+            groups = [group for group in self.groups if file_hash is None or group[1] == file_hash]
+        
+        reclaimed = 0
+        linked = 0
+        for size, group_hash, entries in groups:
+            # Le fichier ayant déjà le plus de liens est conservé
+            keep_path, keep_stats = max(entries, key=lambda entry: entry[1].st_nlink)
+            try:
+                current = os.stat(keep_path)
+            except OSError:
+                continue
+            if not self._unchanged(keep_stats, current):
+                continue
+            shared_inodes = {self._inode(keep_stats)}
+            failed = []
+            for file_path, stats in entries:
+                if self._inode(stats) == self._inode(keep_stats):
+                    continue
+                try:
+                    # Fichier modifié depuis la recherche: on n'y touche pas
+                    current = os.stat(file_path)
+                    if not self._unchanged(stats, current):
+                        continue
+                    clone_file(keep_path, file_path, fallback_copy=False, keep_stat=True)
+                except OSError:
+                    failed.append((file_path, stats))
+                    continue
+                hash_cache.store(file_path, group_hash)
+                if self._inode(stats) not in shared_inodes:
+                    shared_inodes.add(self._inode(stats))
+                    reclaimed += size
+                linked += 1
+            
+            # Seules les copies qui n'ont pas pu être liées restent signalées
+            remaining = [(keep_path, keep_stats)] + failed
+            with self.lock:
+                self.groups = [(size, group_hash, remaining) if g[:2] == (size, group_hash) else g
+                               for g in self.groups
+                               if g[:2] != (size, group_hash) or failed]
+        return reclaimed, linked
+
+duplicate_finder = DuplicateFinder()
+
+class DirectoryIndex:
+    """Index incrémental des dossiers: taille, nombre de fichiers et dernière modification du sous-arbre"""
+    
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.RLock()
+        self.dirs = None
+        self.reconciler = None
+        self.reconcile_interval = RECONCILE_INTERVAL
+        self.version = 0  # Incrémenté à chaque mise à jour: une relecture concurrente est détectée
+        self.listeners = []
+    
+    def subscribe(self, listener):
+        """Abonne un index secondaire aux changements: listener(événement, chemin relatif, données)"""
+        self.listeners.append(listener)
+    
+    def _notify(self, event, rel, data=None):
+        for listener in self.listeners:
+            try:
+                listener(event, rel, data)
+            except Exception:
+                pass
+    
+    def _rel(self, path):
+        rel = os.path.relpath(path, self.root)
+        return '' if rel == '.' else rel.replace(os.sep, '/')
+    
+    def _chain(self, rel):
+        """Le dossier puis tous ses parents jusqu'à la racine"""
+        while True:
+            yield rel
+            if not rel:
+                return
+            rel = rel.rpartition('/')[0]
+    
+    def _scan(self, rel, files=None):
+        """Parcourt un sous-arbre et retourne ses agrégats {dossier: entrée};
+        si files est une liste, y ajoute (chemin, taille, mtime, dossier) de chaque élément"""
+        found = {}
+        order = []
+        stack = [rel]
+        while stack:
+            current = stack.pop()
+            entry = {'size': 0, 'files': 0, 'own_files': 0, 'modified': 0.0}
+            found[current] = entry
+            order.append(current)
+            try:
+                with os.scandir(os.path.join(self.root, current)) as it:
+                    for item in it:
+                        try:
+                            item_rel = f"{current}/{item.name}" if current else item.name
+                            if item.is_dir(follow_symlinks=False):
+                                stack.append(item_rel)
+                                if files is not None:
+                                    files.append((item_rel, 0, item.stat().st_mtime, True))
+                            else:
+                                stats = item.stat()
+                                entry['size'] += stats.st_size
+                                entry['own_files'] += 1
+                                entry['modified'] = max(entry['modified'], stats.st_mtime)
+                                if files is not None:
+                                    files.append((item_rel, stats.st_size, stats.st_mtime, False))
+                        except OSError:
+                            continue
+            except OSError:
+                pass
+            entry['files'] = entry['own_files']
+        
+        # Remonter les totaux des sous-dossiers vers leurs parents
+        for current in reversed(order):
+            if current == rel:
+                continue
+            parent = found[current.rpartition('/')[0]]
+            child = found[current]
+            parent['size'] += child['size']
+            parent['files'] += child['files']
+            parent['modified'] = max(parent['modified'], child['modified'])
+        return found
+    
+    def _ensure(self):
+        if self.dirs is None:
+            files = []
+            self.dirs = self._scan('', files)
+            self._notify('scan', '', files)
+            if self.reconciler is None:
+                self.reconciler = threading.Thread(target=self._reconcile_loop, daemon=True)
+                self.reconciler.start()
+    
+    def _apply(self, rel, size, files, modified=None):
+        self.version += 1
+        for current in self._chain(rel):
+            entry = self.dirs.setdefault(current, {'size': 0, 'files': 0, 'own_files': 0, 'modified': 0.0})
+            entry['size'] += size
+            entry['files'] += files
+            if modified is not None:
+                entry['modified'] = max(entry['modified'], modified)
+    
+    def _merge(self, rel):
+        files = []
+        subtree = self._scan(rel, files)
+        self._notify('scan', rel, files)
+        top = subtree.pop(rel)
+        self.dirs.update(subtree)
+        self.dirs[rel] = {'size': 0, 'files': 0, 'own_files': top['own_files'], 'modified': 0.0}
+        self._apply(rel, top['size'], top['files'], top['modified'])
+    
+    def get(self, path):
+        """Agrégats d'un dossier, indexé à la volée s'il a été créé hors du serveur"""
+        rel = self._rel(path)
+        with self.lock:
+            self._ensure()
+            if rel not in self.dirs:
+                if not os.path.isdir(path):
+                    return None
+                self._merge(rel)
+            return dict(self.dirs[rel])
+    
+    def file_added(self, file_path, previous_size=None):
+        """À appeler après l'écriture d'un fichier (previous_size s'il en remplaçait un)"""
+        try:
+            stats = os.stat(file_path)
+        except OSError:
+            return
+        rel = self._rel(os.path.dirname(file_path))
+        with self.lock:
+            self._ensure()
+            if previous_size is None:
+                self._apply(rel, stats.st_size, 1, stats.st_mtime)
+                self.dirs[rel]['own_files'] += 1
+            else:
+                self._apply(rel, stats.st_size - previous_size, 0, stats.st_mtime)
+            self._notify('file', self._rel(file_path), stats)
+    
+    def file_removed(self, file_path, size):
+        rel = self._rel(os.path.dirname(file_path))
+        with self.lock:
+            self._ensure()
+            if rel in self.dirs:
+                self._apply(rel, -size, -1)
+                self.dirs[rel]['own_files'] -= 1
+            self._notify('removed', self._rel(file_path))
+    
+    def dir_created(self, path):
+        rel = self._rel(path)
+        with self.lock:
+            self._ensure()
+            # Le plus haut dossier inconnu de l'index est relu: il a pu être rempli hors du serveur
+            missing = None
+            for current in self._chain(rel):
+                if current in self.dirs:
+                    break
+                missing = current
+            if missing is not None:
+                self._merge(missing)
+            self._notify('dir', rel)
+    
+    def dir_removed(self, path):
+        rel = self._rel(path)
+        with self.lock:
+            self._ensure()
+            self._notify('removed', rel)
+            entry = self.dirs.get(rel)
+            if entry is None:
+                return
+            prefix = rel + '/' if rel else ''
+            for key in [k for k in self.dirs if k == rel or k.startswith(prefix)]:
+                del self.dirs[key]
+            self.version += 1
+            parent = rel.rpartition('/')[0]
+            if rel and parent in self.dirs:
+                self._apply(parent, -entry['size'], -entry['files'])
+    
+    def refresh(self, path, names=()):
+        """Resynchronise les fichiers propres d'un dossier modifié hors du serveur et notifie les
+        fichiers names. Recalculé depuis le disque: sans effet si l'écriture est déjà prise en compte."""
+        own_size = own_files = 0
+        modified = 0.0
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            subdirs.append(item.name)
+                        else:
+                            stats = item.stat()
+                            own_size += stats.st_size
+                            own_files += 1
+                            modified = max(modified, stats.st_mtime)
+                    except OSError:
+                        continue
+        except OSError:
+            return
+        
+        rel = self._rel(path)
+        prefix = rel + '/' if rel else ''
+        with self.lock:
+            self._ensure()
+            entry = self.dirs.get(rel)
+            if entry is None:
+                self._merge(rel)
+                return
+            # Taille des fichiers propres indexée: le total moins celui des sous-dossiers
+            indexed_size = entry['size'] - sum(self.dirs[prefix + name]['size'] for name in subdirs
+                                               if prefix + name in self.dirs)
+            self._apply(rel, own_size - indexed_size, own_files - entry['own_files'], modified or None)
+            entry['own_files'] = own_files
+            for name in names:
+                file_path = os.path.join(path, name)
+                try:
+                    stats = os.stat(file_path)
+                except OSError:
+                    self._notify('removed', prefix + name)
+                    continue
+                if not os.path.isdir(file_path):
+                    self._notify('file', prefix + name, stats)
+    
+    def rescan(self, path):
+        """Réindexe un sous-arbre modifié en dehors des routes du serveur"""
+        with self.lock:
+            self.dir_removed(path)
+            if os.path.isdir(path):
+                self._merge(self._rel(path))
+    
+    def reconcile(self):
+        """Reconstruit l'index complet à partir du disque. Le parcours se fait sans verrou et n'est
+        appliqué que si aucune mise à jour incrémentale ne l'a croisé; sinon il est recommencé."""
+        for _ in range(RECONCILE_ATTEMPTS):
+            with self.lock:
+                version = self.version
+            files = []
+            fresh = self._scan('', files)
+            with self.lock:
+                if self.version == version:
+                    self.dirs = fresh
+                    break
+        else:
+            # Écritures incessantes: dernier parcours sous le verrou
+            with self.lock:
+                files = []
+                self.dirs = self._scan('', files)
+        self._notify('scan', '', files)
+    
+    def _reconcile_loop(self):
+        while True:
+            time.sleep(self.reconcile_interval)
+            try:
+                self.reconcile()
+            except Exception:
+                pass
+
+dir_index = DirectoryIndex(UPLOAD_FOLDER)
+
+class SearchIndex:
+    """Index en mémoire des noms du partage: trigrammes (sous-chaînes), tokens (préfixes) et extensions.
+    Les listes d'identifiants ne sont jamais purgées à la suppression: chaque candidat est revérifié
+    sur son nom actuel, et les listes sont reconstruites quand les références périmées s'accumulent."""
+    
+    TOKEN_RE = re.compile(r'[^\W_]+')
+    
+    def __init__(self, root):
+        self.root = root
+        self.temp_rel = os.path.relpath(TEMP_FOLDER, root).replace(os.sep, '/')
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.ids = {}  # chemin relatif -> identifiant
+        self.paths = []  # identifiant -> chemin relatif (None une fois supprimé)
+        self.names = []  # identifiant -> nom normalisé
+        self.sizes = array.array('q')
+        self.mtimes = array.array('d')
+        self.is_dir = bytearray()
+        self.free = []
+        self.removed = 0
+        self.trigrams = collections.defaultdict(lambda: array.array('I'))
+        self.tokens = collections.defaultdict(lambda: array.array('I'))
+        self.token_list = []  # Tokens triés pour les recherches par préfixe, retriés après ajouts
+        self.extensions = collections.defaultdict(lambda: array.array('I'))
+    
+    @staticmethod
+    def fold(text):
+        """Minuscules sans accents: 'Été' et 'ete' se retrouvent"""
+        text = text.lower()
+        if text.isascii():
+            return text
+        return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    
+    def _is_temp(self, rel):
+        return rel == self.temp_rel or rel.startswith(self.temp_rel + '/')
+    
+    def _postings(self, index_id, name, is_dir):
+        trigrams = self.trigrams
+        for gram in {name[i:i + 3] for i in range(len(name) - 2)}:
+            trigrams[gram].append(index_id)
+        tokens = self.tokens
+        for token in set(self.TOKEN_RE.findall(name)):
+            tokens[token].append(index_id)
+        if not is_dir:
+            extension = os.path.splitext(name)[1][1:]
+            if extension:
+                self.extensions[extension].append(index_id)
+    
+    def _add(self, rel, size, mtime, is_dir):
+        index_id = self.ids.get(rel)
+        if index_id is not None:
+            self.sizes[index_id] = size
+            self.mtimes[index_id] = mtime
+            self.is_dir[index_id] = is_dir
+            return
+        name = self.fold(rel.rpartition('/')[2])
+        if self.free:
+            index_id = self.free.pop()
+            self.paths[index_id] = rel
+            self.names[index_id] = name
+            self.sizes[index_id] = size
+            self.mtimes[index_id] = mtime
+            self.is_dir[index_id] = is_dir
+        else:
+            index_id = len(self.paths)
+            self.paths.append(rel)
+            self.names.append(name)
+            self.sizes.append(size)
+            self.mtimes.append(mtime)
+            self.is_dir.append(is_dir)
+        self.ids[rel] = index_id
+        self._postings(index_id, name, is_dir)
+    
+    def _add_parents(self, rel):
+        """Indexe les dossiers parents créés en une fois (makedirs) qui ne le sont pas encore"""
+        parent = rel.rpartition('/')[0]
+        while parent and parent not in self.ids:
+            try:
+                self._add(parent, 0, os.stat(os.path.join(self.root, parent)).st_mtime, True)
+            except OSError:
+                pass
+            parent = parent.rpartition('/')[0]
+    
+    def _remove(self, rel):
+        """Retire un chemin et, pour un dossier, tout son sous-arbre"""
+        index_id = self.ids.get(rel)
+        if index_id is None or self.is_dir[index_id]:
+            prefix = rel + '/'
+            for path in [path for path in self.ids if path.startswith(prefix)]:
+                self._remove_one(path)
+        if index_id is not None:
+            self._remove_one(rel)
+        if self.removed > max(50000, len(self.ids)):
+            self._compact()
+    
+    def _remove_one(self, rel):
+        index_id = self.ids.pop(rel)
+        self.paths[index_id] = None
+        self.names[index_id] = None
+        self.free.append(index_id)
+        self.removed += 1
+    
+    def _compact(self):
+        """Reconstruit les listes d'identifiants à partir des seules entrées vivantes"""
+        self.trigrams.clear()
+        self.tokens.clear()
+        self.token_list = []
+        self.extensions.clear()
+        for index_id in self.ids.values():
+            self._postings(index_id, self.names[index_id], self.is_dir[index_id])
+        self.removed = 0
+    
+    def on_change(self, event, rel, data):
+        """Abonné de dir_index: uploads, suppressions et resynchronisations"""
+        if rel and self._is_temp(rel):
+            return
+        with self.lock:
+            if event == 'file':
+                self._add(rel, data.st_size, data.st_mtime, False)
+                self._add_parents(rel)
+            elif event == 'dir':
+                if rel and rel not in self.ids:
+                    try:
+                        self._add(rel, 0, os.stat(os.path.join(self.root, rel)).st_mtime, True)
+                    except OSError:
+                        return
+                    self._add_parents(rel)
+            elif event == 'removed':
+                self._remove(rel)
+        
+        # _apply_scan prend le verrou lui-même
+        if event == 'scan' and rel:
+            self._apply_scan(rel, data)
+        # Arbre complet: appliqué par lots en arrière-plan, les uploads n'attendent jamais l'index
+        elif event == 'scan':
+            threading.Thread(target=self._apply_scan, args=(rel, data, 10000), daemon=True).start()
+    
+    def _apply_scan(self, rel, files, batch=None):
+        """Sous-arbre relu sur le disque: ajout des nouveautés, retrait des disparus"""
+        seen = set()
+        batch = batch or len(files) or 1
+        for start in range(0, len(files), batch):
+            with self.lock:
+                for path, size, mtime, is_dir in files[start:start + batch]:
+                    if not self._is_temp(path):
+                        seen.add(path)
+                        self._add(path, size, mtime, is_dir)
+        with self.lock:
+            prefix = rel + '/' if rel else ''
+            for path in [path for path in self.ids if path.startswith(prefix) and path not in seen]:
+                self._remove_one(path)
+            if self.removed > max(50000, len(self.ids)):
+                self._compact()
+        if not rel:
+            self.ready.set()
+    
+    def _candidates(self, word, prefix_mode):
+        """Surensemble des identifiants dont le nom peut correspondre au mot"""
+        if prefix_mode or len(word) < 3:
+            if len(self.token_list) != len(self.tokens):
+                self.token_list = sorted(self.tokens)
+            candidates = set()
+            start = bisect.bisect_left(self.token_list, word)
+            for token in itertools.islice(self.token_list, start, None):
+                if not token.startswith(word):
+                    break
+                candidates.update(self.tokens[token])
+            return candidates
+        
+        grams = {word[i:i + 3] for i in range(len(word) - 2)}
+        postings = sorted((self.trigrams.get(gram, ()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        # Deux listes suffisent à filtrer: la vérification sur le nom fait le reste
+        if len(postings) > 1 and candidates:
+            candidates.intersection_update(postings[1])
+        return candidates
+    
+    def _matches(self, name, words, prefix_mode):
+        tokens = None
+        for word in words:
+            if prefix_mode or len(word) < 3:
+                if tokens is None:
+                    tokens = self.TOKEN_RE.findall(name)
+                if not any(token.startswith(word) for token in tokens):
+                    return False
+            elif word not in name:
+                return False
+        return True
+    
+    def search(self, query, prefix_mode=False, extensions=None, min_size=None, max_size=None,
+               kind=None, offset=0, limit=SEARCH_PAGE_SIZE):
+        """Retourne (total, [chemins relatifs de la page]) triés par chemin"""
+        words = self.fold(query).split()
+        extensions = {self.fold(extension).lstrip('.') for extension in extensions or ()}
+        if not words and not extensions:
+            raise ValueError('Requête vide')
+        if not self.ready.is_set():
+            dir_index.get(self.root)
+            if not self.ready.wait(SEARCH_READY_TIMEOUT):
+                raise TimeoutError("Index de recherche en cours de construction, réessayez dans un instant")
+        
+        with self.lock:
+            # Le mot le plus long est en général le plus sélectif
+            candidates = None
+            for word in sorted(words, key=len, reverse=True):
+                found = self._candidates(word, prefix_mode)
+                candidates = found if candidates is None else candidates & found
+                if not candidates:
+                    break
+            if extensions and (candidates is None or candidates):
+                found = set()
+                for extension in extensions:
+                    found.update(self.extensions.get(extension, ()))
+                candidates = found if candidates is None else candidates & found
+            
+            matches = []
+            for index_id in candidates:
+                name = self.names[index_id]
+                if name is None or not self._matches(name, words, prefix_mode):
+                    continue
+                is_dir = self.is_dir[index_id]
+                if kind is not None and kind != ('directory' if is_dir else 'file'):
+                    continue
+                if extensions and (is_dir or os.path.splitext(name)[1][1:] not in extensions):
+                    continue
+                if (min_size is not None or max_size is not None) and is_dir:
+                    continue
+                if min_size is not None and self.sizes[index_id] < min_size:
+                    continue
+                if max_size is not None and self.sizes[index_id] > max_size:
+                    continue
+                matches.append(index_id)
+            
+            page = heapq.nsmallest(offset + limit, matches, key=lambda index_id: self.paths[index_id].lower())
+            return len(matches), [self.paths[index_id] for index_id in page[offset:]]
+    
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.ids), 'trigrams': len(self.trigrams), 'tokens': len(self.tokens)}
+
+search_index = SearchIndex(UPLOAD_FOLDER)
+dir_index.subscribe(search_index.on_change)
+
+def event_frame(event_type, data, event_id=None):
+    """Message SSE sérialisé"""
+    frame = f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+    return f"id: {event_id}\n{frame}" if event_id is not None else frame
+
+class EventBus:
+    """Bus d'événements partagé par tous les flux SSE. Chaque événement est sérialisé une seule fois
+    et gardé dans un historique borné (reprise par Last-Event-ID); les abonnés ne reçoivent qu'un
+    réveil et relisent l'historique: aucune file par abonné."""
+    
+    def __init__(self, history, interval):
+        self.interval = interval
+        self.condition = threading.Condition()
+        self.events = collections.deque(maxlen=history)  # (id, message SSE)
+        self.last_id = 0
+        self.futures = {}  # boucle asyncio -> future partagée par ses abonnés
+        self.subscribers = 0
+        self.pending = {}
+        self.pending_event = threading.Event()
+        self.flusher = None
+    
+    def publish(self, event_type, data):
+        """Publie immédiatement un événement et réveille les abonnés"""
+        with self.condition:
+            self.last_id += 1
+            self.events.append((self.last_id, event_frame(event_type, data, self.last_id)))
+            futures, self.futures = self.futures, {}
+            self.condition.notify_all()
+        for loop, future in futures.items():
+            try:
+                loop.call_soon_threadsafe(lambda future=future: future.done() or future.set_result(None))
+            except RuntimeError:
+                pass  # Boucle arrêtée
+    
+    def post(self, event_type, data, key=None):
+        """Publication regroupée: au plus un événement par clé et par intervalle, dicts fusionnés.
+        data peut être une fonction appelée à la publication (None: rien à publier)."""
+        key = key or event_type
+        with self.condition:
+            previous = self.pending.get(key)
+            if isinstance(previous, tuple) and isinstance(previous[1], dict) and isinstance(data, dict):
+                data = {**previous[1], **data}
+            self.pending[key] = (event_type, data)
+            if self.flusher is None or not self.flusher.is_alive():
+                self.flusher = threading.Thread(target=self._run, daemon=True)
+                self.flusher.start()
+        self.pending_event.set()
+    
+    def _run(self):
+        while True:
+            self.pending_event.wait()
+            time.sleep(self.interval)
+            self.pending_event.clear()
+            with self.condition:
+                pending, self.pending = self.pending, {}
+            for event_type, data in pending.values():
+                try:
+                    if callable(data):
+                        data = data()
+                    if data is not None:
+                        self.publish(event_type, data)
+                except Exception:
+                    pass
+    
+    def resume_id(self, header):
+        """Identifiant de départ d'un abonné: Last-Event-ID s'il reprend, sinon le dernier publié"""
+        try:
+            return int(header)
+        except (TypeError, ValueError):
+            return self.last_id
+    
+    def since(self, last_id):
+        """Retourne (messages après last_id, nouvel identifiant); un trou dans l'historique donne 'reset'"""
+        with self.condition:
+            if last_id == self.last_id:
+                return [], last_id
+            oldest = self.events[0][0] if self.events else self.last_id + 1
+            # Abonné trop en retard, ou identifiant d'avant un redémarrage du serveur
+            if last_id < oldest - 1 or last_id > self.last_id:
+                return [event_frame('reset', {}, self.last_id)], self.last_id
+            frames = []
+            for event_id, frame in reversed(self.events):
+                if event_id <= last_id:
+                    break
+                frames.append(frame)
+            frames.reverse()
+            return frames, self.last_id
+    
+    def wait(self, last_id, timeout):
+        """Attend un événement postérieur à last_id (abonné dans un thread); retourne False au timeout"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.last_id != last_id, timeout)
+    
+    async def wait_async(self, last_id):
+        """Attend un événement postérieur à last_id; une seule future par boucle pour tous ses abonnés"""
+        loop = asyncio.get_running_loop()
+        with self.condition:
+            if self.last_id != last_id:
+                return
+            future = self.futures.get(loop)
+            if future is None:
+                future = self.futures[loop] = loop.create_future()
+        await asyncio.shield(future)
+    
+    def subscribe(self, limit=None):
+        """Compte un abonné; False si limit abonnés sont déjà connectés"""
+        with self.condition:
+            if limit is not None and self.subscribers >= limit:
+                return False
+            self.subscribers += 1
+            return True
+    
+    def unsubscribe(self):
+        with self.condition:
+            self.subscribers -= 1
+    
+    @contextmanager
+    def subscription(self):
+        self.subscribe()
+        try:
+            yield
+        finally:
+            self.unsubscribe()
+    
+    def stats(self):
+        with self.condition:
+            return {'subscribers': self.subscribers, 'last_id': self.last_id}
+
+event_bus = EventBus(EVENT_HISTORY, EVENT_FLUSH_INTERVAL)
+
+class StatsFeed:
+    """Statistiques publiées sur le bus: seuls les champs modifiés depuis la dernière publication"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last = {}
+        self.temp_rel = os.path.relpath(TEMP_FOLDER, UPLOAD_FOLDER).replace(os.sep, '/')
+    
+    def delta(self):
+        current = stats_payload()
+        with self.lock:
+            changed = {key: value for key, value in current.items() if self.last.get(key) != value}
+            self.last = current
+        return changed or None
+    
+    def on_change(self, event, rel, data):
+        """Abonné de dir_index: dossier modifié et statistiques, regroupés par le bus"""
+        if event in ('file', 'removed', 'dir') or (event == 'scan' and rel):
+            # Le dossier dont la liste change: le parent, sauf pour un sous-arbre relu
+            folder = rel if event == 'scan' else rel.rpartition('/')[0]
+            if rel != self.temp_rel and not rel.startswith(self.temp_rel + '/'):
+                event_bus.post('dir', {'path': folder}, key=('dir', folder))
+        event_bus.post('stats', self.delta)
+
+stats_feed = StatsFeed()
+dir_index.subscribe(stats_feed.on_change)
+
+class DirectoryGenerations:
+    """Numéro de génération par dossier, base des ETag de /api/files.
+
+    Un changement dans un dossier renouvelle sa génération et celle de ses ancêtres (leurs listes
+    affichent la taille cumulée des sous-dossiers). Les relectures complètes comparent une empreinte
+    du contenu de chaque dossier pour détecter les changements faits hors du serveur.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counter = itertools.count(1)
+        self.generations = {}
+        self.fingerprints = {}
+        # Les générations repartent de zéro au redémarrage: les ETag portent l'identifiant du démarrage
+        self.boot = uuid.uuid4().hex[:8]
+
+    def _bump(self, rel, ancestors=True):
+        generation = next(self.counter)
+        while True:
+            self.generations[rel] = generation
+            if not rel or not ancestors:
+                return
+            rel = rel.rpartition('/')[0]
+
+    def generation(self, rel):
+        with self.lock:
+            return self.generations.get(rel, 0)
+    
+    def etag(self, rel):
+        return f'{self.boot}-{self.generation(rel)}'
+
+    def touch(self, rel):
+        """Contenu du dossier modifié sans événement de dir_index (hash calculé par exemple)"""
+        with self.lock:
+            self._bump(rel, ancestors=False)
+
+    def _fingerprints(self, rel, files):
+        fingerprints = {rel: 0}
+        for path, size, mtime, is_dir in files:
+            parent, _, name = path.rpartition('/')
+            if is_dir:
+                fingerprints.setdefault(path, 0)
+            # Empreinte indépendante de l'ordre de parcours
+            fingerprints[parent] = fingerprints.get(parent, 0) ^ hash((name, size, mtime, is_dir))
+        return fingerprints
+
+    def on_change(self, event, rel, data):
+        """Abonné de dir_index"""
+        if event == 'scan':
+            fingerprints = self._fingerprints(rel, data)
+            prefix = rel + '/' if rel else ''
+            with self.lock:
+                previous = {path: fingerprint for path, fingerprint in self.fingerprints.items()
+                            if path == rel or path.startswith(prefix)}
+                for path in previous.keys() - fingerprints.keys():
+                    del self.fingerprints[path]
+                    self._bump(path)
+                for path, fingerprint in fingerprints.items():
+                    if previous and previous.get(path) != fingerprint:
+                        self._bump(path)
+                self.fingerprints.update(fingerprints)
+            return
+        with self.lock:
+            if event == 'removed':
+                # Un dossier recréé au même endroit ne doit pas reprendre une ancienne génération
+                prefix = rel + '/'
+                for path in [path for path in self.generations if path.startswith(prefix)]:
+                    self._bump(path, ancestors=False)
+                self._bump(rel, ancestors=False)
+            self._bump(rel if event == 'dir' else rel.rpartition('/')[0])
+
+dir_generations = DirectoryGenerations()
+dir_index.subscribe(dir_generations.on_change)
+
+class WatchFailed(OSError):
+    """Dossier impossible à surveiller (limite fs.inotify.max_user_watches atteinte par exemple)"""
+
+class FileWatcher:
+    """Surveillance inotify (Linux, via ctypes) du dossier partagé: les fichiers déposés par Samba,
+    rsync... sont répercutés dans les index sans relecture complète. Les événements sont regroupés
+    par dossier pendant WATCH_COALESCE, puis chaque dossier touché est resynchronisé une fois.
+    Sans inotify (autre système, limite de watches atteinte), la resynchronisation périodique reste seule."""
+    
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x01000000
+    IN_DONT_FOLLOW = 0x02000000
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+        IN_ONLYDIR | IN_DONT_FOLLOW
+    EVENT = struct.Struct('iIII')  # wd, mask, cookie, len (struct inotify_event)
+    
+    def __init__(self, root):
+        self.root = root
+        self.temp = os.path.join(TEMP_FOLDER, '')
+        self.libc = None
+        self.fd = None
+        self.watches = {}  # wd -> dossier
+        self.paths = {}  # dossier -> wd
+        self.thread = None
+        self.mode = 'scan'
+        self.error = None
+        self.events = 0
+        self.batches = 0
+    
+    def start(self):
+        """Démarre la surveillance; retourne False si inotify n'est pas disponible"""
+        if not WATCH_ENABLED or not sys.platform.startswith('linux'):
+            return False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(self.IN_CLOEXEC)
+            if fd < 0:
+                error = ctypes.get_errno()
+                raise OSError(error, os.strerror(error))
+        except (OSError, AttributeError) as e:
+            self.error = str(e)
+            return False
+        self.libc = libc
+        self.fd = fd
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return True
+    
+    def _ignored(self, path):
+        return path == TEMP_FOLDER or path.startswith(self.temp)
+    
+    def _add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return  # Dossier disparu entre-temps
+            raise WatchFailed(error, os.strerror(error), path)
+        self.watches[wd] = path
+        self.paths[path] = wd
+    
+    def _watch_tree(self, path):
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            if self._ignored(current):
+                continue
+            self._add_watch(current)
+            try:
+                with os.scandir(current) as it:
+                    stack.extend(item.path for item in it if item.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+    
+    def _unwatch_tree(self, path):
+        prefix = os.path.join(path, '')
+        for current in [current for current in self.paths if current == path or current.startswith(prefix)]:
+            wd = self.paths.pop(current)
+            self.watches.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+    
+    def _read(self):
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            yield wd, mask, os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+    
+    def _collect(self, batch, wd, mask, name):
+        if mask & self.IN_Q_OVERFLOW:
+            batch['overflow'] = True
+            return
+        if mask & self.IN_IGNORED:
+            # Watch retiré par le noyau (dossier supprimé)
+            path = self.watches.pop(wd, None)
+            if path is not None and self.paths.get(path) == wd:
+                del self.paths[path]
+            return
+        directory = self.watches.get(wd)
+        if directory is None or not name:
+            return
+        path = os.path.join(directory, name)
+        if self._ignored(path):
+            return
+        self.events += 1
+        if mask & self.IN_ISDIR:
+            if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                batch['removed'].discard(path)
+                batch['created'].add(path)
+            elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                batch['created'].discard(path)
+                batch['removed'].add(path)
+        else:
+            batch['files'][directory].add(name)
+    
+    def _apply(self, batch):
+        self.batches += 1
+        if batch['overflow']:
+            # File d'événements du noyau débordée: tout reprendre depuis le disque
+            self._watch_tree(self.root)
+            dir_index.reconcile()
+            return
+        for path in sorted(batch['removed']):
+            self._unwatch_tree(path)
+            dir_index.dir_removed(path)
+            hash_cache.forget(path)
+        created = sorted(batch['created'])
+        for path in created:
+            # Un sous-dossier d'un dossier arrivé dans le même lot est relu avec lui
+            if any(path.startswith(os.path.join(other, '')) for other in created):
+                continue
+            # Surveiller avant de relire: rien ne peut arriver entre les deux sans être vu
+            self._watch_tree(path)
+            dir_index.rescan(path)
+        for directory, names in batch['files'].items():
+            dir_index.refresh(directory, names)
+            for name in names:
+                # Les hash d'un fichier modifié sont invalidés par sa stat; ceux d'un fichier supprimé sont oubliés
+                if not os.path.lexists(os.path.join(directory, name)):
+                    hash_cache.forget(os.path.join(directory, name))
+    
+    def _stop(self, error):
+        """Surveillance incomplète: des dossiers échapperaient aux index, retour à la
+        resynchronisation périodique seule"""
+        self.error = str(error)
+        os.close(self.fd)  # Retire aussi tous les watches
+        self.fd = None
+        self.watches.clear()
+        self.paths.clear()
+        dir_index.reconcile_interval = RECONCILE_INTERVAL
+        self.mode = 'scan'
+    
+    def _run(self):
+        try:
+            self._watch_tree(self.root)
+        except OSError as e:
+            # Typiquement ENOSPC: fs.inotify.max_user_watches atteint
+            self._stop(e)
+            return
+        self.mode = 'inotify'
+        dir_index.reconcile_interval = WATCH_RECONCILE_INTERVAL
+        while True:
+            select.select([self.fd], [], [])
+            batch = {'files': collections.defaultdict(set), 'created': set(), 'removed': set(), 'overflow': False}
+            deadline = time.monotonic() + WATCH_COALESCE
+            while True:
+                for wd, mask, name in self._read():
+                    self._collect(batch, wd, mask, name)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not select.select([self.fd], [], [], remaining)[0]:
+                    break
+            try:
+                self._apply(batch)
+            except WatchFailed as e:
+                # Nouveau dossier non surveillable: les changements manqués sont repris par une relecture
+                self._stop(e)
+                dir_index.reconcile()
+                return
+            except Exception as e:
+                self.error = str(e)
+    
+    def stats(self):
+        return {'mode': self.mode, 'watches': len(self.watches), 'events': self.events,
+                'batches': self.batches, 'error': self.error}
+
+file_watcher = FileWatcher(UPLOAD_FOLDER)
+
+class AdmissionRefused(Exception):
+    """Upload refusé temporairement: réponse 429 avec Retry-After"""
+    
+    def __init__(self, message, retry_after=RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionTicket:
+    """Demande de créneau en attente; wake() est appelé à l'attribution"""
+    __slots__ = ('client', 'wake', 'granted')
+    
+    def __init__(self, client, wake):
+        self.client = client
+        self.wake = wake
+        self.granted = False
+
+class UploadAdmission:
+    """Créneaux d'écriture disque globaux et par client, attribués à tour de rôle entre clients"""
+    
+    def __init__(self, slots, slots_per_client):
+        self.slots = slots
+        self.slots_per_client = slots_per_client
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.active = {}  # client -> écritures en cours
+        self.waiting = {}  # client -> file FIFO de ses demandes
+        self.turns = collections.deque()  # clients en attente, dans l'ordre du tour de rôle
+        self.queued = 0
+        self.rejected = 0
+        self.write_latency = 0.0  # Moyenne glissante de la durée d'écriture d'un bloc
+        self.last_write = 0.0
+    
+    def record_write(self, seconds):
+        with self.lock:
+            self.write_latency = self.write_latency * 0.8 + seconds * 0.2
+            self.last_write = time.monotonic()
+    
+    def check(self, new_session=False):
+        """Lève AdmissionRefused si le disque, la file d'attente ou la zone temporaire sont saturés"""
+        temp_size = (dir_index.get(TEMP_FOLDER) or {'size': 0})['size'] if new_session else 0
+        with self.lock:
+            # Sans écriture récente la mesure est périmée: le disque a eu le temps de se vider
+            if time.monotonic() - self.last_write > RETRY_AFTER:
+                self.write_latency = 0.0
+            
+            if self.write_latency > MAX_WRITE_LATENCY:
+                self.rejected += 1
+                raise AdmissionRefused('Disque saturé, réessayez plus tard')
+            if self.queued >= ADMISSION_QUEUE_SIZE:
+                self.rejected += 1
+                raise AdmissionRefused('File d\'attente des uploads pleine')
+            if temp_size > MAX_TEMP_SIZE:
+                self.rejected += 1
+                raise AdmissionRefused('Zone temporaire pleine, réessayez plus tard', RETRY_AFTER * 6)
+    
+    def _free(self, client):
+        return self.in_use < self.slots and self.active.get(client, 0) < self.slots_per_client
+    
+    def _take(self, client):
+        self.in_use += 1
+        self.active[client] = self.active.get(client, 0) + 1
+    
+    def _request(self, client, wake):
+        """Attribue un créneau tout de suite si possible, sinon met la demande en file"""
+        ticket = AdmissionTicket(client, wake)
+        with self.lock:
+            if not self.waiting.get(client) and self._free(client):
+                self._take(client)
+                ticket.granted = True
+                return ticket
+            if self.queued >= ADMISSION_QUEUE_SIZE:
+                self.rejected += 1
+                raise AdmissionRefused('File d\'attente des uploads pleine')
+            if client not in self.waiting:
+                self.waiting[client] = collections.deque()
+                self.turns.append(client)
+            self.waiting[client].append(ticket)
+            self.queued += 1
+        return ticket
+    
+    def _abandon(self, ticket):
+        """Retire une demande de la file; retourne True si le créneau a été attribué entre-temps"""
+        with self.lock:
+            if ticket.granted:
+                return True
+            pending = self.waiting[ticket.client]
+            pending.remove(ticket)
+            self.queued -= 1
+            if not pending:
+                del self.waiting[ticket.client]
+                self.turns.remove(ticket.client)
+            return False
+    
+    def _dispatch(self):
+        """Donne les créneaux libres aux clients en attente, un par client à chaque tour"""
+        for _ in range(len(self.turns)):
+            if self.in_use >= self.slots:
+                break
+            client = self.turns[0]
+            self.turns.rotate(-1)
+            if self.active.get(client, 0) >= self.slots_per_client:
+                continue
+            pending = self.waiting[client]
+            ticket = pending.popleft()
+            self.queued -= 1
+            if not pending:
+                del self.waiting[client]
+                self.turns.remove(client)
+            self._take(client)
+            ticket.granted = True
+            ticket.wake()
+    
+    def release(self, client):
+        with self.lock:
+            self.in_use -= 1
+            self.active[client] -= 1
+            if not self.active[client]:
+                del self.active[client]
+            self._dispatch()
+    
+    @contextmanager
+    def slot(self, client):
+        """Créneau d'écriture (bloquant) pour les routes WSGI"""
+        event = threading.Event()
+        ticket = self._request(client, event.set)
+        if not ticket.granted and not event.wait(ADMISSION_WAIT_TIMEOUT) and not self._abandon(ticket):
+            with self.lock:
+                self.rejected += 1
+            raise AdmissionRefused('Serveur occupé, réessayez plus tard')
+        try:
+            yield
+        finally:
+            self.release(client)
+    
+    async def acquire(self, client):
+        """Créneau d'écriture pour le mode ASGI, sans occuper de thread pendant l'attente"""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+        
+        ticket = self._request(client, wake)
+        if ticket.granted:
+            return
+        try:
+            await asyncio.wait_for(granted, ADMISSION_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            if not self._abandon(ticket):
+                with self.lock:
+                    self.rejected += 1
+                raise AdmissionRefused('Serveur occupé, réessayez plus tard')
+        except asyncio.CancelledError:
+            if self._abandon(ticket):
+                self.release(client)
+            raise
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'slots': self.slots,
+                'slots_per_client': self.slots_per_client,
+                'in_use': self.in_use,
+                'queued': self.queued,
+                'rejected': self.rejected,
+                'write_latency_ms': round(self.write_latency * 1000, 1)
+            }
+
+upload_admission = UploadAdmission(UPLOAD_SLOTS, UPLOAD_SLOTS_PER_CLIENT)
+
+class ZipStreamBuffer(io.RawIOBase):
+    """Tampon non positionnable: zipfile y écrit depuis un thread producteur, le générateur le vide
+    vers la réponse par blocs d'environ ZIP_READ_SIZE. La file est bornée: la compression suit le client."""
+    
+    def __init__(self):
+        super().__init__()
+        self.pending = bytearray()
+        self.blocks = queue.Queue(ZIP_QUEUE_BLOCKS)
+        self.cancelled = threading.Event()
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        if self.cancelled.is_set():
+            raise ConnectionError('Téléchargement interrompu')
+        self.pending += data
+        if len(self.pending) >= ZIP_READ_SIZE:
+            self._put(bytes(self.pending))
+            self.pending.clear()
+        return len(data)
+    
+    def finish(self, error=None):
+        """Fin du ZIP: reste du tampon puis None, ou l'erreur du producteur"""
+        if error is None and self.pending:
+            self._put(bytes(self.pending))
+        self._put(error)
+    
+    def _put(self, item):
+        while not self.cancelled.is_set():
+            try:
+                self.blocks.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+def stream_zip(folder_path):
+    """Génère un ZIP (ZIP64 si nécessaire) au fil du parcours du dossier, sans fichier temporaire"""
+    buffer = ZipStreamBuffer()
+    
+    def produce():
+        try:
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=ZIP_COMPRESS_LEVEL) as zipf:
+                for root, dirs, files in os.walk(folder_path):
+                    dirs.sort()
+                    for file in sorted(files):
+                        file_path = os.path.join(root, file)
+                        if not os.access(file_path, os.R_OK):
+                            continue
+                        # ZipFile.write lit la taille d'avance: ZIP64 pour les fichiers > 4 GB
+                        stored = os.path.splitext(file)[1].lower() in STORED_EXTENSIONS
+                        zipf.write(file_path, os.path.relpath(file_path, folder_path),
+                                   zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+        except Exception as e:
+            buffer.finish(e)
+            return
+        buffer.finish()
+    
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            block = buffer.blocks.get()
+            if block is None:
+                return
+            if isinstance(block, Exception):
+                raise block
+            yield block
+    finally:
+        # Client parti: le producteur s'arrête à sa prochaine écriture
+        buffer.cancelled.set()
+
+def copy_file_into(source_path, dest_fd, dest_offset):
+    """Copie un fichier à une position donnée, côté noyau si possible; retourne les octets copiés"""
+    with open(source_path, 'rb') as source:
+        src_fd = source.fileno()
+        remaining = os.fstat(src_fd).st_size
+        copied = 0
+        
+        # 1. copy_file_range: aucune copie en espace utilisateur (reflink sur btrfs/xfs)
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while remaining > 0:
+                    count = os.copy_file_range(src_fd, dest_fd, remaining, copied, dest_offset + copied)
+                    if count == 0:
+                        break
+                    copied += count
+                    remaining -= count
+            except OSError:
+                pass
+        
+        # 2. sendfile entre fichiers (Linux >= 2.6.33)
+        if remaining > 0 and hasattr(os, 'sendfile'):
+            try:
+                os.lseek(dest_fd, dest_offset + copied, os.SEEK_SET)
+                while remaining > 0:
+                    count = os.sendfile(dest_fd, src_fd, copied, remaining)
+                    if count == 0:
+                        break
+                    copied += count
+                    remaining -= count
+            except OSError:
+                pass
+        
+        # 3. Repli: tampon de taille bornée
+        while remaining > 0:
+            block = os.pread(src_fd, min(ASSEMBLY_BUFFER_SIZE, remaining), copied)
+            if not block:
+                break
+            view = memoryview(block)
+            while view:
+                written = os.pwrite(dest_fd, view, dest_offset + copied)
+                view = view[written:]
+                copied += written
+                remaining -= written
+        return copied
+
+class ChunkChecksumError(ValueError):
+    """CRC32 d'un chunk différent de celui annoncé par le client: le chunk doit être renvoyé"""
+
+class ChunkWriter:
+    """Écrit un chunk à son offset dans le fichier préalloué (pwrite), au fil de l'eau.
+    Calcule au passage le CRC32 du chunk et, s'il est à la frontière, le MD5 du fichier."""
+    
+    def __init__(self, upload_id, chunk_index, state):
+        self.upload_id = upload_id
+        self.chunk_index = chunk_index
+        self.state = state
+        self.written = 0
+        self.crc = 0
+        self.md5 = state['digest'].start(chunk_index)
+        self.fd = os.open(state['data_path'], os.O_WRONLY)
+        self.offset = chunk_index * state['chunk_size']
+        self.limit = min(state['total_size'], self.offset + state['chunk_size'])
+    
+    def write(self, data):
+        if self.offset + self.written + len(data) > self.limit:
+            raise ValueError('Chunk hors des limites du fichier')
+        started = time.monotonic()
+        view = memoryview(data)
+        while view:
+            count = os.pwrite(self.fd, view, self.offset + self.written)
+            view = view[count:]
+            self.written += count
+        upload_admission.record_write(time.monotonic() - started)
+        self.crc = zlib.crc32(data, self.crc)
+        if self.md5 is not None:
+            self.md5.update(data)
+    
+    def copy_from(self, stream, client=None):
+        """Copie un flux par blocs; avec client, chaque écriture prend un créneau d'admission
+        et la lecture du bloc suivant (réseau) se fait hors créneau"""
+        for block in iter(lambda: stream.read(ASSEMBLY_BUFFER_SIZE), b''):
+            if client is None:
+                self.write(block)
+            else:
+                with upload_admission.slot(client):
+                    self.write(block)
+    
+    def close(self):
+        """Ferme la destination; retourne les octets écrits"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        return self.written
+
+def clone_file(source_path, final_path, fallback_copy=True, keep_stat=False):
+    """Crée final_path avec le contenu de source_path sans recopier les données si possible;
+    retourne la méthode utilisée (reflink, hardlink ou copy). Avec keep_stat, le fichier remplacé
+    garde son mode et ses dates."""
+    temp_path = os.path.join(os.path.dirname(final_path), f'.{uuid.uuid4().hex}.clone')
+    original = os.stat(final_path) if keep_stat else None
+    try:
+        # 1. Reflink: blocs partagés en copie sur écriture, les deux fichiers restent indépendants
+        method = None
+        if fcntl is not None:
+            try:
+                with open(source_path, 'rb') as source, open(temp_path, 'wb') as dest:
+                    fcntl.ioctl(dest.fileno(), FICLONE, source.fileno())
+                method = 'reflink'
+            except OSError:
+                os.remove(temp_path)
+        
+        # 2. Lien physique: même inode (les réécritures passent par unshare_file), donc même mode:
+        # écarté si le fichier remplacé avait d'autres permissions
+        if method is None and (original is None or
+                               original.st_mode == os.stat(source_path).st_mode):
+            try:
+                os.link(source_path, temp_path)
+                method = 'hardlink'
+            except OSError:
+                pass
+        
+        # 3. Repli: copie côté noyau
+        if method is None:
+            if not fallback_copy:
+                raise OSError('Partage des données impossible entre ces fichiers')
+            with open(temp_path, 'wb') as dest:
+                copy_file_into(source_path, dest.fileno(), 0)
+            method = 'copy'
+        
+        if original is not None and method != 'hardlink':
+            shutil.copystat(final_path, temp_path)
+        os.replace(temp_path, final_path)
+        return method
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def unshare_file(path):
+    """Détache un fichier partagé par lien physique avant de le réécrire en place"""
+    try:
+        if os.stat(path).st_nlink > 1:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+
+finalize_executor = ThreadPoolExecutor(max_workers=FINALIZE_WORKERS, thread_name_prefix='finalize')
+
+def finalize_direct_upload(upload_id, file_name, data_path, final_path, ip_address):
+    """Finalise un upload en mode direct: simple renommage atomique du fichier préalloué"""
+    try:
+        previous_size = os.path.getsize(final_path) if os.path.exists(final_path) else None
+        state = upload_manager.get_session(upload_id)
+        file_hash = state['digest'].hexdigest(state)
+        data_size = os.path.getsize(data_path)
+        os.replace(data_path, final_path)
+        dir_index.file_removed(data_path, data_size)
+        dir_index.file_added(final_path, previous_size)
+        
+        # Hash calculé pendant la réception: pas de relecture du fichier final
+        if file_hash is None:
+            file_hash = get_file_hash(final_path)
+        if file_hash:
+            hash_cache.store(final_path, file_hash)
+        
+        upload_manager.complete_upload(upload_id)
+        add_to_history('upload', file_name, data_size, ip_address)
+    except Exception as e:
+        upload_manager.set_status(upload_id, 'error', f'Erreur finalisation: {str(e)}')
+
+def start_finalize(upload_id, state, ip_address):
+    """Lance la finalisation d'un upload complet en tâche de fond (suivi via /api/upload-status)"""
+    upload_manager.set_status(upload_id, 'finalizing')
+    finalize_executor.submit(finalize_direct_upload, upload_id, state['filename'], state['data_path'],
+                             state['path'], ip_address)
+
+def prepare_chunk(form):
+    """Retourne (upload_id, index, session) d'un chunk; ValueError si invalide, UploadNotFound si la session
+    n'existe pas, UploadCompleted si elle est terminée. La session est toujours créée d'abord via
+    /api/upload-session: l'identifiant vient du serveur."""
+    upload_id = form.get('uploadId')
+    chunk_index = form.get('chunkIndex')
+    if not upload_id or chunk_index is None:
+        raise ValueError('Chunk ou identifiant d\'upload manquant')
+    chunk_index = int(chunk_index)
+    
+    state = upload_manager.chunk_session(upload_id)
+    if not 0 <= chunk_index < state['total_chunks']:
+        raise ValueError(f'Index de chunk invalide: {chunk_index}')
+    return upload_id, chunk_index, state
+
+def open_session(file_name, file_size, chunk_size, target_path='', relative_path=''):
+    """Crée une session d'upload en écriture directe; retourne son identifiant"""
+    upload_admission.check(new_session=True)
+    full_dir, final_path = resolve_upload_path(target_path, file_name, relative_path)
+    os.makedirs(full_dir, exist_ok=True)
+    dir_index.dir_created(full_dir)
+    
+    upload_id = uuid.uuid4().hex
+    total_chunks = max(1, -(-file_size // chunk_size))
+    upload_manager.open_upload(upload_id, file_name, file_size, total_chunks,
+                               final_path, relative_path, chunk_size)
+    return upload_id
+
+def chunk_for_range(state, header):
+    """Retourne (index, taille) du chunk désigné par un en-tête Content-Range; ValueError si invalide"""
+    content_range = parse_content_range_header(header)
+    if content_range is None or content_range.units != 'bytes' or content_range.start is None:
+        raise ValueError('En-tête Content-Range invalide')
+    
+    chunk_size = state['chunk_size']
+    start, stop = content_range.start, content_range.stop
+    if content_range.length != state['total_size'] or start % chunk_size \
+            or stop != min(start + chunk_size, state['total_size']):
+        raise ValueError(f'Plage {start}-{stop - 1} non alignée sur un chunk de {chunk_size} octets')
+    return start // chunk_size, stop - start
+
+def finish_chunk(writer, ip_address, crc32=None):
+    """Vérifie et enregistre un chunk écrit (writer fermé); retourne la réponse de /api/upload-chunk"""
+    upload_id, chunk_index, state = writer.upload_id, writer.chunk_index, writer.state
+    if crc32 and int(crc32, 16) != writer.crc:
+        raise ChunkChecksumError(f'CRC32 du chunk {chunk_index} invalide')
+    
+    is_new, is_complete = upload_manager.mark_chunk(upload_id, chunk_index, writer.written)
+    # MD5 du fichier: la frontière avance avec ce chunk et ceux reçus en avance
+    state['digest'].advance(state, chunk_index, writer.md5)
+    
+    # Quand tous les chunks sont là, la finalisation part en tâche de fond
+    status = 'active'
+    if is_complete:
+        status = 'finalizing'
+        start_finalize(upload_id, state, ip_address)
+    
+    return {
+        'success': True,
+        'chunk': chunk_index + 1,
+        'total': state['total_chunks'],
+        'upload_id': upload_id,
+        'status': status
+    }
+
+def extract_bundle(stream, target_path, ip_address):
+    """Extrait au fil de l'eau une archive tar de petits fichiers; retourne le nombre de fichiers écrits.
+    Si l'archive s'interrompt, les fichiers complets restent enregistrés et le fichier en cours est abandonné."""
+    history = []
+    hashes = []
+    known_dirs = set()
+    try:
+        with tarfile.open(fileobj=stream, mode='r|*') as bundle:
+            for member in bundle:
+                # Seuls les fichiers et dossiers sont extraits, jamais hors du dossier de partage
+                if not (member.isfile() or member.isdir()):
+                    continue
+                if safe_join(UPLOAD_FOLDER, target_path, member.name) is None:
+                    continue
+                name = member.name.rstrip('/')
+                try:
+                    full_dir, final_path = resolve_upload_path(target_path, name, name if '/' in name else '')
+                except ValueError:
+                    continue  # Zone temporaire
+                if member.isdir():
+                    full_dir = final_path
+                
+                if full_dir not in known_dirs:
+                    os.makedirs(full_dir, exist_ok=True)
+                    dir_index.dir_created(full_dir)
+                    known_dirs.add(full_dir)
+                if member.isdir():
+                    continue
+                
+                source = bundle.extractfile(member)
+                digest = hashlib.md5()
+                previous_size = os.path.getsize(final_path) if os.path.exists(final_path) else None
+                # Petit fichier lu en entier avant de prendre un créneau d'écriture: un client lent ne le bloque pas
+                data = source.read() if member.size <= ASSEMBLY_BUFFER_SIZE else None
+                # Écrit à côté puis renommé: une archive tronquée ne laisse pas de fichier à moitié écrit
+                part_path = os.path.join(full_dir, f'.{uuid.uuid4().hex}.part')
+                with upload_admission.slot(ip_address):
+                    try:
+                        written = 0
+                        with open(part_path, 'wb') as f:
+                            blocks = [data] if data is not None else iter(lambda: source.read(ASSEMBLY_BUFFER_SIZE), b'')
+                            for block in blocks:
+                                f.write(block)
+                                digest.update(block)
+                                written += len(block)
+                        if written != member.size:
+                            raise tarfile.ReadError(f'Archive tronquée: {name}')
+                        os.replace(part_path, final_path)
+                    except BaseException:
+                        if os.path.exists(part_path):
+                            os.remove(part_path)
+                        raise
+                dir_index.file_added(final_path, previous_size)
+                hashes.append((final_path, digest.hexdigest()))
+                history.append(('upload', name, member.size, ip_address))
+    finally:
+        # Un seul commit pour les hash et une seule mise en file pour l'historique de toute l'archive
+        hash_cache.store_many(hashes)
+        write_behind.history_many(history)
+    return len(history)
+
+class TusError(Exception):
+    """Erreur du protocole tus, renvoyée avec son statut HTTP"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class TusWriter(ChunkWriter):
+    """Corps d'un PATCH tus écrit à partir de l'offset courant; l'offset n'avance qu'à la fermeture"""
+    
+    def __init__(self, upload_id, offset, checksum=None):
+        # Upload inconnu, annulé ou déjà terminé: rien à verrouiller
+        if upload_manager.get_session(upload_id) is None:
+            raise TusError(404, 'Upload non trouvé')
+        if not upload_manager.tus_lock(upload_id):
+            raise TusError(423, 'Un PATCH est déjà en cours pour cet upload')
+        try:
+            position = upload_manager.tus_offset(upload_id)
+            if position is None:
+                raise TusError(404, 'Upload non trouvé')
+            if position[0] != offset:
+                raise TusError(409, f'Upload-Offset attendu: {position[0]}')
+            self.fd = os.open(upload_manager.get_session(upload_id)['data_path'], os.O_WRONLY)
+        except Exception:
+            upload_manager.tus_unlock(upload_id)
+            raise
+        self.upload_id = upload_id
+        self.offset = offset
+        self.limit = position[1]
+        self.written = 0
+        self.crc = 0
+        self.md5 = None
+        self.checksum = checksum
+        self.digest = hashlib.new(checksum[0]) if checksum else None
+    
+    def write(self, data):
+        super().write(data)
+        if self.digest is not None:
+            self.digest.update(data)
+    
+    def close(self, ip_address=None, completed=True):
+        """Ferme la destination et valide les octets reçus; retourne le nouvel offset.
+        Avec Upload-Checksum, rien n'est validé si le corps est incomplet ou invalide."""
+        try:
+            super().close()
+            if self.digest is not None:
+                if not completed:
+                    return self.offset
+                if base64.b64encode(self.digest.digest()).decode('ascii') != self.checksum[1]:
+                    raise TusError(460, 'Checksum invalide')
+            
+            offset = self.offset + self.written
+            if self.written:
+                is_complete = upload_manager.advance_offset(self.upload_id, offset)
+                state = upload_manager.get_session(self.upload_id)
+                state['digest'].advance(state)
+                if is_complete:
+                    start_finalize(self.upload_id, state, ip_address)
+            return offset
+        finally:
+            upload_manager.tus_unlock(self.upload_id)
+
+def tus_check(headers):
+    if headers.get('Tus-Resumable') != TUS_VERSION:
+        raise TusError(412, 'Version tus non supportée')
+
+def tus_options():
+    return {
+        'Tus-Version': TUS_VERSION,
+        'Tus-Extension': TUS_EXTENSIONS,
+        'Tus-Checksum-Algorithm': ','.join(TUS_CHECKSUM_ALGORITHMS)
+    }
+
+def parse_tus_metadata(header):
+    """Upload-Metadata: paires "clé valeur_base64" séparées par des virgules"""
+    metadata = {}
+    for pair in (header or '').split(','):
+        key, _, value = pair.strip().partition(' ')
+        if key:
+            metadata[key] = base64.b64decode(value).decode('utf-8') if value else ''
+    return metadata
+
+def tus_create(headers, ip_address):
+    """Extension creation: ouvre une session et retourne son identifiant"""
+    tus_check(headers)
+    length = headers.get('Upload-Length', '')
+    if not length.isdigit():
+        raise TusError(400, 'Upload-Length invalide')
+    metadata = parse_tus_metadata(headers.get('Upload-Metadata'))
+    file_name = metadata.get('filename') or metadata.get('name')
+    if not file_name:
+        raise TusError(400, 'Métadonnée filename manquante')
+    
+    upload_id = open_session(file_name, int(length), CHUNK_SIZE, metadata.get('path', ''),
+                             metadata.get('relativePath', ''))
+    # Fichier vide: complet dès sa création
+    upload_manager.tus_offset(upload_id)
+    if int(length) == 0 and upload_manager.advance_offset(upload_id, 0):
+        start_finalize(upload_id, upload_manager.get_session(upload_id), ip_address)
+    return upload_id
+
+def tus_head(upload_id, headers):
+    """Offset courant d'un upload (reprise)"""
+    tus_check(headers)
+    position = upload_manager.tus_offset(upload_id)
+    if position is None:
+        status = upload_manager.get_upload_status(upload_id)
+        if status is None or status['status'] != 'completed':
+            raise TusError(404, 'Upload non trouvé')
+        position = (status['total_size'], status['total_size'])
+    return {'Upload-Offset': str(position[0]), 'Upload-Length': str(position[1]), 'Cache-Control': 'no-store'}
+
+def tus_begin_patch(headers):
+    """Valide les en-têtes d'un PATCH; retourne (offset annoncé, checksum attendu ou None)"""
+    tus_check(headers)
+    if (headers.get('Content-Type') or '').split(';')[0].strip() != 'application/offset+octet-stream':
+        raise TusError(415, 'Content-Type application/offset+octet-stream attendu')
+    offset = headers.get('Upload-Offset', '')
+    if not offset.isdigit():
+        raise TusError(400, 'Upload-Offset invalide')
+    
+    checksum = None
+    if headers.get('Upload-Checksum'):
+        algorithm, _, digest = headers['Upload-Checksum'].partition(' ')
+        if algorithm not in TUS_CHECKSUM_ALGORITHMS:
+            raise TusError(400, f'Algorithme de checksum non supporté: {algorithm}')
+        checksum = (algorithm, digest.strip())
+    
+    upload_admission.check()
+    return int(offset), checksum
+
+def tus_delete(upload_id, headers):
+    """Extension termination"""
+    tus_check(headers)
+    if upload_manager.get_session(upload_id) is None:
+        raise TusError(404, 'Upload non trouvé')
+    upload_manager.abort_upload(upload_id)
+
+def tus_failure(error):
+    """Retourne (statut, en-têtes, message) d'une erreur levée par un point d'entrée tus"""
+    if isinstance(error, TusError):
+        headers = {'Tus-Version': TUS_VERSION} if error.status == 412 else {}
+        return error.status, headers, str(error)
+    if isinstance(error, AdmissionRefused):
+        return 429, {'Retry-After': str(error.retry_after)}, str(error)
+    if isinstance(error, ValueError):
+        return 400, {}, str(error)
+    return 500, {}, str(error)
+
+def resolve_upload_path(target_path, file_name, relative_path=''):
+    """Retourne (dossier, chemin final) d'un fichier uploadé; ValueError s'il sort du dossier de partage
+    ou vise la zone temporaire (données des sessions en cours)"""
+    final_path = safe_join(UPLOAD_FOLDER, target_path or '', relative_path or secure_filename(file_name))
+    if final_path is None or not (relative_path or secure_filename(file_name)):
+        raise ValueError('Chemin invalide')
+    temp_folder = os.path.abspath(TEMP_FOLDER)
+    if os.path.commonpath([os.path.abspath(final_path), temp_folder]) == temp_folder:
+        raise ValueError('Chemin réservé')
+    return os.path.dirname(final_path), final_path
+
+def listing_path(directory):
+    """Chemin sur disque d'un dossier à lister; ValueError s'il sort du dossier de partage"""
+    full_path = safe_join(UPLOAD_FOLDER, directory or '')
+    if full_path is None:
+        raise ValueError('Chemin invalide')
+    return full_path
 
 def get_storage_info():
-    used = get_directory_size(UPLOAD_FOLDER)
+    used = dir_index.get(UPLOAD_FOLDER)['size']
     total, used_disk, free = shutil.disk_usage(UPLOAD_FOLDER)
     
     return {
@@ -219,59 +2851,250 @@ def get_storage_info():
         'percentage': (used_disk / total) * 100 if total > 0 else 0
     }
 
-def get_file_list(directory="", sort_by="name", sort_order="asc"):
-    full_path = os.path.join(UPLOAD_FOLDER, directory)
-    if not os.path.exists(full_path):
-        return []
-    
+def file_entry(relative_path, stats, is_dir, fields=LISTING_OPTIONAL_FIELDS):
+    """Entrée de la liste des fichiers; fields: champs coûteux à inclure (hash, dir_size)"""
+    entry = {
+        'name': os.path.basename(relative_path),
+        'path': relative_path,
+        'type': 'directory' if is_dir else 'file',
+        'modified': datetime.fromtimestamp(stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+        'created': datetime.fromtimestamp(stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S')
+    }
+    if is_dir:
+        # Taille récursive et nombre de fichiers depuis l'index des dossiers
+        if 'dir_size' in fields:
+            aggregate = dir_index.get(os.path.join(UPLOAD_FOLDER, relative_path)) or {'size': 0, 'own_files': 0}
+            entry['size'] = aggregate['size']
+            entry['size_formatted'] = format_size(aggregate['size'])
+            entry['file_count'] = aggregate['own_files']
+    else:
+        entry['size'] = stats.st_size
+        entry['size_formatted'] = format_size(stats.st_size)
+        if 'hash' in fields:
+            entry['hash'] = None
+            entry['hash_status'] = 'pending'
+    return entry
+
+def attach_hashes(file_stats):
+    """Hash depuis le cache pour des (chemin, stat, entrée); les manquants sont calculés en arrière-plan"""
+    hashes = hash_cache.lookup_many([(item_path, stats) for item_path, stats, _ in file_stats])
+    for item_path, _, entry in file_stats:
+        if item_path in hashes:
+            entry['hash'] = hashes[item_path]
+            entry['hash_status'] = 'ready'
+
+def file_entries(paths, fields=LISTING_OPTIONAL_FIELDS):
+    """Entrées de la liste des fichiers pour des chemins relatifs (les chemins disparus sont ignorés)"""
     items = []
-    for item in os.listdir(full_path):
-        item_path = os.path.join(full_path, item)
-        relative_path = os.path.join(directory, item) if directory else item
-        
+    file_stats = []
+    for relative_path in paths:
+        item_path = os.path.join(UPLOAD_FOLDER, relative_path)
         try:
             stats = os.stat(item_path)
-            if os.path.isdir(item_path):
-                size = get_directory_size(item_path)
-                file_count = len([f for f in os.listdir(item_path) if os.path.isfile(os.path.join(item_path, f))])
-                items.append({
-                    'name': item,
-                    'path': relative_path,
-                    'type': 'directory',
-                    'size': size,
-                    'size_formatted': format_size(size),
-                    'file_count': file_count,
-                    'modified': datetime.fromtimestamp(stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-                    'created': datetime.fromtimestamp(stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S')
-                })
-            else:
-                size = stats.st_size
-                items.append({
-                    'name': item,
-                    'path': relative_path,
-                    'type': 'file',
-                    'size': size,
-                    'size_formatted': format_size(size),
-                    'modified': datetime.fromtimestamp(stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-                    'created': datetime.fromtimestamp(stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
-                    'hash': get_file_hash(item_path)
-                })
-        except:
+        except OSError:
             continue
+        items.append(file_entry(relative_path, stats, os.path.isdir(item_path), fields))
+        if 'hash' in items[-1]:
+            file_stats.append((item_path, stats, items[-1]))
+    attach_hashes(file_stats)
+    return items
+
+def encode_cursor(sort_by, sort_order, key):
+    return base64.urlsafe_b64encode(json.dumps([sort_by, sort_order, *key]).encode()).decode()
+
+# Types des éléments de la clé de tri de list_directory, par critère
+CURSOR_KEY_TYPES = {
+    'name': (bool, str, str),
+    'size': (int, str),
+    'modified': ((int, float), str),
+}
+
+def decode_cursor(cursor, sort_by, sort_order):
+    """Clé de tri de la dernière entrée de la page précédente"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Curseur invalide')
+    if not isinstance(values, list) or values[:2] != [sort_by, sort_order]:
+        raise ValueError('Curseur invalide pour ce tri')
+    key = tuple(values[2:])
+    # Clé comparée telle quelle aux clés du dossier: forme et types doivent correspondre
+    types = CURSOR_KEY_TYPES.get(sort_by, CURSOR_KEY_TYPES['name'])
+    if len(key) != len(types) or not all(
+            isinstance(value, kind) and (kind is bool or not isinstance(value, bool))
+            for value, kind in zip(key, types)):
+        raise ValueError('Curseur invalide')
+    return key
+
+def list_directory(directory='', sort_by='name', sort_order='asc', limit=None, cursor=None, fields=()):
+    """Liste un dossier par pages: (entrées, curseur de la page suivante ou None, nombre total d'entrées).
+    L'ordre est stable (départage par nom) et la page suivante reprend après la clé du curseur:
+    les ajouts et suppressions entre deux pages ne décalent rien. En tri par nom, seules les
+    entrées de la page sont stat-ées."""
+    full_path = listing_path(directory)
+    if not os.path.isdir(full_path):
+        return [], None, 0
+    
+    reverse = sort_order == 'desc'
+    after = decode_cursor(cursor, sort_by, sort_order) if cursor else None
+    total = 0
+    candidates = []
+    with os.scandir(full_path) as it:
+        for item in it:
+            try:
+                is_dir = item.is_dir()
+                if sort_by == 'size':
+                    size = (dir_index.get(item.path) or {'size': 0})['size'] if is_dir else item.stat().st_size
+                    key = (size, item.name)
+                elif sort_by == 'modified':
+                    key = (item.stat().st_mtime, item.name)
+                else:
+                    key = (not is_dir, item.name.lower(), item.name)
+            except OSError:
+                continue
+            total += 1
+            if after is not None and (key >= after if reverse else key <= after):
+                continue
+            candidates.append((key, item, is_dir))
     
-    # Tri
-    reverse = sort_order == "desc"
-    if sort_by == "size":
-        items.sort(key=lambda x: x['size'], reverse=reverse)
-    elif sort_by == "modified":
-        items.sort(key=lambda x: x['modified'], reverse=reverse)
+    # Tas borné plutôt qu'un tri complet: seule la page est ordonnée
+    if limit is None or len(candidates) <= limit:
+        page = sorted(candidates, key=lambda candidate: candidate[0], reverse=reverse)
+        next_cursor = None
     else:
-        items.sort(key=lambda x: (x['type'] == 'file', x['name'].lower()), reverse=reverse)
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        page = select(limit, candidates, key=lambda candidate: candidate[0])
+        next_cursor = encode_cursor(sort_by, sort_order, page[-1][0])
     
-    return items
+    items = []
+    file_stats = []
+    for key, item, is_dir in page:
+        relative_path = f"{directory}/{item.name}" if directory else item.name
+        try:
+            # DirEntry garde le stat déjà fait pour le tri
+            stats = item.stat()
+        except OSError:
+            continue
+        items.append(file_entry(relative_path, stats, is_dir, fields))
+        if 'hash' in items[-1]:
+            file_stats.append((item.path, stats, items[-1]))
+    attach_hashes(file_stats)
+    return items, next_cursor, total
 
-@app.route('/')
-def index():
+def admission_refused(error):
+    """Réponse 429: le client réessaie après Retry-After"""
+    return jsonify({'success': False, 'error': str(error), 'retry_after': error.retry_after}), 429, \
+        {'Retry-After': str(error.retry_after)}
+
+def files_etag(args):
+    """ETag de /api/files: génération du dossier listé et son mtime_ns, comme la clé de ListingCache
+    (ajouts et suppressions faits hors du serveur sans surveillance inotify). Les autres paramètres
+    sont dans l'URL."""
+    full_path = listing_path(args.get('path', ''))
+    try:
+        mtime_ns = os.stat(full_path).st_mtime_ns
+    except OSError:
+        mtime_ns = 0
+    return f'{dir_generations.etag(dir_index._rel(full_path))}-{mtime_ns:x}'
+
+def payload_etag(payload):
+    """ETag d'une réponse bon marché à produire: empreinte de son contenu"""
+    return hashlib.md5(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def not_modified(etag, if_none_match):
+    """Vrai si le client possède déjà cette version (If-None-Match, comparaison faible)"""
+    return bool(if_none_match) and parse_etags(if_none_match).contains_weak(etag)
+
+def conditional_response(payload, etag):
+    """Réponse JSON avec ETag faible, ou 304 sans corps si le client l'a déjà"""
+    if not_modified(etag, request.headers.get('If-None-Match')):
+        response = Response(status=304)
+    else:
+        response = jsonify(payload() if callable(payload) else payload)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+class ListingCache:
+    """Cache LRU des pages de liste, borné en nombre d'entrées et en octets.
+
+    La clé contient la génération du dossier (renouvelée par les écritures du serveur et le hash
+    devenu disponible) et son mtime_ns (ajouts, suppressions et renommages faits hors du serveur):
+    une page périmée n'est plus jamais demandée et sort par la fin de la liste LRU.
+    """
+    
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def listing(self, directory, sort_by, sort_order, limit, cursor, fields):
+        """list_directory() servi depuis le cache quand le dossier n'a pas changé"""
+        full_path = listing_path(directory)
+        rel = dir_index._rel(full_path)
+        # Génération et mtime lus avant la liste: un changement pendant le parcours donne une autre clé
+        generation = dir_generations.generation(rel)
+        try:
+            mtime_ns = os.stat(full_path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        key = (rel, generation, mtime_ns, sort_by, sort_order, limit, cursor, tuple(fields))
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return result[0]
+            self.misses += 1
+        
+        listing = list_directory(directory, sort_by, sort_order, limit, cursor, fields)
+        size = len(json.dumps(listing[0]))
+        if size > self.max_bytes:
+            return listing
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self.entries[key] = (listing, size)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+        return listing
+    
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+listing_cache = ListingCache(LISTING_CACHE_ENTRIES, LISTING_CACHE_BYTES)
+
+def files_payload(args):
+    """Contenu de /api/files pour les paramètres de requête donnés. L'espace disque n'y figure pas:
+    il change sans toucher au dossier (ETag par génération) et arrive par /api/stats et le flux SSE."""
+    path = args.get('path', '')
+    sort_by = args.get('sort_by', 'name')
+    sort_order = args.get('sort_order', 'asc')
+    limit = args.get('limit')
+    limit = min(max(1, int(limit)), LISTING_MAX_PAGE_SIZE) if limit else None
+    fields = [field for field in args.get('fields', '').split(',') if field in LISTING_OPTIONAL_FIELDS]
+    
+    files, next_cursor, total = listing_cache.listing(path, sort_by, sort_order, limit, args.get('cursor'), fields)
+    return {
+        'files': files,
+        'next_cursor': next_cursor,
+        'total': total,
+        'path': path
+    }
+
+def ui_page():
+    """Page complète de l'interface, découpée au démarrage par UiAssets"""
     html = '''
 <!DOCTYPE html>
 <html lang="fr">
@@ -734,10 +3557,24 @@ def index():
         let activeUploads = new Map();
         let serverStats = {};
         let notifications = [];
+        let uploadSettings = {
+            parallelChunks: 4,
+            maxConcurrentUploads: 3,
+            maxInFlightBytes: 64 * 1024 * 1024,
+            bundleFileLimit: 1024 * 1024,
+            bundleMaxFiles: 500,
+            bundleMaxBytes: 16 * 1024 * 1024,
+            instantUploadMinSize: 8 * 1024 * 1024,
+            listingPageSize: 200,
+            rawChunkPut: false
+        };
+        let inFlightBytes = 0;
+        let byteWaiters = [];
         
         // Initialisation
         document.addEventListener('DOMContentLoaded', function() {
             loadServerInfo();
+            loadUploadSettings();
             loadFiles();
             setupDragAndDrop();
             setupSearch();
@@ -745,11 +3582,49 @@ def index():
             setupKeyboardShortcuts();
         });
         
+        let listingRefreshTimer = null;
+        const finalizeWaiters = new Map();
+        
         function startStatsUpdater() {
-            setInterval(() => {
+            setInterval(cleanupOldNotifications, 5000);
+            if (!window.EventSource) {
+                setInterval(updateStats, 5000);
+                return;
+            }
+            
+            // Le serveur pousse les changements: aucune requête tant que rien ne bouge
+            const events = new EventSource('/api/events');
+            // Flux refusé (trop d'abonnés en mode WSGI): actualisation périodique
+            events.onerror = () => {
+                if (events.readyState === EventSource.CLOSED) setInterval(updateStats, 5000);
+            };
+            events.addEventListener('stats', event => applyStats(JSON.parse(event.data)));
+            events.addEventListener('dir', event => {
+                if (JSON.parse(event.data).path === currentPath) {
+                    scheduleListingRefresh();
+                }
+            });
+            events.addEventListener('upload', event => {
+                const update = JSON.parse(event.data);
+                const wake = finalizeWaiters.get(update.upload_id);
+                if (wake && (update.status === 'completed' || update.status === 'error')) {
+                    wake();
+                }
+            });
+            // Événements manqués (reconnexion tardive, redémarrage du serveur): tout recharger
+            events.addEventListener('reset', () => {
                 updateStats();
-                cleanupOldNotifications();
-            }, 5000);
+                scheduleListingRefresh();
+            });
+        }
+        
+        function scheduleListingRefresh() {
+            // Une rafale de changements ne recharge la liste qu'une fois; pas pendant une recherche
+            if (document.getElementById('search-box').value.trim()) return;
+            clearTimeout(listingRefreshTimer);
+            listingRefreshTimer = setTimeout(() => {
+                loadFiles(currentPath, listingState.sortBy, listingState.sortOrder);
+            }, 300);
         }
         
         function setupKeyboardShortcuts() {
@@ -790,6 +3665,23 @@ def index():
                 });
         }
         
+        function loadUploadSettings() {
+            fetch('/api/server-info')
+                .then(response => response.json())
+                .then(data => {
+                    uploadSettings.parallelChunks = data.limits.parallel_chunks || uploadSettings.parallelChunks;
+                    uploadSettings.maxConcurrentUploads = data.limits.max_concurrent_uploads || uploadSettings.maxConcurrentUploads;
+                    uploadSettings.maxInFlightBytes = data.limits.max_inflight_bytes || uploadSettings.maxInFlightBytes;
+                    uploadSettings.bundleFileLimit = data.limits.bundle_file_limit || uploadSettings.bundleFileLimit;
+                    uploadSettings.bundleMaxFiles = data.limits.bundle_max_files || uploadSettings.bundleMaxFiles;
+                    uploadSettings.bundleMaxBytes = data.limits.bundle_max_bytes || uploadSettings.bundleMaxBytes;
+                    uploadSettings.instantUploadMinSize = data.limits.instant_upload_min_size || uploadSettings.instantUploadMinSize;
+                    uploadSettings.listingPageSize = data.limits.listing_page_size || uploadSettings.listingPageSize;
+                    uploadSettings.rawChunkPut = !!data.limits.raw_chunk_put;
+                })
+                .catch(() => {});
+        }
+        
         function updateStorageStats(storage) {
             const ring = document.getElementById('storage-ring').querySelector('.progress-fill');
             const circumference = 2 * Math.PI * 36;
@@ -799,29 +3691,88 @@ def index():
             document.getElementById('total-size').textContent = storage.used_formatted;
         }
         
+        // Dernière réponse valide par URL: rejouée quand le serveur répond 304
+        const conditionalCache = new Map();
+        const CONDITIONAL_CACHE_SIZE = 50;
+        
+        async function fetchConditional(url) {
+            const cached = conditionalCache.get(url);
+            const response = await fetch(url, {
+                cache: 'no-store',
+                headers: cached ? { 'If-None-Match': cached.etag } : {}
+            });
+            if (response.status === 304 && cached) {
+                return cached.data;
+            }
+            const data = await response.json();
+            const etag = response.headers.get('ETag');
+            conditionalCache.delete(url);
+            if (response.ok && etag) {
+                conditionalCache.set(url, { etag, data });
+                if (conditionalCache.size > CONDITIONAL_CACHE_SIZE) {
+                    conditionalCache.delete(conditionalCache.keys().next().value);
+                }
+            }
+            return data;
+        }
+        
         function updateStats() {
-            fetch('/api/stats')
-                .then(response => response.json())
-                .then(data => {
-                    document.getElementById('total-files').textContent = data.total_files;
-                    document.getElementById('active-transfers').textContent = activeUploads.size;
-                    updateStorageStats(data.storage);
-                });
+            fetchConditional('/api/stats')
+                .then(applyStats)
+                .catch(() => {});
+        }
+        
+        function applyStats(data) {
+            // Les événements ne contiennent que les champs modifiés
+            if (data.total_files !== undefined) {
+                document.getElementById('total-files').textContent = data.total_files;
+            }
+            if (data.storage) {
+                updateStorageStats(data.storage);
+            }
+            document.getElementById('active-transfers').textContent = activeUploads.size;
         }
         
-        function loadFiles(path = '', sortBy = 'name', sortOrder = 'asc') {
+        let listingState = { files: [], nextCursor: null, sortBy: 'name', sortOrder: 'asc' };
+        
+        function loadFiles(path = '', sortBy = 'name', sortOrder = 'asc', cursor = null) {
             currentPath = path;
             
-            fetch(`/api/files?path=${encodeURIComponent(path)}&sort_by=${sortBy}&sort_order=${sortOrder}`)
-                .then(response => response.json())
+            // Pages bornées: un dossier de 100k entrées s'affiche dès la première page
+            const params = new URLSearchParams({
+                path,
+                sort_by: sortBy,
+                sort_order: sortOrder,
+                limit: uploadSettings.listingPageSize,
+                fields: 'hash,dir_size'
+            });
+            if (cursor) params.set('cursor', cursor);
+            
+            fetchConditional(`/api/files?${params}`)
                 .then(data => {
+                    // Réponse arrivée après un changement de dossier: ignorée
+                    if (path !== currentPath) return;
+                    listingState = {
+                        files: cursor ? listingState.files.concat(data.files) : data.files,
+                        nextCursor: data.next_cursor,
+                        sortBy,
+                        sortOrder
+                    };
                     updateBreadcrumb(path);
-                    updateFileList(data.files);
-                    updateStorageStats(data.storage);
+                    updateFileList(listingState.files);
+                    if (data.next_cursor) {
+                        document.getElementById('file-list-content').insertAdjacentHTML('beforeend',
+                            `<div style="text-align: center; padding: 15px; color: #666;">${listingState.files.length} / ${data.total} éléments
+                             <button class="btn btn-primary" onclick="loadMoreFiles()">Afficher plus</button></div>`);
+                    }
                 })
                 .catch(() => showNotification('Erreur lors du chargement des fichiers', 'error'));
         }
         
+        function loadMoreFiles() {
+            loadFiles(currentPath, listingState.sortBy, listingState.sortOrder, listingState.nextCursor);
+        }
+        
         function refreshFiles() {
             const sortBy = document.getElementById('sort-by').value;
             const sortOrder = document.getElementById('sort-order').value;
@@ -846,7 +3797,7 @@ def index():
             breadcrumb.innerHTML = html;
         }
         
-        function updateFileList(files) {
+        function updateFileList(files, showFolder = false) {
             const container = document.getElementById('file-list-content');
             
             if (files.length === 0) {
@@ -868,7 +3819,7 @@ def index():
                 
                 const extraInfo = file.type === 'directory' ? 
                     `${file.file_count} fichier(s)` : 
-                    `Hash: ${file.hash ? file.hash.substring(0, 8) : 'N/A'}`;
+                    `Hash: ${file.hash ? file.hash.substring(0, 8) : (file.hash_status === 'pending' ? 'calcul...' : 'N/A')}`;
                 
                 const actions = file.type === 'directory' ?
                     `<button class="btn btn-primary" onclick="loadFiles(\\'${file.path}\\')">📂 Ouvrir</button>
@@ -886,7 +3837,7 @@ def index():
                         <div class="file-info">
                             <div class="file-name">${file.name}</div>
                             <div class="file-details">
-                                ${file.size_formatted} • ${file.modified}<br>
+                                ${showFolder ? `📁 /${file.path.slice(0, -file.name.length - 1)} • ` : ''}${file.size_formatted} • ${file.modified}<br>
                                 Créé: ${file.created} • ${extraInfo}
                             </div>
                         </div>
@@ -909,7 +3860,11 @@ def index():
             searchBox.addEventListener('input', function() {
                 clearTimeout(searchTimeout);
                 searchTimeout = setTimeout(() => {
-                    filterFiles(this.value);
+                    if (this.value.trim()) {
+                        searchFiles(this.value.trim());
+                    } else {
+                        loadFiles(currentPath, sortBy.value, sortOrder.value);
+                    }
                 }, 300);
             });
             
@@ -917,13 +3872,31 @@ def index():
             sortOrder.addEventListener('change', () => loadFiles(currentPath, sortBy.value, sortOrder.value));
         }
         
-        function filterFiles(searchTerm) {
-            const items = document.querySelectorAll('.file-item');
-            items.forEach(item => {
-                const fileName = item.querySelector('.file-name').textContent.toLowerCase();
-                const isVisible = fileName.includes(searchTerm.toLowerCase());
-                item.style.display = isVisible ? 'flex' : 'none';
-            });
+        let searchState = { query: '', results: [] };
+        
+        function searchFiles(query, offset = 0) {
+            // Recherche côté serveur dans tout le partage, pas seulement dans le dossier affiché
+            fetch(`/api/search?q=${encodeURIComponent(query)}&offset=${offset}`)
+                .then(response => response.json())
+                .then(data => {
+                    // Réponse à une frappe précédente: ignorée
+                    if (document.getElementById('search-box').value.trim() !== query) return;
+                    if (!data.success) {
+                        showNotification(data.error || 'Erreur de recherche', 'error');
+                        return;
+                    }
+                    
+                    searchState = { query, results: offset ? searchState.results.concat(data.results) : data.results };
+                    updateFileList(searchState.results, true);
+                    const container = document.getElementById('file-list-content');
+                    container.insertAdjacentHTML('afterbegin',
+                        `<div style="padding: 10px 20px; color: #666;">${data.total} résultat(s) dans tout le partage</div>`);
+                    if (data.has_more) {
+                        container.insertAdjacentHTML('beforeend',
+                            `<div style="text-align: center; padding: 15px;"><button class="btn btn-primary" onclick="searchFiles(searchState.query, searchState.results.length)">Afficher plus</button></div>`);
+                    }
+                })
+                .catch(() => showNotification('Erreur de recherche', 'error'));
         }
         
         function selectFiles() {
@@ -988,17 +3961,23 @@ def index():
                 const queueItem = {
                     id: uploadId,
                     file: file,
+                    targetPath: currentPath,
+                    sessionId: null,
                     status: 'queued',
                     progress: 0,
                     speed: 0,
                     startTime: null,
-                    pauseTime: null
+                    pauseTime: null,
+                    controller: null,
+                    running: false
                 };
                 
                 uploadQueue.push(queueItem);
                 addQueueItemToDOM(queueItem);
             });
             
+            // Petits fichiers d'abord (tri stable: l'ordre d'ajout est conservé à taille égale)
+            uploadQueue.sort((a, b) => a.file.size - b.file.size);
             processUploadQueue();
             showNotification(`${files.length} fichier(s) ajouté(s) à la queue`, 'info');
         }
@@ -1032,95 +4011,586 @@ def index():
             queueContainer.appendChild(queueItemDiv);
         }
         
-        async function processUploadQueue() {
-            const activeCount = Array.from(activeUploads.values()).filter(u => u.status === 'active').length;
+        function processUploadQueue() {
+            // Remplit tous les créneaux libres (limite annoncée par le serveur); chaque fin d'upload relance l'ordonnanceur
+            const active = Array.from(activeUploads.values()).filter(u => u.status === 'active');
+            let activeCount = new Set(active.map(u => u.bundle || u.id)).size;  // Une archive groupée = un créneau
+            
+            while (activeCount < uploadSettings.maxConcurrentUploads) {
+                const nextItem = uploadQueue.find(item => item.status === 'queued' && !item.running);
+                if (!nextItem) return;
+                
+                const bundled = nextItem.file.size <= uploadSettings.bundleFileLimit;
+                const job = bundled ? collectBundle(nextItem) : [nextItem];
+                job.forEach(item => {
+                    item.status = 'active';
+                    item.running = true;
+                    item.bundle = bundled ? nextItem.id : null;
+                    activeUploads.set(item.id, item);
+                });
+                activeCount++;
+                
+                const upload = bundled ? uploadBundle(job) : uploadFileWithChunks(nextItem);
+                upload.finally(() => {
+                    job.forEach(item => item.running = false);
+                    processUploadQueue();
+                });
+            }
+        }
+        
+        function collectBundle(firstItem) {
+            // Petits fichiers en attente vers le même dossier, dans la limite d'une archive
+            const job = [];
+            let bytes = 0;
+            for (const item of uploadQueue) {
+                if (job.length >= uploadSettings.bundleMaxFiles) break;
+                if (item.status !== 'queued' || item.running || item.targetPath !== firstItem.targetPath) continue;
+                if (item.file.size > uploadSettings.bundleFileLimit) continue;
+                if (job.length && bytes + item.file.size > uploadSettings.bundleMaxBytes) break;
+                job.push(item);
+                bytes += item.file.size;
+            }
+            return job;
+        }
+        
+        const tarEncoder = new TextEncoder();
+        
+        function tarHeader(name, size, type, mtime) {
+            const header = new Uint8Array(512);
+            const put = (text, offset, length) => header.set(tarEncoder.encode(text).subarray(0, length), offset);
+            const octal = (value, offset, length) => put(value.toString(8).padStart(length - 1, '0'), offset, length - 1);
+            
+            put(name, 0, 100);
+            octal(0o644, 100, 8);
+            octal(0, 108, 8);
+            octal(0, 116, 8);
+            octal(size, 124, 12);
+            octal(mtime, 136, 12);
+            header.fill(32, 148, 156);  // Somme de contrôle calculée avec des espaces à sa place
+            put(type, 156, 1);
+            put('ustar\0' + '00', 257, 8);
+            
+            const checksum = header.reduce((sum, byte) => sum + byte, 0);
+            put(checksum.toString(8).padStart(6, '0') + '\0 ', 148, 8);
+            return header;
+        }
+        
+        function tarPadding(size) {
+            return new Uint8Array((512 - size % 512) % 512);
+        }
+        
+        function tarEntry(name, file) {
+            const mtime = Math.floor(file.lastModified / 1000) || 0;
+            const parts = [];
+            
+            // Nom long ou non ASCII: enregistrement PAX "path" (UTF-8) avant l'en-tête ustar
+            if (tarEncoder.encode(name).length > 100 || /[^\x20-\x7e]/.test(name)) {
+                const record = tarEncoder.encode(` path=${name}\n`);
+                let length = record.length + 1;
+                while (String(length).length + record.length !== length) {
+                    length = String(length).length + record.length;
+                }
+                const pax = new Uint8Array(length);
+                pax.set(tarEncoder.encode(String(length)));
+                pax.set(record, String(length).length);
+                parts.push(tarHeader('PaxHeader', pax.length, 'x', mtime), pax, tarPadding(pax.length));
+                name = name.replace(/[^\x20-\x7e]/g, '_').slice(-100);
+            }
+            
+            parts.push(tarHeader(name, file.size, '0', mtime), file, tarPadding(file.size));
+            return parts;
+        }
+        
+        async function uploadBundle(items) {
+            // Une seule requête pour tous les fichiers: archive tar assemblée en Blob, lue en streaming par le navigateur
+            const parts = [];
+            items.forEach(item => {
+                parts.push(...tarEntry(item.file.webkitRelativePath || item.file.name, item.file));
+                item.startTime = Date.now();
+                updateQueueItemStatus(item.id, 'Envoi groupé...', 'info');
+            });
+            parts.push(new Uint8Array(1024));  // Fin d'archive: deux blocs vides
+            const bundle = new Blob(parts);
+            
+            const controller = new AbortController();
+            items.forEach(item => item.controller = controller);
             
-            if (activeCount >= 3) return; // Max 3 uploads simultanés
+            await acquireBytes(bundle.size);
+            try {
+                const response = await fetchWithBackpressure(`/api/upload-bundle?path=${encodeURIComponent(items[0].targetPath)}`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/x-tar' },
+                    body: bundle,
+                    signal: controller.signal
+                }, items[0]);
+                if (response.status === 429) throw new Error('Serveur occupé');
+                
+                const result = await response.json();
+                if (!result.success) {
+                    throw new Error(result.error || 'Erreur envoi groupé');
+                }
+                
+                items.forEach(item => {
+                    item.status = 'completed';
+                    updateProgressBar(item.id, 100);
+                    updateQueueItemStatus(item.id, 'Terminé!', 'success');
+                    activeUploads.delete(item.id);
+                    setTimeout(() => {
+                        removeQueueItemFromDOM(item.id);
+                        removeFromQueue(item.id);
+                    }, 3000);
+                });
+                showNotification(`${items.length} fichier(s) téléversé(s) avec succès`, 'success');
+                refreshFiles();
+            } catch (error) {
+                items.forEach(item => {
+                    if (item.status !== 'active') return;
+                    // Archive interrompue par la pause/annulation d'un autre fichier: renvoyé plus tard
+                    if (controller.signal.aborted) {
+                        item.status = 'queued';
+                        updateQueueItemStatus(item.id, 'En attente...', 'info');
+                    } else {
+                        item.status = 'error';
+                        updateQueueItemStatus(item.id, `Erreur: ${error.message}`, 'error');
+                    }
+                });
+                if (!controller.signal.aborted) {
+                    showNotification(`Erreur envoi groupé (${items.length} fichiers)`, 'error');
+                }
+            } finally {
+                releaseBytes(bundle.size);
+            }
+        }
+        
+        function acquireBytes(size) {
+            // Plafond d'octets en vol tous fichiers confondus; un chunk seul passe toujours
+            if (inFlightBytes === 0 || inFlightBytes + size <= uploadSettings.maxInFlightBytes) {
+                inFlightBytes += size;
+                return Promise.resolve();
+            }
+            return new Promise(resolve => byteWaiters.push({ size, resolve }));
+        }
+        
+        function releaseBytes(size) {
+            inFlightBytes -= size;
+            while (byteWaiters.length &&
+                   (inFlightBytes === 0 || inFlightBytes + byteWaiters[0].size <= uploadSettings.maxInFlightBytes)) {
+                const waiter = byteWaiters.shift();
+                inFlightBytes += waiter.size;
+                waiter.resolve();
+            }
+        }
+        
+        async function fetchWithBackpressure(url, options, queueItem) {
+            // 429: le serveur est saturé, on attend le délai indiqué par Retry-After puis on réessaie
+            while (true) {
+                const response = await fetch(url, options);
+                if (response.status !== 429) return response;
+                
+                const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 5;
+                if (queueItem) {
+                    updateQueueItemStatus(queueItem.id, `Serveur occupé, reprise dans ${retryAfter}s...`, 'warning');
+                }
+                await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+                if (queueItem && queueItem.status !== 'active') return response;
+                if (queueItem) {
+                    updateQueueItemStatus(queueItem.id, 'Upload en cours...', 'info');
+                }
+            }
+        }
+        
+        const crcTable = (() => {
+            const table = new Uint32Array(256);
+            for (let n = 0; n < 256; n++) {
+                let c = n;
+                for (let k = 0; k < 8; k++) {
+                    c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+                }
+                table[n] = c >>> 0;
+            }
+            return table;
+        })();
+        
+        function crc32(bytes) {
+            // CRC-32 (polynôme IEEE, identique à zlib.crc32 côté serveur), en hexadécimal
+            let crc = 0xFFFFFFFF;
+            for (let i = 0; i < bytes.length; i++) {
+                crc = crcTable[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+            }
+            return ((crc ^ 0xFFFFFFFF) >>> 0).toString(16).padStart(8, '0');
+        }
+        
+        const md5WorkerSource = `
+            // MD5 incrémental (RFC 1321), fichier lu par tranches de 4 MB
+            const K = new Int32Array(64);
+            for (let i = 0; i < 64; i++) K[i] = Math.floor(Math.abs(Math.sin(i + 1)) * 4294967296) | 0;
+            const S = [7, 12, 17, 22, 5, 9, 14, 20, 4, 11, 16, 23, 6, 10, 15, 21];
             
-            const nextItem = uploadQueue.find(item => item.status === 'queued');
-            if (!nextItem) return;
+            // Blocs de 64 octets; words = vue Int32Array (plateformes little-endian)
+            function md5Blocks(state, words, count) {
+                let a0 = state[0], b0 = state[1], c0 = state[2], d0 = state[3];
+                for (let p = 0; p < count; p += 16) {
+                    let a = a0, b = b0, c = c0, d = d0, f, x, s;
+                    for (let i = 0; i < 16; i++) {
+                        f = (b & c) | (~b & d); s = S[i & 3];
+                        x = (a + f + K[i] + words[p + i]) | 0;
+                        a = d; d = c; c = b; b = (b + ((x << s) | (x >>> (32 - s)))) | 0;
+                    }
+                    for (let i = 16; i < 32; i++) {
+                        f = (d & b) | (~d & c); s = S[4 + (i & 3)];
+                        x = (a + f + K[i] + words[p + ((5 * i + 1) & 15)]) | 0;
+                        a = d; d = c; c = b; b = (b + ((x << s) | (x >>> (32 - s)))) | 0;
+                    }
+                    for (let i = 32; i < 48; i++) {
+                        f = b ^ c ^ d; s = S[8 + (i & 3)];
+                        x = (a + f + K[i] + words[p + ((3 * i + 5) & 15)]) | 0;
+                        a = d; d = c; c = b; b = (b + ((x << s) | (x >>> (32 - s)))) | 0;
+                    }
+                    for (let i = 48; i < 64; i++) {
+                        f = c ^ (b | ~d); s = S[12 + (i & 3)];
+                        x = (a + f + K[i] + words[p + ((7 * i) & 15)]) | 0;
+                        a = d; d = c; c = b; b = (b + ((x << s) | (x >>> (32 - s)))) | 0;
+                    }
+                    a0 = (a0 + a) | 0; b0 = (b0 + b) | 0; c0 = (c0 + c) | 0; d0 = (d0 + d) | 0;
+                }
+                state[0] = a0; state[1] = b0; state[2] = c0; state[3] = d0;
+            }
             
-            nextItem.status = 'active';
-            activeUploads.set(nextItem.id, nextItem);
+            self.onmessage = async (event) => {
+                const file = event.data.file;
+                const slice = 4 * 1024 * 1024;
+                const state = new Int32Array([0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476]);
+                let tail = new Uint8Array(0);
+                for (let offset = 0; offset < file.size; offset += slice) {
+                    const chunk = new Uint8Array(await file.slice(offset, offset + slice).arrayBuffer());
+                    let data = chunk;
+                    if (tail.length) {
+                        data = new Uint8Array(tail.length + chunk.length);
+                        data.set(tail);
+                        data.set(chunk, tail.length);
+                    }
+                    const full = data.length - data.length % 64;
+                    md5Blocks(state, new Int32Array(data.buffer, data.byteOffset, full / 4), full / 4);
+                    tail = data.slice(full);
+                    self.postMessage({ progress: Math.min(offset + slice, file.size) / file.size });
+                }
+                
+                // Bourrage: 0x80, zéros, puis la longueur en bits sur 64 bits little-endian
+                const final = new Uint8Array(tail.length < 56 ? 64 : 128);
+                final.set(tail);
+                final[tail.length] = 0x80;
+                const view = new DataView(final.buffer);
+                view.setUint32(final.length - 8, (file.size * 8) >>> 0, true);
+                view.setUint32(final.length - 4, Math.floor(file.size / 536870912), true);
+                md5Blocks(state, new Int32Array(final.buffer), final.length / 4);
+                
+                let hash = '';
+                const words = new DataView(state.buffer);
+                for (let i = 0; i < 16; i++) hash += words.getUint8(i).toString(16).padStart(2, '0');
+                self.postMessage({ hash });
+            };
+        `;
+        
+        let md5WorkerUrl = null;
+        
+        function hashFileInWorker(queueItem) {
+            // MD5 calculé hors du thread principal: l'interface reste fluide sur les gros fichiers
+            if (!md5WorkerUrl) {
+                md5WorkerUrl = URL.createObjectURL(new Blob([md5WorkerSource], { type: 'text/javascript' }));
+            }
+            return new Promise(resolve => {
+                const worker = new Worker(md5WorkerUrl);
+                const stop = (hash) => {
+                    worker.terminate();
+                    queueItem.stopHash = null;
+                    resolve(hash);
+                };
+                queueItem.stopHash = () => stop(null);
+                worker.onmessage = (event) => {
+                    if (event.data.hash) {
+                        stop(event.data.hash);
+                    } else {
+                        updateQueueItemStatus(queueItem.id, `Calcul de l'empreinte... ${Math.round(event.data.progress * 100)}%`, 'info');
+                    }
+                };
+                worker.onerror = () => stop(null);
+                worker.postMessage({ file: queueItem.file });
+            });
+        }
+        
+        async function tryInstantUpload(queueItem) {
+            // Upload instantané: le serveur crée le fichier à partir d'un contenu identique déjà partagé
+            const file = queueItem.file;
+            if (file.size < uploadSettings.instantUploadMinSize || queueItem.sessionId ||
+                localStorage.getItem(uploadSessionKey(queueItem))) {
+                return false;
+            }
+            const request = {
+                fileName: file.webkitRelativePath || file.name,
+                fileSize: file.size,
+                path: queueItem.targetPath,
+                relativePath: file.webkitRelativePath || ''
+            };
+            const precheck = async (body) => {
+                const response = await fetch('/api/upload-precheck', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify(body)
+                });
+                return response.ok ? response.json() : {};
+            };
             
-            await uploadFileWithChunks(nextItem);
+            try {
+                // Aucun fichier de même taille côté serveur: inutile de calculer le hash
+                let result = await precheck(request);
+                if (!result.candidates) return false;
+                
+                const hash = await hashFileInWorker(queueItem);
+                if (!hash || queueItem.status !== 'active') return false;
+                result = await precheck({ ...request, hash });
+                if (result.exists) return true;
+            } catch (error) {
+                // Vérification impossible: upload normal
+            }
+            updateQueueItemStatus(queueItem.id, 'Upload en cours...', 'info');
+            return false;
+        }
+        
+        function uploadSessionKey(queueItem) {
+            const file = queueItem.file;
+            return `upload-session:${queueItem.targetPath}|${file.webkitRelativePath || file.name}|${file.size}|${file.lastModified}`;
+        }
+        
+        async function openUploadSession(queueItem) {
+            // Reprendre la session précédente de ce fichier si le serveur la connaît encore
+            const key = uploadSessionKey(queueItem);
+            const savedId = queueItem.sessionId || localStorage.getItem(key);
+            if (savedId) {
+                const response = await fetch(`/api/upload-session/${savedId}`);
+                if (response.ok) {
+                    const session = await response.json();
+                    if (session.status === 'active' || session.status === 'finalizing') {
+                        return session;
+                    }
+                }
+                localStorage.removeItem(key);
+            }
             
-            // Continuer avec le suivant
-            setTimeout(processUploadQueue, 1000);
+            const file = queueItem.file;
+            const response = await fetchWithBackpressure('/api/upload-session', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    fileName: file.webkitRelativePath || file.name,
+                    fileSize: file.size,
+                    path: queueItem.targetPath,
+                    relativePath: file.webkitRelativePath || ''
+                })
+            }, queueItem);
+            const session = await response.json();
+            if (!session.success) {
+                throw new Error(session.error || 'Création de session impossible');
+            }
+            localStorage.setItem(key, session.upload_id);
+            return session;
         }
         
         async function uploadFileWithChunks(queueItem) {
             const file = queueItem.file;
             const uploadId = queueItem.id;
-            const chunkSize = 2 * 1024 * 1024; // 2MB chunks
-            const totalChunks = Math.ceil(file.size / chunkSize);
             
             updateQueueItemStatus(uploadId, 'Upload en cours...', 'info');
             queueItem.startTime = Date.now();
+            queueItem.controller = new AbortController();
             
+            let session;
             try {
-                for (let chunkIndex = 0; chunkIndex < totalChunks; chunkIndex++) {
-                    if (queueItem.status === 'paused') {
-                        updateQueueItemStatus(uploadId, 'En pause', 'warning');
-                        return;
-                    }
-                    
-                    if (queueItem.status === 'cancelled') {
-                        removeFromQueue(uploadId);
-                        return;
-                    }
-                    
-                    const start = chunkIndex * chunkSize;
-                    const end = Math.min(start + chunkSize, file.size);
-                    const chunk = file.slice(start, end);
-                    
-                    const formData = new FormData();
-                    formData.append('chunk', chunk);
-                    formData.append('fileName', file.webkitRelativePath || file.name);
-                    formData.append('chunkIndex', chunkIndex);
-                    formData.append('totalChunks', totalChunks);
-                    formData.append('uploadId', uploadId);
-                    formData.append('path', currentPath);
-                    if (file.webkitRelativePath) {
-                        formData.append('relativePath', file.webkitRelativePath);
-                    }
-                    
-                    const response = await fetch('/api/upload-chunk', {
-                        method: 'POST',
-                        body: formData
-                    });
-                    
-                    if (!response.ok) {
-                        throw new Error(`Erreur chunk ${chunkIndex}`);
-                    }
-                    
-                    const progress = ((chunkIndex + 1) / totalChunks) * 100;
-                    queueItem.progress = progress;
+                if (await tryInstantUpload(queueItem)) {
+                    updateProgressBar(uploadId, 100);
+                    completeUpload(queueItem, 'Terminé (instantané)!');
+                    return;
+                }
+                if (queueItem.status !== 'active') return;
+                session = await openUploadSession(queueItem);
+            } catch (error) {
+                queueItem.status = 'error';
+                updateQueueItemStatus(uploadId, `Erreur: ${error.message}`, 'error');
+                showNotification(`Erreur upload ${file.name}`, 'error');
+                return;
+            }
+            queueItem.sessionId = session.upload_id;
+            
+            // Seuls les chunks absents côté serveur sont envoyés
+            const chunkSize = session.chunk_size;
+            const totalChunks = session.total_chunks;
+            const pendingChunks = [];
+            (session.missing || []).forEach(([first, last]) => {
+                for (let i = first; i <= last; i++) pendingChunks.push(i);
+            });
+            
+            // Plusieurs chunks en vol: le serveur assemble quand son bitmap est complet
+            let nextChunk = 0;
+            let completedChunks = totalChunks - pendingChunks.length;
+            let uploadedBytes = 0;
+            let finalizing = session.status === 'finalizing';
+            updateProgressBar(uploadId, (completedChunks / totalChunks) * 100);
+            
+            async function sendChunk(chunkIndex) {
+                const start = chunkIndex * chunkSize;
+                const end = Math.min(start + chunkSize, file.size);
+                const chunk = file.slice(start, end);
+                
+                await acquireBytes(chunk.size);
+                let result;
+                try {
+                    if (queueItem.status !== 'active') return;
                     
-                    updateProgressBar(uploadId, progress);
-                    updateUploadSpeed(uploadId, start + chunk.size, queueItem.startTime);
+                    // CRC32 vérifié par le serveur: un chunk corrompu en route est renvoyé seul
+                    const data = new Uint8Array(await chunk.arrayBuffer());
+                    const checksum = crc32(data);
                     
-                    if (chunkIndex === totalChunks - 1) {
-                        queueItem.status = 'completed';
-                        updateQueueItemStatus(uploadId, 'Terminé!', 'success');
-                        activeUploads.delete(uploadId);
+                    for (let attempt = 1; ; attempt++) {
+                        let url, options;
+                        if (uploadSettings.rawChunkPut && chunk.size > 0) {
+                            // Corps brut: le serveur l'écrit à son offset sans analyse multipart
+                            url = `/api/upload-session/${session.upload_id}`;
+                            options = {
+                                method: 'PUT',
+                                headers: {
+                                    'Content-Type': 'application/octet-stream',
+                                    'Content-Range': `bytes ${start}-${end - 1}/${file.size}`,
+                                    'X-Chunk-CRC32': checksum
+                                },
+                                body: data
+                            };
+                        } else {
+                            const formData = new FormData();
+                            // Champs avant les données: le serveur écrit le chunk dès sa réception
+                            formData.append('chunkIndex', chunkIndex);
+                            formData.append('uploadId', session.upload_id);
+                            formData.append('crc32', checksum);
+                            formData.append('chunk', new Blob([data]));
+                            url = '/api/upload-chunk';
+                            options = { method: 'POST', body: formData };
+                        }
                         
-                        setTimeout(() => {
-                            removeQueueItemFromDOM(uploadId);
-                            removeFromQueue(uploadId);
-                        }, 3000);
+                        const response = await fetchWithBackpressure(url, {
+                            ...options,
+                            signal: queueItem.controller.signal
+                        }, queueItem);
+                        if (response.status === 429) return;  // Pause ou annulation pendant l'attente
                         
-                        showNotification(`${file.name} téléversé avec succès`, 'success');
-                        refreshFiles();
+                        if (!response.ok && response.status !== 400) {
+                            throw new Error(`Erreur chunk ${chunkIndex}`);
+                        }
+                        
+                        result = await response.json();
+                        if (result.success) break;
+                        if (!result.retry || attempt >= 3) {
+                            throw new Error(result.error || `Erreur chunk ${chunkIndex}`);
+                        }
                     }
+                } finally {
+                    releaseBytes(chunk.size);
+                }
+                
+                completedChunks++;
+                uploadedBytes += chunk.size;
+                if (result.status === 'finalizing') {
+                    finalizing = true;
+                }
+                
+                const progress = (completedChunks / totalChunks) * 100;
+                queueItem.progress = progress;
+                
+                updateProgressBar(uploadId, progress);
+                updateUploadSpeed(uploadId, uploadedBytes, queueItem.startTime);
+            }
+            
+            async function chunkWorker() {
+                while (queueItem.status === 'active' && nextChunk < pendingChunks.length) {
+                    await sendChunk(pendingChunks[nextChunk++]);
+                }
+            }
+            
+            try {
+                const workers = [];
+                const workerCount = Math.min(uploadSettings.parallelChunks, pendingChunks.length);
+                for (let i = 0; i < workerCount; i++) {
+                    workers.push(chunkWorker());
+                }
+                await Promise.all(workers);
+                
+                if (queueItem.status === 'paused') {
+                    updateQueueItemStatus(uploadId, 'En pause', 'warning');
+                    return;
+                }
+                
+                if (queueItem.status === 'cancelled') {
+                    removeFromQueue(uploadId);
+                    return;
+                }
+                
+                if (finalizing) {
+                    // L'assemblage se fait côté serveur: le créneau passe au fichier suivant
+                    queueItem.status = 'finalizing';
+                    processUploadQueue();
+                    updateQueueItemStatus(uploadId, 'Assemblage...', 'info');
+                    await waitForFinalize(session.upload_id);
                 }
+                
+                localStorage.removeItem(uploadSessionKey(queueItem));
+                completeUpload(queueItem, 'Terminé!');
             } catch (error) {
+                // Chunks interrompus par une pause ou une annulation: pas une erreur
+                if (queueItem.status === 'paused' || queueItem.status === 'cancelled') {
+                    return;
+                }
                 queueItem.status = 'error';
                 updateQueueItemStatus(uploadId, `Erreur: ${error.message}`, 'error');
                 showNotification(`Erreur upload ${file.name}`, 'error');
             }
         }
         
+        function completeUpload(queueItem, message) {
+            queueItem.status = 'completed';
+            updateQueueItemStatus(queueItem.id, message, 'success');
+            activeUploads.delete(queueItem.id);
+            
+            setTimeout(() => {
+                removeQueueItemFromDOM(queueItem.id);
+                removeFromQueue(queueItem.id);
+            }, 3000);
+            
+            showNotification(`${queueItem.file.name} téléversé avec succès`, 'success');
+            refreshFiles();
+        }
+        
+        async function waitForFinalize(uploadId) {
+            // Petits fichiers: assemblés en quelques ms, on interroge vite puis de plus en plus lentement
+            let delay = 50;
+            while (true) {
+                // Attente écourtée par l'événement de fin d'assemblage du flux SSE
+                await new Promise(resolve => {
+                    const timer = setTimeout(resolve, delay);
+                    finalizeWaiters.set(uploadId, () => {
+                        clearTimeout(timer);
+                        resolve();
+                    });
+                });
+                finalizeWaiters.delete(uploadId);
+                delay = Math.min(delay * 2, 2000);
+                const response = await fetch(`/api/upload-status/${uploadId}`);
+                if (!response.ok) continue;
+                
+                const status = await response.json();
+                if (status.status === 'completed') return;
+                if (status.status === 'error') {
+                    throw new Error(status.error || 'Erreur assemblage');
+                }
+            }
+        }
+        
         function updateProgressBar(uploadId, progress) {
             const progressBar = document.getElementById(`progress-${uploadId}`);
             if (progressBar) {
@@ -1151,6 +4621,13 @@ def index():
             if (queueItem) {
                 queueItem.status = 'paused';
                 queueItem.pauseTime = Date.now();
+                // Interrompt les chunks en vol; la reprise renverra ceux que le serveur n'a pas reçus
+                if (queueItem.controller) {
+                    queueItem.controller.abort();
+                }
+                if (queueItem.stopHash) {
+                    queueItem.stopHash();
+                }
                 document.getElementById(`pause-${uploadId}`).classList.add('hidden');
                 document.getElementById(`resume-${uploadId}`).classList.remove('hidden');
                 updateQueueItemStatus(uploadId, 'En pause', 'warning');
@@ -1172,6 +4649,16 @@ def index():
             const queueItem = uploadQueue.find(item => item.id === uploadId);
             if (queueItem) {
                 queueItem.status = 'cancelled';
+                if (queueItem.controller) {
+                    queueItem.controller.abort();
+                }
+                if (queueItem.stopHash) {
+                    queueItem.stopHash();
+                }
+                if (queueItem.sessionId) {
+                    fetch(`/api/upload-session/${queueItem.sessionId}`, { method: 'DELETE' });
+                    localStorage.removeItem(uploadSessionKey(queueItem));
+                }
                 activeUploads.delete(uploadId);
                 removeQueueItemFromDOM(uploadId);
                 removeFromQueue(uploadId);
@@ -1432,37 +4919,116 @@ def index():
     '''
     return html
 
-# APIs étendues
-@app.route('/api/stats')
-def get_stats():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+class UiAssets:
+    """Interface construite une fois au démarrage: CSS et JS extraits de la page, nommés par leur
+    empreinte (cache navigateur immuable) et précompressés (gzip, brotli si disponible).
+    La page servie n'est plus qu'une coquille HTML, revalidée par ETag."""
     
+    def __init__(self, page):
+        self.assets = {}
+        css = page.split('<style>', 1)[1].split('</style>', 1)[0]
+        js = page.split('<script>', 1)[1].split('</script>', 1)[0]
+        css_name = self._add('app', 'css', css, 'text/css; charset=utf-8')
+        js_name = self._add('app', 'js', js, 'application/javascript; charset=utf-8')
+        shell = page.replace(f'<style>{css}</style>', f'<link rel="stylesheet" href="/assets/{css_name}">')
+        shell = shell.replace(f'<script>{js}</script>', f'<script src="/assets/{js_name}"></script>')
+        self.shell = self._build(shell, 'text/html; charset=utf-8')
+    
+    def _build(self, text, mimetype):
+        body = text.encode('utf-8')
+        asset = {'identity': body, 'mimetype': mimetype, 'etag': hashlib.sha256(body).hexdigest()[:16],
+                 'gzip': gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            asset['br'] = brotli.compress(body, quality=11)
+        return asset
+    
+    def _add(self, stem, extension, text, mimetype):
+        asset = self._build(text, mimetype)
+        name = f"{stem}.{asset['etag']}.{extension}"
+        self.assets[name] = asset
+        return name
+    
+    def response(self, asset, immutable):
+        """Variante compressée acceptée par le client, ou 304 s'il a déjà cette version"""
+        encoding = next((encoding for encoding in ('br', 'gzip')
+                         if encoding in asset and request.accept_encodings[encoding]), 'identity')
+        # ETag fort propre à chaque variante: les octets diffèrent d'un encodage à l'autre
+        etag = asset['etag'] if encoding == 'identity' else f"{asset['etag']}-{encoding}"
+        if not_modified(etag, request.headers.get('If-None-Match')):
+            response = Response(status=304)
+        else:
+            response = Response(asset[encoding], content_type=asset['mimetype'])
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        # Nom versionné: jamais revalidé; la coquille l'est à chaque chargement (304 sans corps)
+        response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable' if immutable else 'no-cache'
+        return response
+
+ui_assets = UiAssets(ui_page())
+
+@app.route('/')
+def index():
+    return ui_assets.response(ui_assets.shell, immutable=False)
+
+@app.route('/assets/<name>')
+def ui_asset(name):
+    asset = ui_assets.assets.get(name)
+    if asset is None:
+        return jsonify({'success': False, 'error': 'Fichier non trouvé'}), 404
+    return ui_assets.response(asset, immutable=True)
+
+# APIs étendues
+def stats_payload():
     # Compter les fichiers
-    total_files = 0
-    for root, dirs, files in os.walk(UPLOAD_FOLDER):
-        total_files += len(files)
+    total_files = dir_index.get(UPLOAD_FOLDER)['files']
     
     # Uploads actifs
-    cursor.execute("SELECT COUNT(*) FROM uploads WHERE status = 'active'")
-    active_uploads = cursor.fetchone()[0]
-    
-    conn.close()
+    active_uploads = db.query_one("SELECT COUNT(*) FROM uploads WHERE status = 'active'")[0]
     
-    return jsonify({
+    return {
         'total_files': total_files,
         'active_uploads': active_uploads,
         'storage': get_storage_info()
-    })
+    }
+
+@app.route('/api/stats')
+def get_stats():
+    payload = stats_payload()
+    return conditional_response(payload, payload_etag(payload))
+
+@app.route('/api/events')
+def events_stream():
+    """Flux SSE des changements: statistiques (champs modifiés), dossiers modifiés et progression des uploads.
+    En mode WSGI chaque abonné occupe un thread du serveur pendant toute sa connexion: leur nombre est
+    borné (WSGI_EVENT_SUBSCRIBERS), les clients refusés actualisent périodiquement. Pour de nombreux
+    navigateurs connectés, lancer le serveur en mode ASGI (--asgi), où un abonné ne coûte qu'une coroutine."""
+    last_id = event_bus.resume_id(request.headers.get('Last-Event-ID'))
+    if not event_bus.subscribe(WSGI_EVENT_SUBSCRIBERS):
+        return jsonify({'success': False, 'error': 'Trop de flux d\'événements ouverts'}), 503, \
+            {'Retry-After': str(RETRY_AFTER)}
+    
+    def generate(last_id):
+        # État complet à la connexion, puis uniquement les changements
+        yield 'retry: 3000\n\n' + event_frame('stats', stats_payload())
+        while True:
+            frames, last_id = event_bus.since(last_id)
+            if frames:
+                yield ''.join(frames)
+            elif not event_bus.wait(last_id, EVENT_KEEPALIVE):
+                yield ': keepalive\n\n'
+    
+    response = Response(stream_with_context(generate(last_id)), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Désabonnement à la fermeture de la réponse, même si le flux n'a jamais démarré
+    response.call_on_close(event_bus.unsubscribe)
+    return response
 
 @app.route('/api/history')
 def get_history():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM history ORDER BY timestamp DESC LIMIT 50')
     history = []
-    for row in cursor.fetchall():
+    for row in db.query('SELECT * FROM history ORDER BY timestamp DESC LIMIT 50'):
         history.append({
             'id': row[0],
             'action': row[1],
@@ -1472,7 +5038,6 @@ def get_history():
             'timestamp': row[5]
         })
     
-    conn.close()
     return jsonify({'history': history})
 
 @app.route('/api/add-history', methods=['POST'])
@@ -1488,124 +5053,208 @@ def add_history_entry():
 
 @app.route('/api/favorites', methods=['GET', 'POST'])
 def handle_favorites():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
     if request.method == 'POST':
         data = request.json
         try:
-            cursor.execute('INSERT INTO favorites (path, name, created_at) VALUES (?, ?, ?)',
-                         (data['path'], data['name'], datetime.now()))
-            conn.commit()
-            conn.close()
+            db.write('INSERT INTO favorites (path, name, created_at) VALUES (?, ?, ?)',
+                     (data['path'], data['name'], datetime.now()))
             return jsonify({'success': True})
         except sqlite3.IntegrityError:
-            conn.close()
-            return jsonify({'success': False, 'error': str(e)})
+            return jsonify({'success': False, 'error': 'Déjà dans les favoris'})
+    else:
+        favorites = []
+        for row in db.query('SELECT * FROM favorites ORDER BY created_at DESC'):
+            favorites.append({
+                'id': row[0],
+                'path': row[1],
+                'name': row[2],
+                'created_at': row[3]
+            })
+        return jsonify({'favorites': favorites})
 
 @app.route('/api/upload-chunk', methods=['POST'])
 def upload_chunk():
     """API pour upload par chunks avec reprise d'erreur"""
     try:
+        upload_admission.check()
+        # Corps reçu hors créneau: un client lent n'occupe pas le disque; seules les écritures en prennent un
         chunk = request.files.get('chunk')
-        file_name = request.form.get('fileName')
-        chunk_index = int(request.form.get('chunkIndex'))
-        total_chunks = int(request.form.get('totalChunks'))
-        upload_id = request.form.get('uploadId')
-        target_path = request.form.get('path', '')
-        relative_path = request.form.get('relativePath', '')
-        
-        if not chunk or not file_name:
-            return jsonify({'success': False, 'error': 'Chunk ou nom de fichier manquant'})
-        
-        # Utiliser le chemin relatif si disponible
-        if relative_path:
-            full_dir = os.path.join(UPLOAD_FOLDER, target_path, os.path.dirname(relative_path))
-            final_path = os.path.join(UPLOAD_FOLDER, target_path, relative_path)
-        else:
-            filename = secure_filename(file_name)
-            full_dir = os.path.join(UPLOAD_FOLDER, target_path)
-            final_path = os.path.join(full_dir, filename)
+        if not chunk:
+            return jsonify({'success': False, 'error': 'Chunk ou identifiant d\'upload manquant'})
+        upload_id, chunk_index, state = prepare_chunk(request.form)
+        writer = ChunkWriter(upload_id, chunk_index, state)
+        try:
+            writer.copy_from(chunk.stream, request.remote_addr)
+        finally:
+            writer.close()
         
-        os.makedirs(full_dir, exist_ok=True)
+        return jsonify(finish_chunk(writer, request.remote_addr, request.form.get('crc32')))
         
-        # Chemin temporaire pour les chunks
-        temp_dir = os.path.join(TEMP_FOLDER, upload_id)
-        os.makedirs(temp_dir, exist_ok=True)
-        chunk_path = os.path.join(temp_dir, f"{file_name}.part{chunk_index}")
+    except AdmissionRefused as e:
+        return admission_refused(e)
+    except UploadCompleted as e:
+        return jsonify(e.response())
+    except UploadNotFound as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except ChunkChecksumError as e:
+        return jsonify({'success': False, 'error': str(e), 'retry': True}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/upload-session', methods=['POST'])
+def create_upload_session():
+    """API pour créer une session d'upload reprenable"""
+    try:
+        data = request.json or {}
+        file_name = data.get('fileName')
+        file_size = int(data.get('fileSize', 0))
+        chunk_size = int(data.get('chunkSize') or CHUNK_SIZE)
+        relative_path = data.get('relativePath', '')
+        
+        if not file_name or chunk_size <= 0:
+            return jsonify({'success': False, 'error': 'Nom de fichier ou taille de chunk invalide'}), 400
+        
+        upload_id = open_session(file_name, file_size, chunk_size, data.get('path', ''), relative_path)
+        return jsonify({'success': True, **upload_manager.session_info(upload_id)})
+        
+    except AdmissionRefused as e:
+        return admission_refused(e)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/upload-session/<upload_id>', methods=['GET', 'DELETE'])
+def handle_upload_session(upload_id):
+    """API pour consulter les chunks déjà reçus d'une session, ou l'annuler"""
+    if request.method == 'DELETE':
+        if not upload_manager.abort_upload(upload_id):
+            return jsonify({'success': False, 'error': 'Session non trouvée'}), 404
+        return jsonify({'success': True})
+    
+    info = upload_manager.session_info(upload_id)
+    if info is None:
+        status = upload_manager.get_upload_status(upload_id)
+        if status:
+            return jsonify({'success': True, 'upload_id': upload_id, 'status': status['status']})
+        return jsonify({'success': False, 'error': 'Session non trouvée'}), 404
+    
+    # Tous les chunks reçus mais finalisation interrompue (redémarrage): la relancer
+    if upload_manager.claim_finalize(upload_id):
+        start_finalize(upload_id, upload_manager.get_session(upload_id), request.remote_addr)
+        info['status'] = 'finalizing'
+    
+    return jsonify({'success': True, **info})
+
+@app.route('/api/upload-session/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """API pour envoyer un chunk brut (application/octet-stream) désigné par Content-Range"""
+    try:
+        upload_admission.check()
+        state = upload_manager.chunk_session(upload_id)
+        chunk_index, expected = chunk_for_range(state, request.headers.get('Content-Range'))
         
-        # Sauvegarder le chunk
-        chunk.save(chunk_path)
+        # Corps copié directement à son offset, sans analyse multipart ni fichier intermédiaire;
+        # créneau pris bloc par bloc pour l'écriture seulement, pas pendant la réception
+        writer = ChunkWriter(upload_id, chunk_index, state)
+        try:
+            writer.copy_from(request.stream, request.remote_addr)
+        finally:
+            chunk_bytes = writer.close()
+        if chunk_bytes != expected:
+            raise ValueError(f'Chunk incomplet: {chunk_bytes}/{expected} octets')
         
-        # Mettre à jour le gestionnaire d'upload
-        upload_manager.update_chunk(upload_id, chunk.content_length)
+        return jsonify(finish_chunk(writer, request.remote_addr, request.headers.get('X-Chunk-CRC32')))
         
-        # Si c'est le dernier chunk, assembler le fichier
-        if chunk_index == total_chunks - 1:
-            try:
-                with open(final_path, 'wb') as final_file:
-                    for i in range(total_chunks):
-                        chunk_file_path = os.path.join(temp_dir, f"{file_name}.part{i}")
-                        if os.path.exists(chunk_file_path):
-                            with open(chunk_file_path, 'rb') as chunk_file:
-                                final_file.write(chunk_file.read())
-                            os.remove(chunk_file_path)
-                        else:
-                            raise Exception(f"Chunk {i} manquant")
-                
-                # Nettoyer le dossier temporaire
-                try:
-                    shutil.rmtree(temp_dir)
-                except:
-                    pass
-                
-                # Finaliser l'upload
-                upload_manager.complete_upload(upload_id)
-                
-                # Ajouter à l'historique
-                file_size = os.path.getsize(final_path)
-                add_to_history('upload', file_name, file_size, request.remote_addr)
-                
-            except Exception as e:
-                return jsonify({'success': False, 'error': f'Erreur assemblage: {str(e)}'})
+    except AdmissionRefused as e:
+        return admission_refused(e)
+    except UploadCompleted as e:
+        return jsonify(e.response())
+    except UploadNotFound as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except ChunkChecksumError as e:
+        return jsonify({'success': False, 'error': str(e), 'retry': True}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def tus_response(status, headers=None, body=''):
+    return Response(body, status, {'Tus-Resumable': TUS_VERSION, **(headers or {})})
+
+@app.route('/files/', methods=['POST', 'OPTIONS'])
+def tus_create_upload():
+    """tus 1.0: découverte du serveur (OPTIONS) et création d'un upload (POST)"""
+    if request.method == 'OPTIONS':
+        return tus_response(204, tus_options())
+    try:
+        upload_id = tus_create(request.headers, request.remote_addr)
+        return tus_response(201, {'Location': f'{request.host_url}files/{upload_id}', 'Upload-Offset': '0'})
+    except Exception as e:
+        status, headers, message = tus_failure(e)
+        return tus_response(status, headers, message)
+
+@app.route('/files/<upload_id>', methods=['HEAD', 'PATCH', 'DELETE', 'OPTIONS'])
+def tus_upload(upload_id):
+    """tus 1.0: offset courant (HEAD), envoi d'octets (PATCH) et annulation (DELETE)"""
+    try:
+        if request.method == 'OPTIONS':
+            return tus_response(204, tus_options())
+        if request.method == 'HEAD':
+            return tus_response(200, tus_head(upload_id, request.headers))
+        if request.method == 'DELETE':
+            tus_delete(upload_id, request.headers)
+            return tus_response(204)
         
-        return jsonify({
-            'success': True, 
-            'chunk': chunk_index + 1, 
-            'total': total_chunks,
-            'upload_id': upload_id
-        })
+        offset, checksum = tus_begin_patch(request.headers)
+        writer = TusWriter(upload_id, offset, checksum)
+        completed = False
+        try:
+            for block in iter(lambda: request.stream.read(ASSEMBLY_BUFFER_SIZE), b''):
+                with upload_admission.slot(request.remote_addr):
+                    writer.write(block)
+            completed = True
+        finally:
+            # Corps interrompu: les octets écrits comptent (sauf avec checksum), le client reprend via HEAD
+            offset = writer.close(request.remote_addr, completed)
+        return tus_response(204, {'Upload-Offset': str(offset)})
         
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        status, headers, message = tus_failure(e)
+        return tus_response(status, headers, message)
 
 @app.route('/api/upload', methods=['POST'])
 def upload_files():
     """API pour upload de fichiers simples (fallback)"""
     try:
-        files = request.files.getlist('files')
-        relative_paths = request.form.getlist('relative_paths')
-        target_path = request.form.get('path', '')
-        
-        if not files:
-            return jsonify({'success': False, 'error': 'Aucun fichier sélectionné'})
-        
+        upload_admission.check(new_session=True)
         saved_files = []
-        
-        for i, file in enumerate(files):
-            if file and file.filename:
-                if i < len(relative_paths) and relative_paths[i]:
-                    relative_path = relative_paths[i]
-                    full_dir = os.path.join(UPLOAD_FOLDER, target_path, os.path.dirname(relative_path))
-                    os.makedirs(full_dir, exist_ok=True)
-                    filepath = os.path.join(UPLOAD_FOLDER, target_path, relative_path)
-                else:
-                    filename = secure_filename(file.filename)
-                    full_dir = os.path.join(UPLOAD_FOLDER, target_path)
-                    os.makedirs(full_dir, exist_ok=True)
-                    filepath = os.path.join(full_dir, filename)
+        # Un créneau pour toute la requête: l'analyse multipart écrit déjà le corps sur disque
+        with upload_admission.slot(request.remote_addr):
+            files = request.files.getlist('files')
+            relative_paths = request.form.getlist('relative_paths')
+            target_path = request.form.get('path', '')
+            
+            if not files:
+                return jsonify({'success': False, 'error': 'Aucun fichier sélectionné'})
+            
+            # Tous les chemins sont vérifiés avant d'écrire le premier fichier
+            targets = [(file, *resolve_upload_path(target_path, file.filename,
+                                                   relative_paths[i] if i < len(relative_paths) else ''))
+                       for i, file in enumerate(files) if file and file.filename]
+            
+            for file, full_dir, filepath in targets:
+                os.makedirs(full_dir, exist_ok=True)
                 
-                file.save(filepath)
+                previous_size = os.path.getsize(filepath) if os.path.exists(filepath) else None
+                digest = hashlib.md5()
+                unshare_file(filepath)
+                with open(filepath, 'wb') as f:
+                    for block in iter(lambda: file.stream.read(ASSEMBLY_BUFFER_SIZE), b''):
+                        f.write(block)
+                        digest.update(block)
+                dir_index.file_added(filepath, previous_size)
+                hash_cache.store(filepath, digest.hexdigest())
                 saved_files.append(filepath)
                 
                 # Ajouter à l'historique
@@ -1618,31 +5267,144 @@ def upload_files():
             'message': f'{len(saved_files)} fichier(s) uploadé(s) avec succès'
         })
         
+    except AdmissionRefused as e:
+        return admission_refused(e)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/upload-precheck', methods=['POST'])
+def upload_precheck():
+    """API d'upload instantané: sans hash, indique si des fichiers de même taille existent;
+    avec hash, crée le fichier à partir d'un contenu identique déjà partagé"""
+    try:
+        data = request.json or {}
+        file_name = data.get('fileName')
+        file_size = int(data.get('fileSize', -1))
+        file_hash = (data.get('hash') or '').lower()
+        if not file_name or file_size < 0:
+            return jsonify({'success': False, 'error': 'Paramètres manquants'}), 400
+        
+        # Premier passage: le client ne calcule le hash que s'il existe des candidats
+        if not file_hash:
+            return jsonify({'success': True, 'exists': False, 'candidates': hash_cache.count_size(file_size)})
+        
+        source_path = hash_cache.find(file_size, file_hash)
+        if source_path is None:
+            return jsonify({'success': True, 'exists': False, 'candidates': 0})
+        
+        full_dir, final_path = resolve_upload_path(data.get('path', ''), file_name, data.get('relativePath', ''))
+        if os.path.abspath(source_path) == os.path.abspath(final_path):
+            method = 'identical'
+        else:
+            os.makedirs(full_dir, exist_ok=True)
+            dir_index.dir_created(full_dir)
+            previous_size = os.path.getsize(final_path) if os.path.exists(final_path) else None
+            method = clone_file(source_path, final_path)
+            dir_index.file_added(final_path, previous_size)
+            hash_cache.store(final_path, file_hash)
+        add_to_history('upload', file_name, file_size, request.remote_addr)
+        
+        return jsonify({'success': True, 'exists': True, 'method': method})
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/upload-bundle', methods=['POST'])
+def upload_bundle():
+    """API pour uploader de nombreux petits fichiers en une requête (archive tar envoyée en streaming)"""
+    try:
+        upload_admission.check(new_session=True)
+        files_saved = extract_bundle(request.stream, request.args.get('path', ''), request.remote_addr)
+        return jsonify({
+            'success': True,
+            'files_saved': files_saved,
+            'message': f'{files_saved} fichier(s) uploadé(s) avec succès'
+        })
+        
+    except AdmissionRefused as e:
+        return admission_refused(e)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/duplicates')
+def get_duplicates():
+    """API pour consulter le résultat de la dernière recherche de doublons"""
+    return jsonify({'success': True, **duplicate_finder.report()})
+
+@app.route('/api/duplicates/scan', methods=['POST'])
+def scan_duplicates():
+    """API pour lancer une recherche de doublons en arrière-plan"""
+    started = duplicate_finder.start()
+    return jsonify({'success': True, 'started': started, 'status': duplicate_finder.status})
+
+@app.route('/api/duplicates/reclaim', methods=['POST'])
+def reclaim_duplicates():
+    """API pour remplacer les doublons trouvés par des liens (tous, ou un seul groupe par son hash)"""
+    try:
+        data = request.json or {}
+        reclaimed, linked = duplicate_finder.reclaim(data.get('hash'))
+        return jsonify({
+            'success': True,
+            'reclaimed': reclaimed,
+            'files_linked': linked,
+            'message': f'{linked} fichier(s) lié(s), {format_size(reclaimed)} libéré(s)'
+        })
+        
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 @app.route('/api/files')
 def get_files():
-    """API pour obtenir la liste des fichiers avec tri"""
-    path = request.args.get('path', '')
-    sort_by = request.args.get('sort_by', 'name')
-    sort_order = request.args.get('sort_order', 'asc')
-    
-    files = get_file_list(path, sort_by, sort_order)
-    storage = get_storage_info()
-    
-    return jsonify({
-        'files': files,
-        'storage': storage,
-        'path': path
-    })
+    """API pour obtenir la liste des fichiers avec tri, par pages (limit, cursor) et champs coûteux sur demande (fields)"""
+    try:
+        return conditional_response(lambda: files_payload(request.args), files_etag(request.args))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/search')
+def search_files():
+    """API de recherche par nom dans tout le partage (sous-chaîne, ou préfixe de mot avec mode=prefix);
+    champs coûteux sur demande (fields), comme /api/files"""
+    try:
+        started = time.perf_counter()
+        args = request.args
+        extensions = [extension for extension in args.get('ext', '').split(',') if extension]
+        min_size = args.get('min_size', type=int)
+        max_size = args.get('max_size', type=int)
+        kind = args.get('type') if args.get('type') in ('file', 'directory') else None
+        offset = max(0, args.get('offset', 0, type=int))
+        limit = min(max(1, args.get('limit', SEARCH_PAGE_SIZE, type=int)), SEARCH_MAX_PAGE_SIZE)
+        fields = [field for field in args.get('fields', '').split(',') if field in LISTING_OPTIONAL_FIELDS]
+        
+        total, paths = search_index.search(args.get('q', ''), args.get('mode') == 'prefix', extensions,
+                                           min_size, max_size, kind, offset, limit)
+        return jsonify({
+            'success': True,
+            'results': file_entries(paths, fields),
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'has_more': offset + len(paths) < total,
+            'took_ms': round((time.perf_counter() - started) * 1000, 2)
+        })
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except TimeoutError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
 
 @app.route('/api/download/<path:filename>')
 def download_file(filename):
     """API pour télécharger un fichier avec suivi"""
     try:
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        if not os.path.exists(file_path):
+        file_path = safe_join(UPLOAD_FOLDER, filename)
+        if file_path is None or not os.path.isfile(file_path):
             return jsonify({'error': 'Fichier non trouvé'}), 404
         
         # Ajouter à l'historique
@@ -1656,50 +5418,23 @@ def download_file(filename):
 
 @app.route('/api/download-folder/<path:foldername>')
 def download_folder(foldername):
-    """API pour télécharger un dossier en ZIP optimisé"""
+    """API pour télécharger un dossier en ZIP généré en streaming"""
     try:
-        folder_path = os.path.join(UPLOAD_FOLDER, foldername)
-        if not os.path.exists(folder_path) or not os.path.isdir(folder_path):
+        folder_path = safe_join(UPLOAD_FOLDER, foldername)
+        if folder_path is None or not os.path.isdir(folder_path):
             return jsonify({'error': 'Dossier non trouvé'}), 404
         
-        # Créer un ZIP temporaire avec un nom unique
-        zip_filename = f"{foldername.replace('/', '_')}_{int(time.time())}.zip"
-        zip_path = os.path.join(TEMP_FOLDER, zip_filename)
-        
-        def generate_zip():
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
-                for root, dirs, files in os.walk(folder_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, folder_path)
-                        zipf.write(file_path, arcname)
-            
-            return zip_path
-        
-        # Générer le ZIP dans un thread pour éviter le blocage
-        zip_thread = threading.Thread(target=generate_zip)
-        zip_thread.start()
-        zip_thread.join(timeout=300)  # 5 minutes max
-        
-        if not os.path.exists(zip_path):
-            return jsonify({'error': 'Erreur création ZIP'}), 500
-        
         # Ajouter à l'historique
-        folder_size = get_directory_size(folder_path)
+        folder_size = dir_index.get(folder_path)['size']
         add_to_history('download', foldername, folder_size, request.remote_addr)
         
-        def remove_file():
-            time.sleep(10)  # Attendre que le téléchargement se termine
-            try:
-                os.remove(zip_path)
-            except:
-                pass
-        
-        # Supprimer le fichier ZIP après envoi
-        threading.Thread(target=remove_file).start()
-        
-        return send_file(zip_path, as_attachment=True, 
-                        download_name=f"{os.path.basename(foldername)}.zip")
+        # Le ZIP est écrit directement dans la réponse pendant le parcours du dossier
+        zip_name = f"{os.path.basename(foldername.rstrip('/'))}.zip"
+        return Response(
+            stream_with_context(stream_zip(folder_path)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(zip_name)}"}
+        )
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1712,34 +5447,38 @@ def get_upload_status(upload_id):
         return jsonify(status)
     return jsonify({'error': 'Upload non trouvé'}), 404
 
+def cleanup_temp():
+    """Supprime les fichiers temporaires anciens (> RESUME_TIMEOUT) et les dossiers vides"""
+    current_time = time.time()
+    cleanup_count = 0
+    
+    for root, dirs, files in os.walk(TEMP_FOLDER):
+        for file in files:
+            file_path = os.path.join(root, file)
+            if current_time - os.path.getmtime(file_path) > RESUME_TIMEOUT:
+                try:
+                    os.remove(file_path)
+                    cleanup_count += 1
+                except:
+                    pass
+    
+    # Nettoyer les dossiers vides
+    for root, dirs, files in os.walk(TEMP_FOLDER, topdown=False):
+        for dir in dirs:
+            dir_path = os.path.join(root, dir)
+            try:
+                os.rmdir(dir_path)
+            except:
+                pass
+    
+    dir_index.rescan(TEMP_FOLDER)
+    return cleanup_count
+
 @app.route('/api/cleanup-temp', methods=['POST'])
 def cleanup_temp_files():
     """API pour nettoyer les fichiers temporaires"""
     try:
-        # Supprimer les fichiers temporaires anciens (> 1 heure)
-        current_time = time.time()
-        cleanup_count = 0
-        
-        for root, dirs, files in os.walk(TEMP_FOLDER):
-            for file in files:
-                file_path = os.path.join(root, file)
-                if current_time - os.path.getmtime(file_path) > RESUME_TIMEOUT:
-                    try:
-                        os.remove(file_path)
-                        cleanup_count += 1
-                    except:
-                        pass
-        
-        # Nettoyer les dossiers vides
-        for root, dirs, files in os.walk(TEMP_FOLDER, topdown=False):
-            for dir in dirs:
-                dir_path = os.path.join(root, dir)
-                try:
-                    os.rmdir(dir_path)
-                except:
-                    pass
-        
-        return jsonify({'success': True, 'cleaned_files': cleanup_count})
+        return jsonify({'success': True, 'cleaned_files': cleanup_temp()})
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -1762,31 +5501,630 @@ def server_info():
         'limits': {
             'max_concurrent_uploads': MAX_CONCURRENT_UPLOADS,
             'chunk_size': CHUNK_SIZE,
+            'parallel_chunks': PARALLEL_CHUNKS,
+            'max_inflight_bytes': CLIENT_INFLIGHT_BYTES,
+            'raw_chunk_put': True,
+            'bundle_file_limit': BUNDLE_FILE_LIMIT,
+            'bundle_max_files': BUNDLE_MAX_FILES,
+            'bundle_max_bytes': BUNDLE_MAX_BYTES,
+            'instant_upload_min_size': INSTANT_UPLOAD_MIN_SIZE,
+            'listing_page_size': LISTING_PAGE_SIZE,
             'resume_timeout': RESUME_TIMEOUT
         },
         'stats': {
             'uptime': time.time(),
-            'temp_folder_size': get_directory_size(TEMP_FOLDER)
+            'temp_folder_size': dir_index.get(TEMP_FOLDER)['size'],
+            'admission': upload_admission.stats(),
+            'search_index': search_index.stats(),
+            'listing_cache': listing_cache.stats(),
+            'watcher': file_watcher.stats(),
+            'events': event_bus.stats()
         }
     })
 
+@app.route('/api/preview/<path:filename>')
+def preview_file(filename):
+    file_path = safe_join(UPLOAD_FOLDER, filename)
+    if file_path is not None and os.path.isfile(file_path):
+        return send_file(file_path)
+    return jsonify({'error': 'Fichier non trouvé'}), 404
+
+@app.route('/api/delete/<path:filename>', methods=['DELETE'])
+def delete_file(filename):
+    try:
+        file_path = listing_path(filename)
+        # Ni le partage lui-même ni le dossier des uploads en cours
+        if os.path.abspath(file_path) in (os.path.abspath(UPLOAD_FOLDER), os.path.abspath(TEMP_FOLDER)):
+            raise ValueError('Chemin réservé')
+        if os.path.exists(file_path):
+            if os.path.isdir(file_path):
+                size = dir_index.get(file_path)['size']
+                shutil.rmtree(file_path)
+                dir_index.dir_removed(file_path)
+            else:
+                size = os.path.getsize(file_path)
+                os.remove(file_path)
+                dir_index.file_removed(file_path, size)
+            
+            hash_cache.forget(file_path)
+            
+            add_to_history('delete', filename, size, request.remote_addr)
+            return jsonify({'success': True, 'message': f"'{filename}' supprimé avec succès"})
+        else:
+            return jsonify({'success': False, 'error': 'Fichier ou dossier non trouvé'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ==================== MODE ASGI ====================
+# Les connexions sont gérées par la boucle asyncio: une connexion lente ou inactive ne coûte
+# qu'une coroutine. Seules les E/S fichiers passent par un pool de threads borné.
+
+asgi_io_executor = ThreadPoolExecutor(max_workers=ASGI_IO_WORKERS, thread_name_prefix='asgi-io')
+
+async def run_io(func, *args):
+    """Exécute une E/S bloquante dans le pool borné"""
+    return await asyncio.get_running_loop().run_in_executor(asgi_io_executor, func, *args)
+
+def asgi_header(scope, name):
+    name = name.encode('latin-1')
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+def asgi_client_ip(scope):
+    client = scope.get('client')
+    return client[0] if client else None
+
+async def asgi_send_json(send, payload, status=200, headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode()), *headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def asgi_admission_refused(send, error):
+    await asgi_send_json(send, {'success': False, 'error': str(error), 'retry_after': error.retry_after},
+                         429, [(b'retry-after', str(error.retry_after).encode())])
+
+async def run_write(client, func, *args):
+    """Écriture disque dans le pool d'E/S, une fois un créneau d'admission obtenu"""
+    await upload_admission.acquire(client)
+    try:
+        return await run_io(func, *args)
+    finally:
+        upload_admission.release(client)
+
+async def asgi_upload_chunk(scope, receive, send):
+    """Chunk multipart décodé au fil de la réception et écrit directement à sa destination"""
+    content_type, options = parse_options_header(asgi_header(scope, 'content-type') or '')
+    if content_type != 'multipart/form-data' or not options.get('boundary'):
+        return await asgi_send_json(send, {'success': False, 'error': 'Requête multipart attendue'}, 400)
+    
+    # Refus avant la lecture du corps: le client n'envoie pas ses données pour rien
+    client = asgi_client_ip(scope)
+    try:
+        upload_admission.check()
+    except AdmissionRefused as e:
+        return await asgi_admission_refused(send, e)
+    
+    decoder = MultipartDecoder(options['boundary'].encode('latin-1'))
+    form = {}
+    field_name = None
+    field_data = bytearray()
+    in_chunk = False
+    has_chunk = False
+    target = None
+    writer = None   # Champs reçus avant les données: écriture directe
+    spool = None    # Données reçues avant les champs: tampon (disque au-delà de 1 MB)
+    pending = bytearray()
+    more_body = True
+    
+    async def flush_pending():
+        if pending:
+            data = bytes(pending)
+            pending.clear()
+            await run_write(client, writer.write if writer else spool.write, data)
+    
+    try:
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                if not more_body:
+                    raise ValueError('Requête multipart incomplète')
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                more_body = message.get('more_body', False)
+                decoder.receive_data(message.get('body', b''))
+                if not more_body:
+                    decoder.receive_data(None)
+            elif isinstance(event, File):
+                field_name = None
+                in_chunk = event.name == 'chunk'
+                if in_chunk:
+                    has_chunk = True
+                    if 'uploadId' in form and 'chunkIndex' in form:
+                        target = await run_io(prepare_chunk, form)
+                        writer = await run_io(ChunkWriter, *target)
+                    else:
+                        spool = tempfile.SpooledTemporaryFile(max_size=ASSEMBLY_BUFFER_SIZE, dir=TEMP_FOLDER)
+            elif isinstance(event, Field):
+                in_chunk = False
+                field_name = event.name
+                field_data.clear()
+            elif isinstance(event, Data):
+                if in_chunk:
+                    pending += event.data
+                    if len(pending) >= ASSEMBLY_BUFFER_SIZE or not event.more_data:
+                        await flush_pending()
+                elif field_name is not None:
+                    field_data += event.data
+                    if len(field_data) > ASGI_MAX_FIELD_SIZE:
+                        raise ValueError(f'Champ {field_name} trop volumineux')
+                    if not event.more_data:
+                        form[field_name] = field_data.decode('utf-8')
+                        field_name = None
+            elif isinstance(event, Epilogue):
+                break
+        
+        if not has_chunk:
+            raise ValueError('Chunk ou identifiant d\'upload manquant')
+        if writer is None:
+            target = await run_io(prepare_chunk, form)
+            writer = await run_io(ChunkWriter, *target)
+            await run_io(spool.seek, 0)
+            await run_write(client, writer.copy_from, spool)
+        
+        await run_io(writer.close)
+        await asgi_send_json(send, await run_io(finish_chunk, writer, client, form.get('crc32')))
+        
+    except AdmissionRefused as e:
+        await asgi_admission_refused(send, e)
+    except UploadCompleted as e:
+        await asgi_send_json(send, e.response())
+    except UploadNotFound as e:
+        await asgi_send_json(send, {'success': False, 'error': str(e)}, 404)
+    except ChunkChecksumError as e:
+        await asgi_send_json(send, {'success': False, 'error': str(e), 'retry': True}, 400)
+    except Exception as e:
+        await asgi_send_json(send, {'success': False, 'error': str(e)})
+    finally:
+        if writer is not None:
+            await run_io(writer.close)
+        if spool is not None:
+            spool.close()
+
+async def asgi_put_chunk(scope, receive, send, upload_id):
+    """Chunk brut écrit par blocs de 1 MB à son offset au fil de la réception"""
+    client = asgi_client_ip(scope)
+    try:
+        upload_admission.check()
+        state = await run_io(upload_manager.chunk_session, upload_id)
+        chunk_index, expected = chunk_for_range(state, asgi_header(scope, 'content-range'))
+        
+        writer = await run_io(ChunkWriter, upload_id, chunk_index, state)
+        try:
+            pending = bytearray()
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                pending += message.get('body', b'')
+                more_body = message.get('more_body', False)
+                if pending and (len(pending) >= ASSEMBLY_BUFFER_SIZE or not more_body):
+                    data = bytes(pending)
+                    pending.clear()
+                    await run_write(client, writer.write, data)
+        finally:
+            chunk_bytes = await run_io(writer.close)
+        if chunk_bytes != expected:
+            raise ValueError(f'Chunk incomplet: {chunk_bytes}/{expected} octets')
+        
+        result = await run_io(finish_chunk, writer, client, asgi_header(scope, 'x-chunk-crc32'))
+        await asgi_send_json(send, result)
+        
+    except AdmissionRefused as e:
+        await asgi_admission_refused(send, e)
+    except UploadCompleted as e:
+        await asgi_send_json(send, e.response())
+    except UploadNotFound as e:
+        await asgi_send_json(send, {'success': False, 'error': str(e)}, 404)
+    except ChunkChecksumError as e:
+        await asgi_send_json(send, {'success': False, 'error': str(e), 'retry': True}, 400)
+    except ValueError as e:
+        await asgi_send_json(send, {'success': False, 'error': str(e)}, 400)
+    except Exception as e:
+        await asgi_send_json(send, {'success': False, 'error': str(e)}, 500)
+
+async def asgi_tus_patch(scope, receive, send, upload_id):
+    """PATCH tus écrit par blocs de 1 MB au fil de la réception"""
+    client = asgi_client_ip(scope)
+    headers = Headers([(key.decode('latin-1'), value.decode('latin-1')) for key, value in scope['headers']])
+    response_headers = [(b'tus-resumable', TUS_VERSION.encode())]
+    try:
+        offset, checksum = tus_begin_patch(headers)
+        writer = await run_io(TusWriter, upload_id, offset, checksum)
+        disconnected = False
+        try:
+            pending = bytearray()
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    disconnected = True
+                    break
+                pending += message.get('body', b'')
+                more_body = message.get('more_body', False)
+                if len(pending) >= ASSEMBLY_BUFFER_SIZE:
+                    data = bytes(pending)
+                    pending.clear()
+                    await run_write(client, writer.write, data)
+            if pending:
+                await run_write(client, writer.write, bytes(pending))
+        finally:
+            offset = await run_io(writer.close, client, not disconnected)
+        if not disconnected:
+            await send({'type': 'http.response.start', 'status': 204,
+                        'headers': response_headers + [(b'upload-offset', str(offset).encode())]})
+            await send({'type': 'http.response.body', 'body': b''})
+        
+    except Exception as e:
+        status, headers, message = tus_failure(e)
+        body = message.encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': response_headers + [(b'content-length', str(len(body)).encode())] +
+                               [(key.lower().encode(), value.encode()) for key, value in headers.items()]})
+        await send({'type': 'http.response.body', 'body': body})
+
+def asgi_disconnect_watcher(receive):
+    """Tâche terminée quand le client se déconnecte: send() ne signale rien une fois le client parti,
+    les boucles d'envoi la consultent pour arrêter de lire le disque. Le corps de la requête doit
+    déjà avoir été lu."""
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+    return asyncio.ensure_future(wait_disconnect())
+
+async def asgi_download(scope, receive, send, filename):
+    """Fichier envoyé par blocs lus dans le pool d'E/S, avec support des requêtes Range"""
+    file_path = safe_join(UPLOAD_FOLDER, filename)
+    if file_path is None or not os.path.isfile(file_path):
+        return await asgi_send_json(send, {'error': 'Fichier non trouvé'}, 404)
+    
+    fd = await run_io(os.open, file_path, os.O_RDONLY)
+    try:
+        file_size = os.fstat(fd).st_size
+        start, end, status = 0, file_size, 200
+        
+        file_range = parse_range_header(asgi_header(scope, 'range'))
+        if file_range is not None and file_size:
+            bounds = file_range.range_for_length(file_size)
+            if bounds is None:
+                await send({'type': 'http.response.start', 'status': 416,
+                            'headers': [(b'content-range', f'bytes */{file_size}'.encode())]})
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+            start, end = bounds
+            status = 206
+        
+        # Une reprise de téléchargement ne compte pas comme un nouveau téléchargement
+        if start == 0:
+            add_to_history('download', filename, file_size, asgi_client_ip(scope))
+        
+        mimetype = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        download_name = quote(os.path.basename(file_path))
+        headers = [
+            (b'content-type', mimetype.encode()),
+            (b'content-length', str(end - start).encode()),
+            (b'content-disposition', f"attachment; filename*=UTF-8''{download_name}".encode()),
+            (b'accept-ranges', b'bytes'),
+        ]
+        if status == 206:
+            headers.append((b'content-range', f'bytes {start}-{end - 1}/{file_size}'.encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        
+        disconnected = asgi_disconnect_watcher(receive)
+        try:
+            offset = start
+            while offset < end and not disconnected.done():
+                block = await run_io(os.pread, fd, min(ASGI_BLOCK_SIZE, end - offset), offset)
+                if not block:
+                    break
+                offset += len(block)
+                await send({'type': 'http.response.body', 'body': block, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+    finally:
+        os.close(fd)
+
+async def asgi_download_folder(scope, receive, send, foldername):
+    """ZIP en streaming: chaque bloc est produit dans le pool d'E/S puis envoyé"""
+    folder_path = safe_join(UPLOAD_FOLDER, foldername)
+    if folder_path is None or not os.path.isdir(folder_path):
+        return await asgi_send_json(send, {'error': 'Dossier non trouvé'}, 404)
+    
+    folder_size = dir_index.get(folder_path)['size']
+    add_to_history('download', foldername, folder_size, asgi_client_ip(scope))
+    
+    zip_name = f"{os.path.basename(foldername.rstrip('/'))}.zip"
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'application/zip'),
+                            (b'content-disposition', f"attachment; filename*=UTF-8''{quote(zip_name)}".encode())]})
+    
+    blocks = stream_zip(folder_path)
+    disconnected = asgi_disconnect_watcher(receive)
+    try:
+        # Client parti: la compression s'arrête au bloc en cours
+        while not disconnected.done():
+            block = await run_io(next, blocks, None)
+            if block is None:
+                break
+            if block:
+                await send({'type': 'http.response.body', 'body': block, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        await run_io(blocks.close)
+
+class AsgiBodyReader(io.RawIOBase):
+    """Corps d'une requête ASGI lu de façon bloquante depuis un thread du pool d'E/S"""
+    
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.buffer = memoryview(b'')
+        self.more_body = True
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, target):
+        while not self.buffer and self.more_body:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message['type'] == 'http.disconnect':
+                raise ConnectionError('Client déconnecté')
+            self.buffer = memoryview(message.get('body', b''))
+            self.more_body = message.get('more_body', False)
+        count = min(len(target), len(self.buffer))
+        target[:count] = self.buffer[:count]
+        self.buffer = self.buffer[count:]
+        return count
+
+async def asgi_upload_bundle(scope, receive, send):
+    """Archive tar extraite pendant sa réception (l'extraction occupe un thread du pool)"""
+    args = {key: values[-1] for key, values in parse_qs(scope['query_string'].decode('latin-1')).items()}
+    client = asgi_client_ip(scope)
+    try:
+        upload_admission.check(new_session=True)
+        reader = AsgiBodyReader(receive, asyncio.get_running_loop())
+        files_saved = await run_io(extract_bundle, reader, args.get('path', ''), client)
+        await asgi_send_json(send, {
+            'success': True,
+            'files_saved': files_saved,
+            'message': f'{files_saved} fichier(s) uploadé(s) avec succès'
+        })
+    except AdmissionRefused as e:
+        await asgi_admission_refused(send, e)
+    except Exception as e:
+        await asgi_send_json(send, {'success': False, 'error': str(e)})
+
+async def asgi_files(scope, receive, send):
+    args = {key: values[-1] for key, values in parse_qs(scope['query_string'].decode('latin-1')).items()}
+    # Générations lues avant le contenu: un changement pendant la liste donnera une nouvelle ETag
+    try:
+        etag = files_etag(args)
+    except ValueError as e:
+        await asgi_send_json(send, {'success': False, 'error': str(e)}, 400)
+        return
+    headers = [(b'etag', f'W/"{etag}"'.encode()), (b'cache-control', b'no-cache')]
+    if not_modified(etag, asgi_header(scope, 'if-none-match')):
+        await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    try:
+        payload = await run_io(files_payload, args)
+    except ValueError as e:
+        await asgi_send_json(send, {'success': False, 'error': str(e)}, 400)
+        return
+    await asgi_send_json(send, payload, headers=headers)
+
+async def asgi_events(scope, receive, send):
+    """Flux SSE natif: les abonnés attendent sur la boucle, sans thread du pool d'E/S"""
+    last_id = event_bus.resume_id(asgi_header(scope, 'last-event-id'))
+    disconnected = asgi_disconnect_watcher(receive)
+    try:
+        with event_bus.subscription():
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+                                    (b'x-accel-buffering', b'no')]})
+            initial = 'retry: 3000\n\n' + event_frame('stats', await run_io(stats_payload))
+            await send({'type': 'http.response.body', 'body': initial.encode(), 'more_body': True})
+            while not disconnected.done():
+                frames, last_id = event_bus.since(last_id)
+                if frames:
+                    await send({'type': 'http.response.body', 'body': ''.join(frames).encode(), 'more_body': True})
+                    continue
+                waiter = asyncio.ensure_future(event_bus.wait_async(last_id))
+                done, _ = await asyncio.wait({waiter, disconnected}, timeout=EVENT_KEEPALIVE,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if not done:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+    except OSError:
+        pass
+    finally:
+        disconnected.cancel()
+
+async def asgi_wsgi_bridge(scope, receive, send):
+    """Autres routes: l'application Flask exécutée dans le pool d'E/S"""
+    loop = asyncio.get_running_loop()
+    body = tempfile.SpooledTemporaryFile(max_size=ASSEMBLY_BUFFER_SIZE, dir=TEMP_FOLDER)
+    try:
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            if message.get('body'):
+                await run_io(body.write, message['body'])
+            more_body = message.get('more_body', False)
+        await run_io(body.seek, 0)
+        
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': asgi_client_ip(scope) or '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for key, value in scope['headers']:
+            key = key.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = f'HTTP_{key}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        
+        # File bornée: le thread WSGI attend si le client lit lentement
+        messages = asyncio.Queue(maxsize=4)
+        cancelled = threading.Event()
+        
+        def put(message):
+            asyncio.run_coroutine_threadsafe(messages.put(message), loop).result()
+        
+        def push(message):
+            # Client parti: l'itération s'arrête et l'itérateur WSGI est fermé
+            if cancelled.is_set():
+                raise ConnectionError('Client déconnecté')
+            put(message)
+        
+        def run_wsgi():
+            response = {}
+            
+            def start_response(status, headers, exc_info=None):
+                response['status'] = int(status.split(' ', 1)[0])
+                response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+                return lambda data: push({'type': 'http.response.body', 'body': data, 'more_body': True})
+            
+            try:
+                result = app(environ, start_response)
+                try:
+                    push({'type': 'http.response.start', 'status': response['status'],
+                          'headers': response['headers']})
+                    for data in result:
+                        if data:
+                            push({'type': 'http.response.body', 'body': data, 'more_body': True})
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+                push({'type': 'http.response.body', 'body': b''})
+            except ConnectionError:
+                if not cancelled.is_set():
+                    raise
+            finally:
+                put(None)
+        
+        worker = loop.run_in_executor(asgi_io_executor, run_wsgi)
+        disconnected = asgi_disconnect_watcher(receive)
+        try:
+            finished = False
+            while not disconnected.done():
+                getter = asyncio.ensure_future(messages.get())
+                await asyncio.wait({getter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    break
+                message = getter.result()
+                if message is None:
+                    finished = True
+                    break
+                if not disconnected.done():
+                    await send(message)
+            if not finished:
+                cancelled.set()
+                # Vider la file pour débloquer le thread WSGI jusqu'à sa fin
+                while await messages.get() is not None:
+                    pass
+            await worker
+        finally:
+            disconnected.cancel()
+    finally:
+        body.close()
+
+async def asgi_app(scope, receive, send):
+    """Point d'entrée ASGI (uvicorn): routes de transfert natives, le reste via Flask"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await run_io(write_behind.flush)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    if scope['type'] != 'http':
+        return
+    
+    path = scope['path']
+    method = scope['method']
+    if path == '/api/upload-chunk' and method == 'POST':
+        await asgi_upload_chunk(scope, receive, send)
+    elif path.startswith('/api/download/') and method == 'GET':
+        await asgi_download(scope, receive, send, path[len('/api/download/'):])
+    elif path.startswith('/api/download-folder/') and method == 'GET':
+        await asgi_download_folder(scope, receive, send, path[len('/api/download-folder/'):])
+    elif path.startswith('/api/upload-session/') and method == 'PUT':
+        await asgi_put_chunk(scope, receive, send, path[len('/api/upload-session/'):])
+    elif path.startswith('/files/') and method == 'PATCH':
+        await asgi_tus_patch(scope, receive, send, path[len('/files/'):])
+    elif path == '/api/upload-bundle' and method == 'POST':
+        await asgi_upload_bundle(scope, receive, send)
+    elif path == '/api/files' and method == 'GET':
+        await asgi_files(scope, receive, send)
+    elif path == '/api/events' and method == 'GET':
+        await asgi_events(scope, receive, send)
+    else:
+        await asgi_wsgi_bridge(scope, receive, send)
+
 def cleanup_old_uploads():
     """Fonction de nettoyage automatique des anciens uploads"""
     while True:
         try:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            
             # Supprimer les uploads anciens (> 24h)
             cutoff_time = datetime.now() - timedelta(hours=24)
-            cursor.execute('DELETE FROM uploads WHERE status IN ("completed", "error") AND updated_at < ?', 
-                         (cutoff_time,))
+            db.write('DELETE FROM uploads WHERE status IN ("completed", "error", "cancelled", "expired") AND updated_at < ?', 
+                     (cutoff_time,))
+            
+            # Sessions abandonnées depuis plus de RESUME_TIMEOUT
+            resume_cutoff = datetime.now() - timedelta(seconds=RESUME_TIMEOUT)
+            expired = [row[0] for row in db.query("SELECT id FROM uploads WHERE status = 'active' AND updated_at < ?",
+                                                  (resume_cutoff,))]
             
-            conn.commit()
-            conn.close()
+            for upload_id in expired:
+                upload_manager.abort_upload(upload_id, 'expired')
             
             # Nettoyer les fichiers temporaires
-            requests.post('http://localhost:5000/api/cleanup-temp')
+            cleanup_temp()
+            
+            # Recherche de doublons périodique, en arrière-plan et à débit limité
+            if duplicate_finder.due():
+                duplicate_finder.start()
             
         except:
             pass
@@ -1832,10 +6170,20 @@ if __name__ == '__main__':
     print(f"   3. Profitez de toutes les nouvelles fonctionnalités!")
     print(f"{'='*60}\n")
     
+    # Surveillance des fichiers déposés hors du serveur (Samba, rsync...)
+    if file_watcher.start():
+        print(f"👀 Surveillance inotify de {os.path.abspath(UPLOAD_FOLDER)}")
+    
     # Démarrer le thread de nettoyage
     cleanup_thread = threading.Thread(target=cleanup_old_uploads, daemon=True)
     cleanup_thread.start()
     
+    # Mode ASGI (uvicorn): connexions asynchrones, E/S fichiers dans un pool borné
+    if '--asgi' in sys.argv:
+        import uvicorn
+        uvicorn.run(asgi_app, host='0.0.0.0', port=5000)
+        sys.exit(0)
+    
     # Démarrer le serveur avec optimisations maximales
     from werkzeug.serving import WSGIRequestHandler
     WSGIRequestHandler.protocol_version = "HTTP/1.1"
@@ -1844,59 +6192,4 @@ if __name__ == '__main__':
     werkzeug.serving.WSGIRequestHandler.timeout = 600  # 10 minutes timeout
     
     app.run(host='0.0.0.0', port=5000, debug=False, threaded=True, 
-            request_handler=WSGIRequestHandler) 'error': 'Déjà dans les favoris'})
-    else:
-        cursor.execute('SELECT * FROM favorites ORDER BY created_at DESC')
-        favorites = []
-        for row in cursor.fetchall():
-            favorites.append({
-                'id': row[0],
-                'path': row[1],
-                'name': row[2],
-                'created_at': row[3]
-            })
-        conn.close()
-        return jsonify({'favorites': favorites})
-
-@app.route('/api/preview/<path:filename>')
-def preview_file(filename):
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
-    if os.path.exists(file_path):
-        return send_file(file_path)
-    return jsonify({'error': 'Fichier non trouvé'}), 404
-
-import os
-import shutil
-from flask import Flask, request, jsonify
-
-UPLOAD_FOLDER = 'uploads'  # à adapter selon ton projet
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-app = Flask(__name__)
-
-def add_to_history(action, filename, size, ip):
-    # Fonction de log simplifiée
-    print(f"[{action}] {filename} ({size} bytes) from {ip}")
-
-@app.route('/api/delete/<path:filename>', methods=['DELETE'])
-def delete_file(filename):
-    try:
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        if os.path.exists(file_path):
-            if os.path.isdir(file_path):
-                shutil.rmtree(file_path)
-                size = sum(os.path.getsize(os.path.join(dp, f)) for dp, dn, filenames in os.walk(file_path) for f in filenames)
-            else:
-                size = os.path.getsize(file_path)
-                os.remove(file_path)
-            
-            add_to_history('delete', filename, size, request.remote_addr)
-            return jsonify({'success': True, 'message': f"'{filename}' supprimé avec succès"})
-        else:
-            return jsonify({'success': False, 'error': 'Fichier ou dossier non trouvé'}), 404
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000, debug=True)
-
+            request_handler=WSGIRequestHandler)
@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Le serveur crée son dossier de partage et sa base dans le répertoire courant dès l'import:
+# les tests tournent dans un répertoire jetable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='file_server_tests_')
+os.chdir(WORKDIR)
+sys.path.insert(0, ROOT)
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def srv():
+    return server
+
+
+@pytest.fixture
+def client():
+    return server.app.test_client()
+
+
+@pytest.fixture
+def share(tmp_path):
+    """Dossier unique dans le partage pour un test: (chemin relatif, chemin sur disque)"""
+    rel = f'test_{os.path.basename(tmp_path)}'
+    full = os.path.join(server.UPLOAD_FOLDER, rel)
+    os.makedirs(full)
+    server.dir_index.dir_created(full)
+    return rel, full
+
@@ -0,0 +1,18 @@
+import os
+import time
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def wait_for(predicate, timeout=5.0):
+    """Attend qu'une condition produite par un thread de fond devienne vraie"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
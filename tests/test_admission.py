@@ -0,0 +1,129 @@
+import io
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def admission(srv, monkeypatch):
+    admission = srv.UploadAdmission(2, 1)
+    monkeypatch.setattr(srv, 'upload_admission', admission)
+    return admission
+
+
+@pytest.fixture
+def form_parsed_in_slot(srv, admission, monkeypatch):
+    """Note, pour chaque analyse de formulaire, si un créneau était tenu à ce moment"""
+    seen = []
+    original = srv.app.request_class._load_form_data
+
+    def load_form_data(self):
+        seen.append(admission.in_use > 0)
+        return original(self)
+
+    monkeypatch.setattr(srv.app.request_class, '_load_form_data', load_form_data)
+    return seen
+
+
+def test_multipart_upload_is_parsed_inside_a_slot(client, share, admission, form_parsed_in_slot):
+    rel, full = share
+    response = client.post('/api/upload', data={'files': (io.BytesIO(b'x' * 10), 'a.bin'), 'path': rel})
+    assert response.get_json()['success'] is True
+    assert form_parsed_in_slot == [True]
+    assert admission.in_use == 0
+
+
+@pytest.fixture
+def writes_in_slot(srv, admission, monkeypatch):
+    """Note, pour chaque bloc écrit d'un chunk, si un créneau était tenu à ce moment"""
+    seen = []
+    original = srv.ChunkWriter.write
+
+    def write(self, data):
+        seen.append(admission.in_use > 0)
+        return original(self, data)
+
+    monkeypatch.setattr(srv.ChunkWriter, 'write', write)
+    return seen
+
+
+def test_chunk_upload_takes_a_slot_only_to_write(srv, client, share, admission, form_parsed_in_slot,
+                                                 writes_in_slot, monkeypatch):
+    rel, full = share
+    monkeypatch.setattr(srv, 'ASSEMBLY_BUFFER_SIZE', 4)
+    session = client.post('/api/upload-session', json={'fileName': 'c.bin', 'fileSize': 8, 'path': rel,
+                                                       'chunkSize': 8}).get_json()
+    response = client.post('/api/upload-chunk', data={'uploadId': session['upload_id'], 'chunkIndex': '0',
+                                                      'chunk': (io.BytesIO(b'abcdefgh'), 'chunk')})
+    assert response.get_json()['success'] is True
+    # Corps reçu et analysé hors créneau, puis un créneau par bloc écrit
+    assert form_parsed_in_slot == [False]
+    assert writes_in_slot == [True, True]
+    assert admission.in_use == 0
+
+
+def test_raw_chunk_takes_a_slot_only_to_write(srv, client, share, admission, writes_in_slot, monkeypatch):
+    rel, full = share
+    monkeypatch.setattr(srv, 'ASSEMBLY_BUFFER_SIZE', 4)
+    session = client.post('/api/upload-session', json={'fileName': 'r.bin', 'fileSize': 8, 'path': rel,
+                                                       'chunkSize': 8}).get_json()
+    reads_in_slot = []
+    copy_from = srv.ChunkWriter.copy_from
+
+    class Recorder:
+        def __init__(self, stream):
+            self.stream = stream
+
+        def read(self, size=-1):
+            reads_in_slot.append(admission.in_use > 0)
+            return self.stream.read(size)
+
+    monkeypatch.setattr(srv.ChunkWriter, 'copy_from',
+                        lambda self, stream, client=None: copy_from(self, Recorder(stream), client))
+    response = client.put(f'/api/upload-session/{session["upload_id"]}', data=b'abcdefgh',
+                          headers={'Content-Type': 'application/octet-stream', 'Content-Range': 'bytes 0-7/8'})
+    assert response.get_json()['success'] is True
+    assert reads_in_slot and not any(reads_in_slot)
+    assert writes_in_slot == [True, True]
+    assert admission.in_use == 0
+
+
+def test_slow_disk_refuses_new_uploads(srv, admission):
+    admission.record_write(srv.MAX_WRITE_LATENCY * 100)
+    with pytest.raises(srv.AdmissionRefused):
+        admission.check()
+    assert admission.stats()['rejected'] == 1
+
+
+def test_concurrent_latency_updates_stay_consistent(admission):
+    def writer():
+        for _ in range(2000):
+            admission.record_write(0.001)
+
+    threads = [threading.Thread(target=writer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert admission.write_latency == pytest.approx(0.001)
+
+
+def test_one_slot_per_client(admission):
+    order = []
+
+    def second():
+        with admission.slot('a'):
+            order.append('second')
+
+    with admission.slot('a'):
+        thread = threading.Thread(target=second)
+        thread.start()
+        thread.join(0.1)
+        assert order == [] and admission.stats()['queued'] == 1
+        # Un autre client passe devant la demande en attente
+        with admission.slot('b'):
+            assert admission.stats()['in_use'] == 2
+        order.append('first')
+    thread.join(2)
+    assert order == ['first', 'second']
+    assert admission.stats()['in_use'] == 0
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import threading
+
+from helpers import write_file
+
+
+def asgi_call(app, path, method='GET', headers=(), query=b'', disconnect_after=None, body=b''):
+    """Appelle l'application ASGI; disconnect_after: nombre de messages de corps envoyés avant la déconnexion"""
+    sent = []
+
+    async def run():
+        gone = asyncio.Event()
+        delivered = False
+
+        async def receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await gone.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            bodies = sum(1 for m in sent if m['type'] == 'http.response.body')
+            if disconnect_after is not None and bodies >= disconnect_after:
+                gone.set()
+                await asyncio.sleep(0.05)
+
+        scope = {'type': 'http', 'path': path, 'raw_path': path.encode(), 'method': method, 'query_string': query,
+                 'headers': list(headers), 'http_version': '1.1', 'scheme': 'http',
+                 'server': ('test', 5000), 'client': ('127.0.0.1', 1), 'root_path': ''}
+        await asyncio.wait_for(app(scope, receive, send), 10)
+
+    asyncio.run(run())
+    return sent
+
+
+def body_of(sent):
+    return b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+
+
+def test_download_complete(srv, share):
+    rel, full = share
+    data = os.urandom(3 * srv.ASGI_BLOCK_SIZE + 7)
+    write_file(os.path.join(full, 'f.bin'), data)
+    sent = asgi_call(srv.asgi_app, f'/api/download/{rel}/f.bin')
+    assert sent[0]['status'] == 200
+    assert body_of(sent) == data
+
+
+def test_download_stops_on_disconnect(srv, share):
+    rel, full = share
+    blocks = 50
+    write_file(os.path.join(full, 'big.bin'), b'x' * (blocks * srv.ASGI_BLOCK_SIZE))
+    sent = asgi_call(srv.asgi_app, f'/api/download/{rel}/big.bin', disconnect_after=2)
+    assert len(sent) < blocks
+
+
+def test_download_folder_stops_on_disconnect(srv, share):
+    rel, full = share
+    for i in range(40):
+        write_file(os.path.join(full, 'zip', f'{i}.bin'), os.urandom(256 * 1024))
+    sent = asgi_call(srv.asgi_app, f'/api/download-folder/{rel}/zip', disconnect_after=2)
+    assert len(body_of(sent)) < 40 * 256 * 1024
+
+
+def test_wsgi_bridge_closes_iterator_on_disconnect(srv, monkeypatch):
+    closed = threading.Event()
+    produced = []
+
+    class Endless:
+        def __iter__(self):
+            while True:
+                produced.append(1)
+                yield b'y' * 1024
+
+        def close(self):
+            closed.set()
+
+    def endless_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return Endless()
+
+    monkeypatch.setattr(srv, 'app', endless_app)
+    asgi_call(srv.asgi_app, '/anything', disconnect_after=3)
+    assert closed.wait(5)
+    assert len(produced) < 100
+
+
+def test_wsgi_bridge_normal_response(srv):
+    sent = asgi_call(srv.asgi_app, '/api/stats')
+    assert sent[0]['status'] == 200
+    assert b'total_files' in body_of(sent)
@@ -0,0 +1,65 @@
+import hashlib
+import io
+import os
+import tarfile
+
+
+def make_tar(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as bundle:
+        for name, data in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            bundle.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def post_bundle(client, rel, body):
+    return client.post('/api/upload-bundle', query_string={'path': rel}, data=body,
+                       content_type='application/x-tar')
+
+
+def history_names(srv):
+    srv.write_behind.flush()
+    return {row[0] for row in srv.db.query('SELECT filename FROM history')}
+
+
+def test_bundle_extracts_files(client, share, srv):
+    rel, full = share
+    response = post_bundle(client, rel, make_tar([('a.txt', b'a' * 10), ('sub/b.txt', b'b' * 20)]))
+    assert response.get_json()['files_saved'] == 2
+    with open(os.path.join(full, 'sub', 'b.txt'), 'rb') as f:
+        assert f.read() == b'b' * 20
+    assert srv.dir_index.get(full)['size'] == 30
+    assert {'a.txt', 'sub/b.txt'} <= history_names(srv)
+
+
+def test_bundle_never_writes_into_temp_folder(client, srv):
+    response = post_bundle(client, '', make_tar([('.temp/evil.txt', b'x'), ('.temp2/ok.txt', b'y')]))
+    assert response.get_json()['files_saved'] == 1
+    assert not os.path.exists(os.path.join(srv.TEMP_FOLDER, 'evil.txt'))
+    # Un dossier dont le nom commence comme la zone temporaire reste un dossier ordinaire
+    assert os.path.exists(os.path.join(srv.UPLOAD_FOLDER, '.temp2', 'ok.txt'))
+
+
+def test_truncated_bundle_keeps_finished_files(client, share, srv):
+    rel, full = share
+    first, second = os.urandom(3000), os.urandom(3000)
+    with open(os.path.join(full, 'c.bin'), 'wb') as f:
+        f.write(b'previous')
+    srv.dir_index.file_added(os.path.join(full, 'c.bin'))
+    body = make_tar([('a.bin', first), ('b.bin', second), ('c.bin', os.urandom(5000))])
+    # Coupé au milieu des données du troisième fichier
+    cut = body.index(b'c.bin') + 512 + 1000
+    response = post_bundle(client, rel, body[:cut])
+    assert response.get_json()['success'] is False
+
+    assert sorted(os.listdir(full)) == ['a.bin', 'b.bin', 'c.bin']
+    with open(os.path.join(full, 'c.bin'), 'rb') as f:
+        assert f.read() == b'previous'
+    hashes = srv.hash_cache.lookup_many([(os.path.join(full, name), os.stat(os.path.join(full, name)))
+                                         for name in ['a.bin', 'b.bin']], schedule=False)
+    assert hashes == {os.path.join(full, 'a.bin'): hashlib.md5(first).hexdigest(),
+                      os.path.join(full, 'b.bin'): hashlib.md5(second).hexdigest()}
+    assert {'a.bin', 'b.bin'} <= history_names(srv)
+    assert srv.dir_index.get(full)['size'] == 6000 + len(b'previous')
@@ -0,0 +1,65 @@
+import sqlite3
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def database(srv, tmp_path):
+    database = srv.Database(str(tmp_path / 'test.db'))
+    database.write('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)')
+    return database
+
+
+def test_pending_writes_share_one_commit(database, monkeypatch):
+    batches = []
+    commit_batch = database._commit_batch
+    monkeypatch.setattr(database, '_commit_batch', lambda batch: (batches.append(len(batch)), commit_batch(batch)))
+
+    writes = [database.submit('INSERT INTO items (name) VALUES (?)', (name,)) for name in 'abc']
+    assert database.wait(writes[1]) == 1
+    # Le premier thread arrivé a commité tout le lot, y compris les écritures soumises avant et après la sienne
+    assert batches == [3]
+    assert all(write.done.is_set() for write in writes)
+    assert database.wait(writes[2]) == 1
+    assert batches == [3]
+    assert [row[0] for row in database.query('SELECT name FROM items ORDER BY id')] == ['a', 'b', 'c']
+
+
+def test_concurrent_writers_are_grouped(database):
+    barrier = threading.Barrier(8)
+
+    def writer(index):
+        barrier.wait()
+        database.write('INSERT INTO items (name) VALUES (?)', (f'n{index}',))
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert database.query_one('SELECT COUNT(*) FROM items')[0] == 8
+
+
+def test_failed_batch_is_replayed_write_by_write(database):
+    database.write('INSERT INTO items (name) VALUES (?)', ('taken',))
+    good = database.submit('INSERT INTO items (name) VALUES (?)', ('first',))
+    bad = database.submit('INSERT INTO items (name) VALUES (?)', ('taken',))
+    many = database.submit('INSERT INTO items (name) VALUES (?)', [('second',), ('third',)], many=True)
+
+    assert database.wait(good) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        database.wait(bad)
+    assert database.wait(many) == 2
+    names = {row[0] for row in database.query('SELECT name FROM items')}
+    assert names == {'taken', 'first', 'second', 'third'}
+
+
+def test_connections_are_reused(database):
+    with database.connection() as first:
+        pass
+    with database.connection() as second:
+        assert second is first
+        # Une connexion empruntée n'est pas prêtée à un autre emprunteur
+        with database.connection() as nested:
+            assert nested is not first
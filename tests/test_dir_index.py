@@ -0,0 +1,50 @@
+import os
+
+from helpers import write_file
+
+
+def aggregate(srv, *parts):
+    return srv.dir_index.get(os.path.join(srv.UPLOAD_FOLDER, *parts))
+
+
+def test_upload_counts_in_parents(client, share, srv):
+    rel, _ = share
+    import io
+    client.post('/api/upload', data={'files': (io.BytesIO(b'x' * 100), 'a.bin'), 'path': rel})
+    assert aggregate(srv, rel)['size'] == 100
+    assert aggregate(srv, rel)['own_files'] == 1
+
+
+def test_dir_created_merges_folder_populated_outside(client, share, srv):
+    rel, full = share
+    write_file(os.path.join(full, 'ext', 'deep', 'a.bin'), b'a' * 10)
+    write_file(os.path.join(full, 'ext', 'b.bin'), b'b' * 5)
+    # Un upload dans ce dossier le déclare au serveur pour la première fois
+    response = client.post('/api/upload-session', json={'fileName': 'n.bin', 'fileSize': 1,
+                                                       'path': f'{rel}/ext'})
+    assert response.status_code == 200
+    assert aggregate(srv, rel, 'ext')['size'] == 15
+    assert aggregate(srv, rel, 'ext', 'deep')['size'] == 10
+    assert aggregate(srv, rel)['size'] == 15
+
+
+def test_reconcile_keeps_updates_made_during_scan(share, srv, monkeypatch):
+    rel, full = share
+    srv.dir_index.get(full)
+    original = srv.DirectoryIndex._scan
+    calls = []
+
+    def scan_with_concurrent_upload(self, scan_rel, files=None):
+        found = original(self, scan_rel, files)
+        if not calls:
+            # Upload terminé pendant le parcours, après le passage sur son dossier
+            path = os.path.join(full, 'late.bin')
+            write_file(path, b'l' * 42)
+            self.file_added(path)
+        calls.append(scan_rel)
+        return found
+
+    monkeypatch.setattr(srv.DirectoryIndex, '_scan', scan_with_concurrent_upload)
+    srv.dir_index.reconcile()
+    assert len(calls) == 2
+    assert aggregate(srv, rel)['size'] == 42
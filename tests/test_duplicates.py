@@ -0,0 +1,65 @@
+import os
+
+from helpers import write_file
+
+
+def make_copies(full, names, data):
+    paths = [os.path.join(full, name) for name in names]
+    for index, path in enumerate(paths):
+        write_file(path, data)
+        os.utime(path, ns=(1_000_000_000 * (index + 1),) * 2)
+    return paths
+
+
+def find_group(finder, srv, paths):
+    keys = {srv.hash_cache.path_key(path) for path in paths}
+    for group in finder.report()['groups']:
+        if keys <= set(group['files']):
+            return group
+    return None
+
+
+def test_finds_and_reclaims_copies(share, srv):
+    rel, full = share
+    data = os.urandom(8192)
+    paths = make_copies(full, ['a.bin', 'b.bin', 'c.bin'], data)
+    finder = srv.DuplicateFinder()
+    finder._run()
+    group = find_group(finder, srv, paths)
+    assert group['copies'] == 3
+    assert group['reclaimable'] == 2 * len(data)
+
+    reclaimed, linked = finder.reclaim(group['hash'])
+    assert (reclaimed, linked) == (2 * len(data), 2)
+    for index, path in enumerate(paths):
+        with open(path, 'rb') as f:
+            assert f.read() == data
+        stats = os.stat(path)
+        if stats.st_nlink == 1:
+            # Clone indépendant: les dates du fichier remplacé sont conservées
+            assert stats.st_mtime_ns == 1_000_000_000 * (index + 1)
+    assert find_group(finder, srv, paths) is None
+
+
+def test_hard_links_count_once(share, srv):
+    rel, full = share
+    data = os.urandom(8192)
+    first, = make_copies(full, ['a.bin'], data)
+    os.link(first, os.path.join(full, 'b.bin'))
+    finder = srv.DuplicateFinder()
+    finder._run()
+    assert find_group(finder, srv, [first]) is None
+
+
+def test_reclaim_keeps_file_mode(share, srv):
+    rel, full = share
+    data = os.urandom(8192)
+    keep, other = make_copies(full, ['a.bin', 'b.bin'], data)
+    os.chmod(other, 0o600)
+    os.link(keep, os.path.join(full, 'a-link.bin'))  # a.bin, plus lié, est conservé
+    finder = srv.DuplicateFinder()
+    finder._run()
+    group = find_group(finder, srv, [keep, other])
+    finder.reclaim(group['hash'])
+    assert os.stat(other).st_mode & 0o777 == 0o600
+    assert os.stat(keep).st_mode & 0o777 != 0o600
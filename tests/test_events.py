@@ -0,0 +1,95 @@
+import asyncio
+import json
+import threading
+
+from helpers import wait_for
+
+
+def frames_data(frames):
+    return [json.loads(frame.split('data: ', 1)[1]) for frame in frames]
+
+
+def test_since_returns_events_after_id(srv):
+    bus = srv.EventBus(10, 0.01)
+    start = bus.resume_id(None)
+    bus.publish('dir', {'path': 'a'})
+    bus.publish('dir', {'path': 'b'})
+    frames, last_id = bus.since(start)
+    assert frames_data(frames) == [{'path': 'a'}, {'path': 'b'}]
+    assert frames[0].startswith(f'id: {start + 1}\nevent: dir\n')
+    assert bus.since(last_id) == ([], last_id)
+    # Reprise par Last-Event-ID au milieu de l'historique
+    assert frames_data(bus.since(start + 1)[0]) == [{'path': 'b'}]
+
+
+def test_lagging_subscriber_gets_reset(srv):
+    bus = srv.EventBus(3, 0.01)
+    for index in range(10):
+        bus.publish('dir', {'path': str(index)})
+    frames, last_id = bus.since(1)
+    assert frames[0].startswith(f'id: {last_id}\nevent: reset\n')
+    # Identifiant d'avant un redémarrage
+    assert 'event: reset' in bus.since(1000)[0][0]
+
+
+def test_post_coalesces_by_key(srv):
+    bus = srv.EventBus(10, 0.05)
+    start = bus.last_id
+    bus.post('upload', {'upload_id': 'u', 'received': 1}, key=('upload', 'u'))
+    bus.post('upload', {'upload_id': 'u', 'received': 2, 'total': 3}, key=('upload', 'u'))
+    bus.post('stats', lambda: None)
+    assert wait_for(lambda: bus.last_id > start)
+    assert frames_data(bus.since(start)[0]) == [{'upload_id': 'u', 'received': 2, 'total': 3}]
+
+
+def test_thread_and_async_subscribers_wake_up(srv):
+    bus = srv.EventBus(10, 0.01)
+    start = bus.last_id
+    woke = threading.Event()
+    threading.Thread(target=lambda: bus.wait(start, 5) and woke.set(), daemon=True).start()
+
+    async def subscriber():
+        await asyncio.wait_for(bus.wait_async(start), 5)
+        return bus.since(start)[0]
+
+    async def main():
+        task = asyncio.ensure_future(subscriber())
+        await asyncio.sleep(0.05)
+        bus.publish('dir', {'path': 'x'})
+        return await task
+
+    assert frames_data(asyncio.run(main())) == [{'path': 'x'}]
+    assert woke.wait(5)
+    assert not bus.wait(bus.last_id, 0.01)
+
+
+def test_stream_starts_with_full_stats(client):
+    response = client.get('/api/events', buffered=False)
+    assert response.headers['Content-Type'].startswith('text/event-stream')
+    first = next(response.response)
+    first = first.decode() if isinstance(first, bytes) else first
+    assert first.startswith('retry: 3000\n\nevent: stats\n')
+    assert 'total_files' in first
+    response.close()
+
+
+def test_wsgi_streams_are_capped(srv, client, monkeypatch):
+    bus = srv.EventBus(10, 0.01)
+    monkeypatch.setattr(srv, 'event_bus', bus)
+    monkeypatch.setattr(srv, 'WSGI_EVENT_SUBSCRIBERS', 2)
+    streams = [client.get('/api/events', buffered=False) for _ in range(2)]
+    assert bus.stats()['subscribers'] == 2
+
+    refused = client.get('/api/events')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After']
+
+    # Un flux fermé, même sans avoir été lu, libère sa place
+    streams[1].close()
+    assert bus.stats()['subscribers'] == 1
+    again = client.get('/api/events', buffered=False)
+    assert again.status_code == 200
+    # Contextes de requête du client de test: fermeture dans l'ordre inverse d'ouverture
+    for response in (again, streams[0]):
+        response.close()
+    assert bus.stats()['subscribers'] == 0
@@ -0,0 +1,35 @@
+def test_file_change_bumps_folder_and_ancestors(srv):
+    generations = srv.DirectoryGenerations()
+    generations.on_change('file', 'a/b/c.txt', None)
+    touched = {rel: generations.generation(rel) for rel in ('a/b', 'a', '', 'a/other')}
+    assert touched['a/b'] and touched['a'] and touched['']
+    assert touched['a/other'] == 0
+    before = generations.etag('a/b')
+    generations.touch('a/b')
+    assert generations.etag('a/b') != before
+    assert generations.generation('a') == touched['a']
+
+
+def test_removed_folder_never_reuses_a_generation(srv):
+    generations = srv.DirectoryGenerations()
+    generations.on_change('dir', 'x/y', None)
+    generations.on_change('file', 'x/y/z/f', None)
+    old = generations.generation('x/y/z')
+    generations.on_change('removed', 'x/y', None)
+    assert generations.generation('x/y/z') > old
+
+
+def test_scan_bumps_only_changed_folders(srv):
+    generations = srv.DirectoryGenerations()
+    files = [('a', 0, 1.0, True), ('a/f', 10, 1.0, False), ('b', 0, 1.0, True), ('b/g', 5, 1.0, False)]
+    generations.on_change('scan', '', files)
+    before = {rel: generations.generation(rel) for rel in ('', 'a', 'b')}
+    generations.on_change('scan', '', files)
+    assert {rel: generations.generation(rel) for rel in ('', 'a', 'b')} == before
+
+    # Fichier modifié hors du serveur dans b
+    changed = files[:3] + [('b/g', 6, 2.0, False)]
+    generations.on_change('scan', '', changed)
+    assert generations.generation('a') == before['a']
+    assert generations.generation('b') > before['b']
+    assert generations.generation('') > before['']
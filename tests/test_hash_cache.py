@@ -0,0 +1,81 @@
+import hashlib
+import os
+
+from helpers import wait_for, write_file
+
+
+def cached(srv, path):
+    return srv.hash_cache.lookup_many([(path, os.stat(path))], schedule=False).get(path)
+
+
+def test_cached_hash_invalidated_by_size_mtime_or_inode(srv, share):
+    rel, full = share
+    path = os.path.join(full, 'stable.bin')
+    write_file(path, b'a' * 100)
+    srv.hash_cache.store(path, 'h1')
+    assert cached(srv, path) == 'h1'
+
+    # Même taille, mtime différente
+    stats = os.stat(path)
+    os.utime(path, ns=(stats.st_atime_ns, stats.st_mtime_ns + 1000))
+    assert cached(srv, path) is None
+
+    # Taille différente
+    srv.hash_cache.store(path, 'h2')
+    with open(path, 'ab') as f:
+        f.write(b'b')
+    assert cached(srv, path) is None
+
+    # Même taille et même mtime, mais fichier remplacé (autre inode)
+    srv.hash_cache.store(path, 'h3')
+    stats = os.stat(path)
+    replacement = os.path.join(full, 'replacement.bin')
+    write_file(replacement, b'c' * stats.st_size)
+    os.utime(replacement, ns=(stats.st_atime_ns, stats.st_mtime_ns))
+    os.replace(replacement, path)
+    assert cached(srv, path) is None
+
+
+def test_listing_reports_pending_then_ready(srv, client, share):
+    rel, full = share
+    data = os.urandom(5000)
+    write_file(os.path.join(full, 'fresh.bin'), data)
+
+    def entry():
+        files = client.get('/api/files', query_string={'path': rel, 'fields': 'hash'}).json['files']
+        return next(item for item in files if item['name'] == 'fresh.bin')
+
+    first = entry()
+    assert first['hash_status'] in ('pending', 'ready')
+    assert wait_for(lambda: entry()['hash_status'] == 'ready')
+    assert entry()['hash'] == hashlib.md5(data).hexdigest()
+
+
+def test_rewritten_file_does_not_get_its_old_hash(srv, share):
+    rel, full = share
+    path = os.path.join(full, 'rewritten.bin')
+    write_file(path, b'old content')
+    srv.hash_cache.store(path, hashlib.md5(b'old content').hexdigest())
+
+    write_file(path, b'new content, longer')
+    assert srv.hash_cache.lookup_many([(path, os.stat(path))]).get(path) is None
+    expected = hashlib.md5(b'new content, longer').hexdigest()
+    assert wait_for(lambda: cached(srv, path) == expected)
+
+
+def test_hash_computed_while_file_changes_is_not_stored(srv, share, monkeypatch):
+    rel, full = share
+    path = os.path.join(full, 'moving.bin')
+    write_file(path, b'first')
+    real_hash = srv.get_file_hash
+
+    def hash_then_modify(file_path):
+        file_hash = real_hash(file_path)
+        with open(file_path, 'ab') as f:
+            f.write(b' and more')
+        return file_hash
+
+    monkeypatch.setattr(srv, 'get_file_hash', hash_then_modify)
+    srv.hash_cache.schedule(path)
+    assert wait_for(lambda: path not in srv.hash_cache.pending)
+    assert srv.db.query_one('SELECT hash FROM file_hashes WHERE path = ?', (srv.hash_cache.path_key(path),)) is None
@@ -0,0 +1,23 @@
+import os
+import uuid
+from datetime import datetime
+
+from helpers import write_file
+
+
+def test_parts_session_from_before_direct_writes_is_expired(client, srv):
+    upload_id = uuid.uuid4().hex
+    srv.db.write('''
+        INSERT INTO uploads (id, filename, total_size, uploaded_size, total_chunks, uploaded_chunks, status,
+                             created_at, updated_at, path, relative_path, chunk_size, chunk_bitmap)
+        VALUES (?, 'old.bin', 10, 5, 2, 1, 'active', ?, ?, 'shared_files/old.bin', '', 0, ?)
+    ''', (upload_id, datetime.now(), datetime.now(), b'\x01'))
+    temp_dir = os.path.join(srv.TEMP_FOLDER, upload_id)
+    write_file(os.path.join(temp_dir, 'old.bin.part0'), b'12345')
+
+    response = client.get(f'/api/upload-session/{upload_id}')
+    assert response.get_json()['status'] == 'expired'
+    assert srv.upload_manager.get_session(upload_id) is None
+    assert not os.path.exists(temp_dir)
+    assert client.put(f'/api/upload-session/{upload_id}', data=b'12345',
+                      headers={'Content-Range': 'bytes 5-9/10'}).status_code == 404
@@ -0,0 +1,119 @@
+import base64
+import json
+import os
+
+from helpers import write_file
+from test_asgi import asgi_call, body_of
+
+
+def page(client, rel, **params):
+    response = client.get('/api/files', query_string={'path': rel, **params})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def test_cursor_paging_survives_inserts(client, share):
+    rel, full = share
+    for name in ['b', 'd', 'f', 'h', 'j']:
+        write_file(os.path.join(full, name + '.txt'), name.encode())
+    first = page(client, rel, limit=2)
+    assert [f['name'] for f in first['files']] == ['b.txt', 'd.txt']
+    assert first['total'] == 5
+
+    # Ajouts avant et après la position du curseur entre deux pages
+    write_file(os.path.join(full, 'a.txt'), b'a')
+    write_file(os.path.join(full, 'e.txt'), b'e')
+    second = page(client, rel, limit=2, cursor=first['next_cursor'])
+    assert [f['name'] for f in second['files']] == ['e.txt', 'f.txt']
+    third = page(client, rel, limit=2, cursor=second['next_cursor'])
+    assert [f['name'] for f in third['files']] == ['h.txt', 'j.txt']
+    assert third['next_cursor'] is None
+
+
+def test_cursor_paging_by_size_descending(client, share):
+    rel, full = share
+    for size in [1, 5, 3, 4, 2]:
+        write_file(os.path.join(full, f'{size}.bin'), b'x' * size)
+    names = []
+    cursor = None
+    while True:
+        params = {'limit': 2, 'sort_by': 'size', 'sort_order': 'desc'}
+        if cursor:
+            params['cursor'] = cursor
+        data = page(client, rel, **params)
+        names += [f['name'] for f in data['files']]
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    assert names == ['5.bin', '4.bin', '3.bin', '2.bin', '1.bin']
+
+
+def test_malformed_cursors_are_rejected(client, share):
+    rel, full = share
+    write_file(os.path.join(full, 'a.txt'), b'a')
+    for cursor, sort_by in [('not-base64!', 'name'),
+                            (raw_cursor(['name', 'asc', 'zz']), 'name'),
+                            (raw_cursor(['name', 'asc', 1, 2, 3]), 'name'),
+                            (raw_cursor(['name', 'asc', False, 'a']), 'name'),
+                            (raw_cursor(['size', 'asc', 'big', 'a.txt']), 'size'),
+                            (raw_cursor(['size', 'asc', True, 'a.txt']), 'size'),
+                            (raw_cursor(['modified', 'asc', None, 'a.txt']), 'modified'),
+                            (raw_cursor({'name': 'asc'}), 'name'),
+                            (raw_cursor(['size', 'asc', 1, 'a.txt']), 'name')]:
+        response = client.get('/api/files', query_string={'path': rel, 'sort_by': sort_by, 'cursor': cursor})
+        assert response.status_code == 400, cursor
+        assert response.get_json()['success'] is False
+
+
+def test_listing_etag_round_trip(client, share, srv):
+    rel, full = share
+    write_file(os.path.join(full, 'a.txt'), b'a')
+    srv.dir_index.file_added(os.path.join(full, 'a.txt'))
+    first = client.get('/api/files', query_string={'path': rel})
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    assert 'storage' not in first.get_json()
+
+    again = client.get('/api/files', query_string={'path': rel}, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+
+    # Un fichier ajouté par le serveur renouvelle la génération du dossier et de ses ancêtres
+    write_file(os.path.join(full, 'b.txt'), b'b')
+    srv.dir_index.file_added(os.path.join(full, 'b.txt'))
+    changed = client.get('/api/files', query_string={'path': rel}, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert [f['name'] for f in changed.get_json()['files']] == ['a.txt', 'b.txt']
+    root = client.get('/api/files', headers={'If-None-Match': etag})
+    assert root.status_code == 200
+
+
+def test_asgi_listing_etag_round_trip(share, srv):
+    rel, full = share
+    write_file(os.path.join(full, 'a.txt'), b'a')
+    srv.dir_index.file_added(os.path.join(full, 'a.txt'))
+    query = f'path={rel}'.encode()
+    sent = asgi_call(srv.asgi_app, '/api/files', query=query)
+    assert sent[0]['status'] == 200
+    assert 'storage' not in json.loads(body_of(sent))
+    etag = dict(sent[0]['headers'])[b'etag']
+    sent = asgi_call(srv.asgi_app, '/api/files', query=query, headers=[(b'if-none-match', etag)])
+    assert sent[0]['status'] == 304
+    assert body_of(sent) == b''
+
+
+def test_listing_etag_sees_changes_made_outside_the_server(client, share):
+    rel, full = share
+    first = client.get('/api/files', query_string={'path': rel})
+    assert first.get_json()['total'] == 0
+    # Ajout direct sur le disque, sans événement de l'index (surveillance inotify absente)
+    write_file(os.path.join(full, 'ext.txt'), b'e')
+    os.utime(full, ns=(1, 1))
+    again = client.get('/api/files', query_string={'path': rel}, headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 200
+    assert again.get_json()['total'] == 1
+    assert again.headers['ETag'] != first.headers['ETag']
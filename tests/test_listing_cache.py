@@ -0,0 +1,33 @@
+import os
+
+from helpers import write_file
+
+
+def test_listing_cache_hits_until_the_folder_changes(srv, share):
+    rel, full = share
+    cache = srv.ListingCache(100, 1 << 20)
+    write_file(os.path.join(full, 'a.txt'), b'a')
+    args = (rel, 'name', 'asc', None, None, ())
+    first = cache.listing(*args)
+    assert cache.listing(*args) is first
+    assert cache.stats()['hits'] == 1
+
+    # Écriture par le serveur: nouvelle génération
+    write_file(os.path.join(full, 'b.txt'), b'b')
+    srv.dir_index.file_added(os.path.join(full, 'b.txt'))
+    assert [entry['name'] for entry in cache.listing(*args)[0]] == ['a.txt', 'b.txt']
+    # Suppression hors du serveur: le mtime du dossier change
+    os.remove(os.path.join(full, 'a.txt'))
+    os.utime(full, ns=(1, 1))
+    assert [entry['name'] for entry in cache.listing(*args)[0]] == ['b.txt']
+    assert cache.stats()['misses'] == 3
+
+
+def test_listing_cache_is_bounded(srv, share):
+    rel, full = share
+    cache = srv.ListingCache(2, 1 << 20)
+    write_file(os.path.join(full, 'a.txt'), b'a')
+    for sort_by in ('name', 'size', 'modified'):
+        cache.listing(rel, sort_by, 'asc', None, None, ())
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1
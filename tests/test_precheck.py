@@ -0,0 +1,89 @@
+import hashlib
+import os
+import shutil
+
+import pytest
+
+from helpers import write_file
+
+
+def shared_source(srv, full, name='source.bin', size=8192):
+    data = os.urandom(size)
+    path = os.path.join(full, name)
+    write_file(path, data)
+    srv.hash_cache.store(path, hashlib.md5(data).hexdigest())
+    return path, data
+
+
+def precheck(client, rel, name, data, with_hash=True):
+    body = {'fileName': name, 'fileSize': len(data), 'path': rel}
+    if with_hash:
+        body['hash'] = hashlib.md5(data).hexdigest()
+    return client.post('/api/upload-precheck', json=body).get_json()
+
+
+def test_precheck_hit_creates_the_file(srv, client, share):
+    rel, full = share
+    source, data = shared_source(srv, full)
+    assert precheck(client, rel, 'copy.bin', data, with_hash=False)['candidates'] >= 1
+
+    result = precheck(client, rel, 'copy.bin', data)
+    assert result['exists'] is True
+    assert result['method'] in ('reflink', 'hardlink', 'copy')
+    with open(os.path.join(full, 'copy.bin'), 'rb') as f:
+        assert f.read() == data
+
+
+def test_precheck_miss(srv, client, share):
+    rel, full = share
+    source, data = shared_source(srv, full)
+    other = os.urandom(len(data))
+    assert precheck(client, rel, 'other.bin', other) == {'success': True, 'exists': False, 'candidates': 0}
+    assert not os.path.exists(os.path.join(full, 'other.bin'))
+
+    # Source modifiée depuis le calcul du hash: l'entrée du cache ne sert plus
+    with open(source, 'r+b') as f:
+        f.write(b'changed')
+    assert precheck(client, rel, 'stale.bin', data)['exists'] is False
+
+
+def fake_reflink(dest_fd, request, source_fd):
+    assert request == 0x40049409
+    shutil.copyfileobj(os.fdopen(os.dup(source_fd), 'rb'), os.fdopen(os.dup(dest_fd), 'wb'))
+
+
+def no_reflink(dest_fd, request, source_fd):
+    raise OSError(95, 'Operation not supported')
+
+
+def test_clone_file_prefers_reflink(srv, share, monkeypatch):
+    rel, full = share
+    source, data = shared_source(srv, full)
+    monkeypatch.setattr(srv.fcntl, 'ioctl', fake_reflink)
+    target = os.path.join(full, 'reflink.bin')
+    assert srv.clone_file(source, target) == 'reflink'
+    assert os.stat(target).st_ino != os.stat(source).st_ino
+    with open(target, 'rb') as f:
+        assert f.read() == data
+
+
+def test_clone_file_falls_back_to_hardlink_then_copy(srv, share, monkeypatch):
+    rel, full = share
+    source, data = shared_source(srv, full)
+    monkeypatch.setattr(srv.fcntl, 'ioctl', no_reflink)
+    linked = os.path.join(full, 'linked.bin')
+    assert srv.clone_file(source, linked) == 'hardlink'
+    assert os.stat(linked).st_ino == os.stat(source).st_ino
+
+    def no_link(source_path, link_path):
+        raise OSError(18, 'Invalid cross-device link')
+
+    monkeypatch.setattr(srv.os, 'link', no_link)
+    with pytest.raises(OSError):
+        srv.clone_file(source, os.path.join(full, 'refused.bin'), fallback_copy=False)
+    copied = os.path.join(full, 'copied.bin')
+    assert srv.clone_file(source, copied) == 'copy'
+    assert os.stat(copied).st_ino != os.stat(source).st_ino
+    with open(copied, 'rb') as f:
+        assert f.read() == data
+    assert not any(name.endswith('.clone') for name in os.listdir(full))
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from helpers import write_file
+from test_asgi import asgi_call
+
+
+@pytest.fixture
+def outside(srv):
+    """Fichier à côté du dossier de partage, hors de portée des routes"""
+    path = os.path.join(os.path.dirname(os.path.abspath(srv.UPLOAD_FOLDER)), 'outside.txt')
+    write_file(path, b'secret')
+    yield path
+    if os.path.exists(path):
+        os.remove(path)
+
+
+ESCAPE = '%2e%2e/outside.txt'
+
+
+@pytest.mark.parametrize('method, route', [('get', 'download'), ('get', 'preview'), ('get', 'download-folder'),
+                                           ('delete', 'delete')])
+def test_flask_routes_refuse_paths_outside_the_share(client, outside, method, route):
+    response = getattr(client, method)(f'/api/{route}/{ESCAPE}')
+    assert response.status_code in (400, 404)
+    assert b'secret' not in response.data
+    assert os.path.exists(outside)
+
+
+@pytest.mark.parametrize('route', ['download', 'preview', 'download-folder'])
+def test_asgi_routes_refuse_paths_outside_the_share(srv, outside, route):
+    sent = asgi_call(srv.asgi_app, f'/api/{route}/../outside.txt')
+    assert sent[0]['status'] in (400, 404)
+    assert b'secret' not in b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+
+
+def test_delete_refuses_the_share_and_temp_folders(srv, client):
+    for name in ('.', '.temp'):
+        assert client.delete(f'/api/delete/{name}').status_code == 400
+    assert os.path.isdir(srv.TEMP_FOLDER)
+
+
+def test_delete_inside_the_share(client, share):
+    rel, full = share
+    write_file(os.path.join(full, 'gone.txt'), b'x')
+    assert client.delete(f'/api/delete/{rel}/gone.txt').status_code == 200
+    assert not os.path.exists(os.path.join(full, 'gone.txt'))
@@ -0,0 +1,89 @@
+import os
+import threading
+
+from helpers import write_file
+
+
+def run_with_timeout(func, timeout=10):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', func()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'appel bloqué'
+    return result['value']
+
+
+def test_listing_folder_created_outside_server(client, share, srv):
+    rel, full = share
+    write_file(os.path.join(full, 'outside', 'deep', 'zebrafile.txt'), b'z' * 10)
+    # Premier accès: le sous-arbre inconnu est relu et publié aux index secondaires
+    response = run_with_timeout(lambda: client.get('/api/files', query_string={'path': rel, 'fields': 'dir_size'}))
+    entries = {entry['name']: entry for entry in response.json['files']}
+    assert entries['outside']['size'] == 10
+    results = run_with_timeout(lambda: client.get('/api/search', query_string={'q': 'zebrafile'}).json)
+    assert [entry['path'] for entry in results['results']] == [f'{rel}/outside/deep/zebrafile.txt']
+
+
+def test_search_upload_and_delete(client, share, srv):
+    rel, full = share
+    import io
+    client.post('/api/upload', data={'files': (io.BytesIO(b'abc'), 'Éléphant_rose.txt'), 'path': rel})
+    # Recherche insensible à la casse et aux accents
+    paths = [entry['path'] for entry in client.get('/api/search', query_string={'q': 'elephant'}).json['results']]
+    assert any(path.startswith(rel) for path in paths)
+
+
+def test_search_empty_query(client):
+    assert client.get('/api/search', query_string={'q': ' '}).status_code == 400
+
+
+def test_search_not_ready_times_out(client, srv, monkeypatch):
+    index = srv.SearchIndex(srv.UPLOAD_FOLDER)
+    monkeypatch.setattr(srv, 'SEARCH_READY_TIMEOUT', 0.05)
+    monkeypatch.setattr(srv, 'search_index', index)
+    response = client.get('/api/search', query_string={'q': 'abc'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+
+def test_search_filters_prefix_and_removal(client, share, srv):
+    rel, full = share
+    token = os.path.basename(full).replace('_', '')
+    for name, size in [(f'{token}report.pdf', 10), (f'old{token}.txt', 500)]:
+        write_file(os.path.join(full, name), b'x' * size)
+        srv.dir_index.file_added(os.path.join(full, name))
+    os.makedirs(os.path.join(full, f'{token}dir'))
+    srv.dir_index.dir_created(os.path.join(full, f'{token}dir'))
+
+    def names(**params):
+        data = client.get('/api/search', query_string={'q': token, **params}).json
+        return sorted(entry['name'] for entry in data['results'])
+
+    assert names() == sorted([f'{token}report.pdf', f'old{token}.txt', f'{token}dir'])
+    assert names(mode='prefix') == sorted([f'{token}report.pdf', f'{token}dir'])
+    assert names(ext='txt') == [f'old{token}.txt']
+    assert names(min_size=100) == [f'old{token}.txt']
+    assert names(type='directory') == [f'{token}dir']
+    page = client.get('/api/search', query_string={'q': token, 'limit': 2}).json
+    assert page['total'] == 3 and page['has_more'] is True
+
+    assert client.delete(f'/api/delete/{rel}/{token}report.pdf').status_code == 200
+    assert names() == sorted([f'old{token}.txt', f'{token}dir'])
+
+
+def test_search_costly_fields_only_on_request(client, share, srv):
+    rel, full = share
+    token = os.path.basename(full).replace('_', '')
+    write_file(os.path.join(full, f'{token}.bin'), b'x' * 10)
+    os.makedirs(os.path.join(full, f'{token}dir'))
+    srv.dir_index.file_added(os.path.join(full, f'{token}.bin'))
+    srv.dir_index.dir_created(os.path.join(full, f'{token}dir'))
+
+    def entries(**params):
+        data = client.get('/api/search', query_string={'q': token, **params}).json
+        return {entry['type']: entry for entry in data['results']}
+
+    plain = entries()
+    assert 'hash' not in plain['file'] and 'size' not in plain['directory']
+    detailed = entries(fields='hash,dir_size')
+    assert 'hash_status' in detailed['file'] and detailed['directory']['size'] == 0
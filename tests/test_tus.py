@@ -0,0 +1,116 @@
+import base64
+import hashlib
+import os
+
+from helpers import wait_for
+from test_asgi import asgi_call
+
+TUS = {'Tus-Resumable': '1.0.0'}
+
+
+def metadata(**values):
+    return ','.join(f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in values.items())
+
+
+def create(client, rel, name, length):
+    response = client.post('/files/', headers={**TUS, 'Upload-Length': str(length),
+                                              'Upload-Metadata': metadata(filename=name, path=rel)})
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return response.headers['Location'].rsplit('/', 1)[1]
+
+
+def patch(client, upload_id, offset, data, **headers):
+    return client.patch(f'/files/{upload_id}', data=data, headers={
+        **TUS, 'Content-Type': 'application/offset+octet-stream', 'Upload-Offset': str(offset), **headers})
+
+
+def head(client, upload_id):
+    return client.head(f'/files/{upload_id}', headers=TUS)
+
+
+def test_options_advertises_extensions(client):
+    response = client.options('/files/')
+    assert response.status_code == 204
+    assert response.headers['Tus-Version'] == '1.0.0'
+    assert 'checksum' in response.headers['Tus-Extension']
+
+
+def test_upload_resumes_from_head_offset(client, share, srv):
+    rel, full = share
+    data = os.urandom(300_000)
+    upload_id = create(client, rel, 'tus.bin', len(data))
+    assert head(client, upload_id).headers['Upload-Offset'] == '0'
+
+    first = patch(client, upload_id, 0, data[:100_000])
+    assert first.status_code == 204
+    assert first.headers['Upload-Offset'] == '100000'
+    # Reprise: le client redemande l'offset avant de continuer
+    offset = int(head(client, upload_id).headers['Upload-Offset'])
+    assert patch(client, upload_id, offset, data[offset:]).status_code == 204
+
+    assert wait_for(lambda: os.path.exists(os.path.join(full, 'tus.bin')) and
+                    srv.upload_manager.get_upload_status(upload_id)['status'] == 'completed')
+    with open(os.path.join(full, 'tus.bin'), 'rb') as f:
+        assert f.read() == data
+    response = head(client, upload_id)
+    assert response.headers['Upload-Offset'] == str(len(data))
+    # Upload terminé: plus de session à verrouiller
+    assert patch(client, upload_id, len(data), b'x').status_code == 404
+    assert patch(client, 'f' * 32, 0, b'x').status_code == 404
+
+
+def test_wrong_offset_conflicts(client, share):
+    rel, full = share
+    upload_id = create(client, rel, 'conflict.bin', 10)
+    response = patch(client, upload_id, 5, b'12345')
+    assert response.status_code == 409
+    assert head(client, upload_id).headers['Upload-Offset'] == '0'
+
+
+def test_checksum_mismatch_discards_body(client, share):
+    rel, full = share
+    upload_id = create(client, rel, 'checksum.bin', 10)
+    bad = base64.b64encode(hashlib.sha1(b'other').digest()).decode()
+    response = patch(client, upload_id, 0, b'0123456789', **{'Upload-Checksum': f'sha1 {bad}'})
+    assert response.status_code == 460
+    assert head(client, upload_id).headers['Upload-Offset'] == '0'
+    good = base64.b64encode(hashlib.sha1(b'0123456789').digest()).decode()
+    response = patch(client, upload_id, 0, b'0123456789', **{'Upload-Checksum': f'sha1 {good}'})
+    assert response.headers['Upload-Offset'] == '10'
+
+
+def test_protocol_errors(client, share):
+    rel, full = share
+    assert client.post('/files/', headers={'Upload-Length': '1'}).status_code == 412
+    assert client.post('/files/', headers={**TUS, 'Upload-Length': 'x'}).status_code == 400
+    assert client.post('/files/', headers={**TUS, 'Upload-Length': '1'}).status_code == 400
+    upload_id = create(client, rel, 'type.bin', 4)
+    response = client.patch(f'/files/{upload_id}', data=b'abcd', headers={**TUS, 'Upload-Offset': '0'})
+    assert response.status_code == 415
+
+
+def test_empty_file_is_complete_on_creation(client, share):
+    rel, full = share
+    upload_id = create(client, rel, 'empty.bin', 0)
+    assert wait_for(lambda: os.path.exists(os.path.join(full, 'empty.bin')))
+    assert head(client, upload_id).headers['Upload-Offset'] == '0'
+
+
+def test_termination(client, share, srv):
+    rel, full = share
+    upload_id = create(client, rel, 'gone.bin', 100)
+    assert client.delete(f'/files/{upload_id}', headers=TUS).status_code == 204
+    assert head(client, upload_id).status_code == 404
+    assert not os.path.exists(os.path.join(srv.TEMP_FOLDER, f'{upload_id}.data'))
+
+
+def test_asgi_patch(client, share, srv):
+    rel, full = share
+    data = os.urandom(50_000)
+    upload_id = create(client, rel, 'asgi.bin', len(data))
+    sent = asgi_call(srv.asgi_app, f'/files/{upload_id}', method='PATCH', body=data, headers=[
+        (b'tus-resumable', b'1.0.0'), (b'content-type', b'application/offset+octet-stream'),
+        (b'upload-offset', b'0')])
+    assert sent[0]['status'] == 204
+    assert dict(sent[0]['headers'])[b'upload-offset'] == str(len(data)).encode()
+    assert wait_for(lambda: os.path.exists(os.path.join(full, 'asgi.bin')))
@@ -0,0 +1,41 @@
+import re
+
+
+def asset_url(client):
+    page = client.get('/', headers={'Accept-Encoding': 'identity'}).get_data(as_text=True)
+    return re.search(r'src="(/assets/app\.[0-9a-f]+\.js)"', page).group(1)
+
+
+def test_each_encoding_has_its_own_etag(client):
+    url = asset_url(client)
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    packed = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['ETag'] != packed.headers['ETag']
+    assert not plain.headers['ETag'].startswith('W/')
+    assert packed.headers['Vary'] == 'Accept-Encoding'
+
+
+def test_etag_revalidation_round_trip(client):
+    url = asset_url(client)
+    first = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    etag = first.headers['ETag']
+    again = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    # La variante gzip en cache ne valide pas la réponse non compressée
+    other = client.get(url, headers={'Accept-Encoding': 'identity', 'If-None-Match': etag})
+    assert other.status_code == 200
+    assert len(other.get_data()) > 0
+
+
+def test_shell_revalidates(client):
+    first = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Cache-Control'] == 'no-cache'
+    again = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_unknown_asset(client):
+    assert client.get('/assets/app.0000.js').status_code == 404
@@ -0,0 +1,58 @@
+import io
+import os
+
+from helpers import write_file
+
+
+def test_delete_rejects_traversal_id(client, share):
+    rel, full = share
+    write_file(os.path.join(full, 'keep.txt'), b'keep')
+    response = client.delete('/api/upload-session/..')
+    assert response.status_code in (404, 405)
+    response = client.delete('/api/upload-session/%2E%2E')
+    assert response.status_code == 404
+    assert os.path.exists(os.path.join(full, 'keep.txt'))
+
+
+def test_delete_unknown_id(client):
+    response = client.delete('/api/upload-session/' + 'a' * 32)
+    assert response.status_code == 404
+
+
+def test_delete_known_session(client, share):
+    rel, _ = share
+    session = client.post('/api/upload-session', json={'fileName': 'x.bin', 'fileSize': 10, 'path': rel}).json
+    data_path = os.path.join('shared_files', '.temp', session['upload_id'] + '.data')
+    assert os.path.exists(data_path)
+    assert client.delete('/api/upload-session/' + session['upload_id']).json['success']
+    assert not os.path.exists(data_path)
+
+
+def test_legacy_chunk_rejects_client_chosen_id(client, share):
+    rel, _ = share
+    for upload_id in ('../../escape', 'client-id', 'b' * 32):
+        response = client.post('/api/upload-chunk', data={
+            'chunk': (io.BytesIO(b'abc'), 'blob'), 'fileName': 'c.bin', 'chunkIndex': 0,
+            'totalChunks': 1, 'uploadId': upload_id, 'fileSize': 3, 'path': rel})
+        assert response.status_code == 404
+    assert not os.path.exists(os.path.join('shared_files', '.temp', 'client-id'))
+
+
+def test_legacy_chunk_into_server_session(client, share, srv):
+    rel, full = share
+    session = client.post('/api/upload-session', json={'fileName': 'c.bin', 'fileSize': 3, 'path': rel}).json
+    response = client.post('/api/upload-chunk', data={
+        'chunk': (io.BytesIO(b'abc'), 'blob'), 'chunkIndex': 0, 'uploadId': session['upload_id']})
+    assert response.json['success']
+    srv.finalize_executor.submit(lambda: None).result()
+    from helpers import wait_for
+    assert wait_for(lambda: os.path.exists(os.path.join(full, 'c.bin')))
+    with open(os.path.join(full, 'c.bin'), 'rb') as f:
+        assert f.read() == b'abc'
+
+
+def test_put_and_tus_reject_bad_ids(client):
+    response = client.put('/api/upload-session/..%2F..', data=b'x', headers={'Content-Range': 'bytes 0-0/1'})
+    assert response.status_code == 404
+    response = client.head('/files/' + 'c' * 32, headers={'Tus-Resumable': '1.0.0'})
+    assert response.status_code == 404
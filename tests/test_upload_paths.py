@@ -0,0 +1,75 @@
+import io
+import os
+
+import pytest
+
+
+ESCAPES = ['../../escaped.txt', '../escaped.txt', '/tmp/escaped.txt', 'a/../../escaped.txt']
+
+
+@pytest.mark.parametrize('relative_path', ESCAPES)
+def test_upload_session_rejects_escaping_relative_path(client, share, relative_path):
+    rel, _ = share
+    response = client.post('/api/upload-session', json={
+        'fileName': 'escaped.txt', 'fileSize': 1, 'path': rel, 'relativePath': relative_path})
+    assert response.status_code == 400
+    assert not os.path.exists(os.path.join(os.path.dirname(os.getcwd()), 'escaped.txt'))
+
+
+def test_upload_session_rejects_escaping_target(client):
+    response = client.post('/api/upload-session', json={'fileName': 'x.txt', 'fileSize': 1, 'path': '../..'})
+    assert response.status_code == 400
+
+
+def test_tus_rejects_escaping_relative_path(client):
+    import base64
+    metadata = ','.join(f'{key} {base64.b64encode(value.encode()).decode()}'
+                        for key, value in {'filename': 'x.txt', 'relativePath': '../../x.txt'}.items())
+    response = client.post('/files/', headers={'Tus-Resumable': '1.0.0', 'Upload-Length': '1',
+                                              'Upload-Metadata': metadata})
+    assert response.status_code == 400
+
+
+def test_multipart_upload_rejects_escaping_path(client, share):
+    rel, full = share
+    response = client.post('/api/upload', data={
+        'files': [(io.BytesIO(b'ok'), 'ok.txt'), (io.BytesIO(b'bad'), 'bad.txt')],
+        'relative_paths': ['ok.txt', '../../../bad.txt'], 'path': rel})
+    assert response.status_code == 400
+    # Aucun fichier écrit: les chemins sont vérifiés avant le premier
+    assert not os.path.exists(os.path.join(full, 'ok.txt'))
+
+
+def test_upload_session_nested_relative_path(client, share):
+    rel, full = share
+    response = client.post('/api/upload-session', json={
+        'fileName': 'n.txt', 'fileSize': 2, 'path': rel, 'relativePath': 'sub/n.txt'})
+    assert response.status_code == 200
+    assert os.path.isdir(os.path.join(full, 'sub'))
+
+
+@pytest.mark.parametrize('path', ['..', '../..', '/etc', 'a/../../..'])
+def test_listing_rejects_escaping_path(client, path):
+    response = client.get('/api/files', query_string={'path': path})
+    assert response.status_code == 400
+
+
+def test_temp_folder_is_not_an_upload_target(client, srv):
+    session = client.post('/api/upload-session', json={'fileName': 'x.bin', 'fileSize': 4}).get_json()
+    data_path = os.path.join(srv.TEMP_FOLDER, session['upload_id'] + '.data')
+    before = os.path.getsize(data_path)
+    for target, relative in [('.temp', ''), ('', '.temp/x.data'), ('sub/../.temp', '')]:
+        response = client.post('/api/upload-session', json={'fileName': f"{session['upload_id']}.data",
+                                                           'fileSize': 1, 'path': target,
+                                                           'relativePath': relative})
+        assert response.status_code == 400, (target, relative)
+    response = client.post('/api/upload', data={'files': (io.BytesIO(b'evil'), f"{session['upload_id']}.data"),
+                                                'path': '.temp'})
+    assert response.status_code == 400
+    response = client.post('/files/', headers={'Tus-Resumable': '1.0.0', 'Upload-Length': '1',
+                                               'Upload-Metadata': 'filename eC5kYXRh,path LnRlbXA='})
+    assert response.status_code == 400
+    assert os.path.getsize(data_path) == before
+    # Un dossier dont le nom commence comme la zone temporaire reste utilisable
+    assert client.post('/api/upload-session', json={'fileName': 'ok.bin', 'fileSize': 1,
+                                                    'path': '.temp2'}).status_code == 200
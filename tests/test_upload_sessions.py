@@ -0,0 +1,150 @@
+import hashlib
+import io
+import os
+import threading
+import zlib
+
+import pytest
+
+from helpers import wait_for
+
+
+def open_session(client, rel, name, size, chunk_size):
+    response = client.post('/api/upload-session', json={'fileName': name, 'fileSize': size, 'path': rel,
+                                                       'chunkSize': chunk_size})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def put_chunk(client, upload_id, data, start, total):
+    return client.put(f'/api/upload-session/{upload_id}', data=data, headers={
+        'Content-Type': 'application/octet-stream',
+        'Content-Range': f'bytes {start}-{start + len(data) - 1}/{total}',
+        'X-Chunk-CRC32': format(zlib.crc32(data), '08x')})
+
+
+def wait_completed(client, upload_id):
+    return wait_for(lambda: client.get(f'/api/upload-session/{upload_id}').get_json()['status'] == 'completed')
+
+
+def test_raw_put_upload_in_any_order(client, share):
+    rel, full = share
+    data = os.urandom(10_000)
+    session = open_session(client, rel, 'raw.bin', len(data), 4096)
+    assert session['total_chunks'] == 3
+    for start in (8192, 0, 4096):
+        response = put_chunk(client, session['upload_id'], data[start:start + 4096], start, len(data))
+        assert response.status_code == 200, response.get_json()
+    assert response.get_json()['status'] == 'finalizing'
+    assert wait_completed(client, session['upload_id'])
+    with open(os.path.join(full, 'raw.bin'), 'rb') as f:
+        assert f.read() == data
+
+
+def test_resume_lists_received_chunks(client, share):
+    rel, full = share
+    data = os.urandom(9000)
+    session = open_session(client, rel, 'resume.bin', len(data), 4096)
+    put_chunk(client, session['upload_id'], data[4096:8192], 4096, len(data))
+    info = client.get(f"/api/upload-session/{session['upload_id']}").get_json()
+    assert info['status'] == 'active'
+    assert info['received_chunks'] == 1
+    assert info['missing'] == [[0, 0], [2, 2]]
+
+
+def test_put_rejects_bad_range_and_checksum(client, share):
+    rel, full = share
+    session = open_session(client, rel, 'bad.bin', 8192, 4096)
+    response = client.put(f"/api/upload-session/{session['upload_id']}", data=b'x' * 10,
+                          headers={'Content-Range': 'bytes 5-14/8192'})
+    assert response.status_code == 400
+    response = client.put(f"/api/upload-session/{session['upload_id']}", data=b'x' * 4096,
+                          headers={'Content-Range': 'bytes 0-4095/8192', 'X-Chunk-CRC32': '00000000'})
+    assert response.status_code == 400
+    assert response.get_json()['retry'] is True
+
+
+@pytest.mark.parametrize('route', ['put', 'multipart'])
+def test_retried_chunk_does_not_reset_completed_upload(client, share, srv, route):
+    rel, full = share
+    data = os.urandom(5000)
+    session = open_session(client, rel, f'done-{route}.bin', len(data), 4096)
+    upload_id = session['upload_id']
+    put_chunk(client, upload_id, data[:4096], 0, len(data))
+    put_chunk(client, upload_id, data[4096:], 4096, len(data))
+    assert wait_completed(client, upload_id)
+
+    # La réponse du dernier chunk s'est perdue: le client le renvoie
+    if route == 'put':
+        response = put_chunk(client, upload_id, b'z' * 904, 4096, len(data))
+    else:
+        response = client.post('/api/upload-chunk', data={'uploadId': upload_id, 'chunkIndex': '1',
+                                                          'chunk': (io.BytesIO(b'z' * 904), 'chunk')})
+    assert response.status_code == 200
+    assert response.get_json() == {'success': True, 'upload_id': upload_id, 'status': 'completed'}
+
+    srv.write_behind.flush()
+    status = srv.upload_manager.get_upload_status(upload_id)
+    assert status['status'] == 'completed'
+    assert status['uploaded_chunks'] == 2
+    with open(os.path.join(full, f'done-{route}.bin'), 'rb') as f:
+        assert f.read() == data
+    assert not os.path.exists(os.path.join(srv.TEMP_FOLDER, f'{upload_id}.data'))
+    with pytest.raises(ValueError):
+        srv.upload_manager.open_upload(upload_id, 'again.bin', 10, 1, rel, '', 4096)
+
+
+def test_preallocation_does_not_hold_the_session_lock(srv, client, share, monkeypatch):
+    rel, full = share
+    started, release = threading.Event(), threading.Event()
+    real_preallocate = srv.preallocate
+
+    def slow_preallocate(fd, size):
+        started.set()
+        release.wait(5)
+        return real_preallocate(fd, size)
+
+    monkeypatch.setattr(srv, 'preallocate', slow_preallocate)
+    opener = threading.Thread(target=open_session, args=(client, rel, 'big.bin', 1 << 20, 4096))
+    opener.start()
+    try:
+        assert started.wait(5)
+        assert srv.upload_manager.upload_lock.acquire(timeout=1)
+        srv.upload_manager.upload_lock.release()
+    finally:
+        release.set()
+        opener.join(5)
+
+
+def test_preallocated_file_is_sparse_without_native_fallocate(srv, monkeypatch):
+    monkeypatch.setattr(srv, 'PREALLOCATE_NATIVE', False)
+    path = os.path.join(srv.TEMP_FOLDER, 'prealloc.data')
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        assert srv.preallocate(fd, 1 << 20) is False
+        assert os.fstat(fd).st_size == 1 << 20
+        # Sans fallocate natif le fichier reste creux: aucun zéro n'a été écrit
+        assert os.fstat(fd).st_blocks * 512 < 1 << 20
+    finally:
+        os.close(fd)
+        os.remove(path)
+
+
+def test_reverse_order_upload_stores_the_file_md5(srv, client, share, monkeypatch):
+    rel, full = share
+    data = os.urandom(4 * 4096 + 123)
+    rehashed = []
+    get_file_hash = srv.get_file_hash
+    monkeypatch.setattr(srv, 'get_file_hash', lambda path: (rehashed.append(path), get_file_hash(path))[1])
+
+    session = open_session(client, rel, 'reverse.bin', len(data), 4096)
+    for start in reversed(range(0, len(data), 4096)):
+        response = put_chunk(client, session['upload_id'], data[start:start + 4096], start, len(data))
+        assert response.status_code == 200, response.get_json()
+    assert wait_completed(client, session['upload_id'])
+
+    final_path = os.path.join(full, 'reverse.bin')
+    stored = srv.hash_cache.lookup_many([(final_path, os.stat(final_path))], schedule=False)
+    assert stored[final_path] == hashlib.md5(data).hexdigest()
+    # Le MD5 vient du calcul pendant la réception, pas d'une relecture du fichier final
+    assert final_path not in rehashed
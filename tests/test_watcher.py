@@ -0,0 +1,77 @@
+import errno
+import os
+import sys
+
+import pytest
+
+from helpers import wait_for, write_file
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify requis')
+
+
+@pytest.fixture
+def watcher_for(srv, monkeypatch):
+    monkeypatch.setattr(srv, 'WATCH_COALESCE', 0.05)
+    monkeypatch.setattr(srv.dir_index, 'reconcile_interval', srv.RECONCILE_INTERVAL)
+
+    def start(root, watcher_class=None):
+        watcher = (watcher_class or srv.FileWatcher)(root)
+        assert watcher.start()
+        assert wait_for(lambda: watcher.mode == 'inotify' or watcher.error)
+        return watcher
+
+    # Les threads de surveillance (démons) restent sur des dossiers propres à chaque test
+    return start
+
+
+def test_external_changes_reach_the_index(srv, share, watcher_for):
+    rel, full = share
+    watcher = watcher_for(full)
+    assert watcher.mode == 'inotify'
+    assert srv.dir_index.reconcile_interval == srv.WATCH_RECONCILE_INTERVAL
+
+    write_file(os.path.join(full, 'a.bin'), b'a' * 10)
+    assert wait_for(lambda: srv.dir_index.get(full)['size'] == 10)
+
+    # Dossier arrivé d'un coup (mv depuis ailleurs): relu et surveillé
+    os.makedirs(os.path.join(srv.UPLOAD_FOLDER, f'{rel}-incoming', 'deep'))
+    write_file(os.path.join(srv.UPLOAD_FOLDER, f'{rel}-incoming', 'deep', 'b.bin'), b'b' * 5)
+    os.rename(os.path.join(srv.UPLOAD_FOLDER, f'{rel}-incoming'), os.path.join(full, 'moved'))
+    assert wait_for(lambda: srv.dir_index.get(full)['size'] == 15)
+    write_file(os.path.join(full, 'moved', 'deep', 'c.bin'), b'c' * 7)
+    assert wait_for(lambda: srv.dir_index.get(full)['size'] == 22)
+
+    os.remove(os.path.join(full, 'a.bin'))
+    assert wait_for(lambda: srv.dir_index.get(full)['size'] == 12)
+
+
+def test_watch_limit_falls_back_to_periodic_scans(srv, share, watcher_for):
+    rel, full = share
+
+    class LimitedWatcher(srv.FileWatcher):
+        def _add_watch(self, path):
+            if os.path.basename(path) == 'blocked':
+                raise srv.WatchFailed(errno.ENOSPC, os.strerror(errno.ENOSPC), path)
+            super()._add_watch(path)
+
+    watcher = watcher_for(full, LimitedWatcher)
+    assert watcher.mode == 'inotify'
+    os.makedirs(os.path.join(full, 'blocked'))
+    assert wait_for(lambda: watcher.mode == 'scan')
+    assert srv.dir_index.reconcile_interval == srv.RECONCILE_INTERVAL
+    assert 'No space left' in watcher.error
+    assert watcher.fd is None and not watcher.watches
+    assert wait_for(lambda: srv.dir_index.get(os.path.join(full, 'blocked')) is not None)
+
+
+def test_watch_limit_at_startup(srv, share, watcher_for):
+    rel, full = share
+
+    class FullWatcher(srv.FileWatcher):
+        def _add_watch(self, path):
+            raise srv.WatchFailed(errno.ENOSPC, os.strerror(errno.ENOSPC), path)
+
+    watcher = watcher_for(full, FullWatcher)
+    assert wait_for(lambda: watcher.fd is None)
+    assert watcher.mode == 'scan'
+    assert srv.dir_index.reconcile_interval == srv.RECONCILE_INTERVAL
@@ -0,0 +1,82 @@
+import threading
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def log(srv):
+    log = srv.WriteBehindLog()
+    yield log
+    log.close()
+
+
+def new_upload(srv, total_chunks=16):
+    upload_id = uuid.uuid4().hex
+    srv.upload_manager.start_upload(upload_id, 'progress.bin', total_chunks * 10, total_chunks, '', '', 10)
+    return upload_id
+
+
+def progress_row(srv, upload_id):
+    return srv.db.query_one('SELECT uploaded_size, uploaded_chunks, chunk_bitmap FROM uploads WHERE id = ?',
+                            (upload_id,))
+
+
+def test_progress_is_coalesced_per_upload(srv, log, monkeypatch):
+    batches = []
+    write = log._write
+    monkeypatch.setattr(log, '_write', lambda progress, history: (batches.append(dict(progress)),
+                                                                 write(progress, history)))
+    upload_id = new_upload(srv)
+    for index in range(5):
+        log.progress(upload_id, 10, bytes([(1 << (index + 1)) - 1, 0]))
+    log.flush()
+
+    assert len(batches) == 1 and list(batches[0]) == [upload_id]
+    assert progress_row(srv, upload_id) == (50, 5, bytes([0b11111, 0]))
+
+
+def test_flush_waits_for_history(srv, log):
+    marker = f'flush-{uuid.uuid4().hex}'
+    log.history_many([('upload', marker, 1, '127.0.0.1'), ('download', marker, 1, '127.0.0.1')])
+    log.flush()
+    assert srv.db.query_one('SELECT COUNT(*) FROM history WHERE filename = ?', (marker,))[0] == 2
+
+
+def test_close_drains_pending_writes(srv, monkeypatch):
+    monkeypatch.setattr(srv, 'WRITE_BEHIND_INTERVAL', 60)
+    log = srv.WriteBehindLog()
+    upload_id = new_upload(srv)
+    log.progress(upload_id, 7)
+    log.history('upload', upload_id, 7, '127.0.0.1')
+    log.close()
+    assert not log.thread.is_alive()
+    assert progress_row(srv, upload_id)[:2] == (7, 1)
+    assert srv.db.query_one('SELECT COUNT(*) FROM history WHERE filename = ?', (upload_id,))[0] == 1
+
+
+def test_full_queue_never_blocks_progress(srv, monkeypatch):
+    monkeypatch.setattr(srv, 'WRITE_BEHIND_QUEUE_SIZE', 2)
+    log = srv.WriteBehindLog()
+    writing, release = threading.Event(), threading.Event()
+    write = log._write
+    monkeypatch.setattr(log, '_write', lambda progress, history: (writing.set(), release.wait(5),
+                                                                 write(progress, history)))
+    upload_id = new_upload(srv)
+
+    # Le thread d'écriture est bloqué dans un lot: la file se remplit, progress() doit rendre la main
+    threading.Thread(target=log.flush, daemon=True).start()
+    assert writing.wait(2)
+    done = threading.Event()
+
+    def producer():
+        for index in range(20):
+            log.progress(upload_id, 1, bytes([0, 0]) if index < 19 else bytes([0xff, 0x01]))
+        done.set()
+
+    threading.Thread(target=producer, daemon=True).start()
+    assert done.wait(2)
+    release.set()
+    log.flush()
+    log.close()
+    assert progress_row(srv, upload_id) == (20, 20, bytes([0xff, 0x01]))
@@ -0,0 +1,71 @@
+import io
+import os
+import threading
+import time
+import zipfile
+
+from helpers import wait_for, write_file
+from test_asgi import asgi_call, body_of
+
+
+def make_tree(full):
+    files = {'a.txt': b'hello ' * 5000, 'sub/b.jpg': os.urandom(20000), 'sub/deep/c.txt': b''}
+    for name, data in files.items():
+        write_file(os.path.join(full, 'tree', name), data)
+    old = time.mktime((2020, 5, 17, 10, 30, 0, 0, 0, -1))
+    os.utime(os.path.join(full, 'tree', 'a.txt'), (old, old))
+    return files
+
+
+def check_archive(body, files):
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        assert archive.testzip() is None
+        assert sorted(archive.namelist()) == sorted(files)
+        for name, data in files.items():
+            assert archive.read(name) == data
+        assert archive.getinfo('a.txt').compress_type == zipfile.ZIP_DEFLATED
+        assert archive.getinfo('a.txt').compress_size < len(files['a.txt']) // 10
+        # Déjà compressé: stocké tel quel
+        assert archive.getinfo('sub/b.jpg').compress_type == zipfile.ZIP_STORED
+        # Dates des fichiers conservées
+        assert archive.getinfo('a.txt').date_time == (2020, 5, 17, 10, 30, 0)
+
+
+def test_folder_zip_download(client, share):
+    rel, full = share
+    files = make_tree(full)
+    response = client.get(f'/api/download-folder/{rel}/tree')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'application/zip'
+    check_archive(response.get_data(), files)
+
+
+def test_asgi_folder_zip_download(srv, share):
+    rel, full = share
+    files = make_tree(full)
+    sent = asgi_call(srv.asgi_app, f'/api/download-folder/{rel}/tree')
+    assert sent[0]['status'] == 200
+    check_archive(body_of(sent), files)
+
+
+def test_large_folder_zip_is_streamed_in_blocks(srv, share):
+    rel, full = share
+    for i in range(6):
+        write_file(os.path.join(full, 'big', f'{i}.bin'), os.urandom(srv.ZIP_READ_SIZE))
+    blocks = list(srv.stream_zip(os.path.join(full, 'big')))
+    assert len(blocks) > 6
+    assert max(len(block) for block in blocks) < 2 * srv.ZIP_READ_SIZE
+    with zipfile.ZipFile(io.BytesIO(b''.join(blocks))) as archive:
+        assert len(archive.namelist()) == 6
+
+
+def test_closing_the_stream_stops_compression(srv, share):
+    rel, full = share
+    for i in range(20):
+        write_file(os.path.join(full, 'many', f'{i}.bin'), os.urandom(srv.ZIP_READ_SIZE))
+    before = threading.active_count()
+    blocks = srv.stream_zip(os.path.join(full, 'many'))
+    next(blocks)
+    assert threading.active_count() == before + 1
+    blocks.close()
+    assert wait_for(lambda: threading.active_count() == before)